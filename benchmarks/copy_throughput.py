@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import COPY_BUFFER_SIZE, fast_copy
+
+
+def make_dataset(root, count, size):
+    os.makedirs(root, exist_ok=True)
+    block = os.urandom(min(size, 1024 * 1024)) if size else b""
+    for i in range(count):
+        with open(os.path.join(root, f"file{i:06d}"), "wb") as f:
+            left = size
+            while left > 0:
+                f.write(block[:left])
+                left -= len(block)
+    return count * size
+
+
+def run(copy, source, target):
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target)
+    os.sync()
+    start = time.perf_counter()
+    for name in os.listdir(source):
+        copy(os.path.join(source, name), os.path.join(target, name))
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(target)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Aldernys copy backend with shutil.")
+    parser.add_argument("--source-dir", help="where the synthetic files are created (default: temp dir)")
+    parser.add_argument("--target-dir", help="copy destination, put it on another mount to test cross-device copies")
+    parser.add_argument("--small-count", type=int, default=5000)
+    parser.add_argument("--small-size", type=int, default=4096)
+    parser.add_argument("--huge-count", type=int, default=3)
+    parser.add_argument("--huge-size", type=int, default=512 * 1024 * 1024)
+    parser.add_argument("--buffer-size", type=int, default=COPY_BUFFER_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="aldernys-bench-", dir=args.source_dir)
+    target = os.path.join(args.target_dir or work, f"target-{os.getpid()}")
+    strategies = [
+        ("shutil.copy2", shutil.copy2),
+        ("fast_copy", lambda s, d: fast_copy(s, d, buffer_size=args.buffer_size)),
+    ]
+    for method in ("copy_file_range", "sendfile", "readinto"):
+        strategies.append((method, lambda s, d, m=method: fast_copy(s, d, buffer_size=args.buffer_size,
+                                                                    methods=(m, "readinto"))))
+    try:
+        datasets = [
+            ("small", os.path.join(work, "small"), make_dataset(os.path.join(work, "small"), args.small_count, args.small_size)),
+            ("huge", os.path.join(work, "huge"), make_dataset(os.path.join(work, "huge"), args.huge_count, args.huge_size)),
+        ]
+        print(f"{'dataset':<8} {'method':<16} {'MB/s':>10} {'seconds':>10}")
+        for label, source, total in datasets:
+            for name, copy in strategies:
+                elapsed = min(run(copy, source, target) for _ in range(args.repeat))
+                print(f"{label:<8} {name:<16} {total / elapsed / 1e6:>10.1f} {elapsed:>10.3f}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.rmtree(target, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
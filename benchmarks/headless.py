@@ -0,0 +1,309 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt, QEventLoop, QTimer, QElapsedTimer
+
+from main import FileJob, FileManager, perf
+
+
+def make_flat(root, count):
+    os.makedirs(root, exist_ok=True)
+    for i in range(count):
+        os.close(os.open(os.path.join(root, f"entry{i:07d}.txt"), os.O_CREAT | os.O_WRONLY, 0o644))
+
+
+def make_deep(root, depth, width):
+    path = root
+    for level in range(depth):
+        for i in range(width):
+            os.makedirs(os.path.join(path, f"dir{level:03d}-{i:03d}"), exist_ok=True)
+        path = os.path.join(path, f"dir{level:03d}-000")
+    return path
+
+
+def make_tiny(root, count, size):
+    os.makedirs(root, exist_ok=True)
+    data = b"x" * size
+    for i in range(count):
+        with open(os.path.join(root, f"tiny{i:06d}.dat"), "wb") as f:
+            f.write(data)
+
+
+def make_huge(root, count, size):
+    os.makedirs(root, exist_ok=True)
+    block = os.urandom(min(size, 1024 * 1024)) if size else b""
+    for i in range(count):
+        with open(os.path.join(root, f"huge{i:02d}.bin"), "wb") as f:
+            left = size
+            while left > 0:
+                f.write(block[:left])
+                left -= len(block)
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StallMonitor:
+    def __init__(self, interval_ms=5):
+        self.interval = interval_ms
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.clock = QElapsedTimer()
+        self.reset()
+
+    def reset(self):
+        self.stalls = []
+        self.clock.start()
+
+    def tick(self):
+        late = self.clock.restart() - self.interval
+        if late > 0:
+            self.stalls.append(late)
+
+    def start(self):
+        self.reset()
+        self.timer.start(self.interval)
+
+    def stop(self):
+        self.timer.stop()
+        stalls = sorted(self.stalls)
+        return {
+            "max_ms": stalls[-1] if stalls else 0,
+            "total_ms": sum(stall for stall in stalls if stall >= 50),
+            "over_50ms": sum(1 for stall in stalls if stall >= 50),
+            "over_100ms": sum(1 for stall in stalls if stall >= 100),
+        }
+
+
+class Harness:
+    def __init__(self, app, timeout):
+        self.app = app
+        self.timeout = timeout
+        self.window = FileManager()
+        self.window.show()
+        self.monitor = StallMonitor()
+        self.results = {}
+        self.finished_jobs = []
+        self.window.file_ops.job_finished.connect(self.finished_jobs.append)
+        self.wait(lambda: False, 0.3)
+
+    def wait(self, condition, timeout=None):
+        loop = QEventLoop()
+        poll = QTimer()
+        poll.timeout.connect(lambda: condition() and loop.quit())
+        poll.start(2)
+        QTimer.singleShot(int((self.timeout if timeout is None else timeout) * 1000), loop.quit)
+        if not condition():
+            loop.exec_()
+        poll.stop()
+        return condition()
+
+    def loaded(self):
+        return not self.window.model.loading
+
+    def measure(self, name, action, details=None):
+        self.wait(lambda: False, 0.05)
+        reset_peak_rss()
+        self.monitor.start()
+        start = time.perf_counter()
+        completed = action()
+        wall = time.perf_counter() - start
+        self.results[name] = {
+            "wall_s": round(wall, 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "stall": self.monitor.stop(),
+            "completed": bool(completed),
+        }
+        if details:
+            self.results[name].update(details)
+        print(f"{name:<16} {wall:9.3f}s  rss {self.results[name]['peak_rss_mb']:8.1f} MB  "
+              f"max stall {self.results[name]['stall']['max_ms']} ms", file=sys.stderr)
+
+    def open_directory(self, path):
+        self.window.set_directory(path)
+        self.window.add_to_history(path)
+        return self.wait(self.loaded)
+
+    def scroll(self, steps):
+        bar = self.window.list_view.verticalScrollBar()
+        for step in range(steps):
+            self.wait(self.loaded, 1)
+            bar.setValue(bar.maximum() * (step + 1) // steps)
+            self.app.processEvents()
+        return self.wait(self.loaded)
+
+    def navigate(self, paths, rounds):
+        for path in paths:
+            if not self.open_directory(path):
+                return False
+        for _ in range(rounds):
+            for _ in paths[1:]:
+                self.window.go_back()
+                if not self.wait(self.loaded):
+                    return False
+            for _ in paths[1:]:
+                self.window.go_forward()
+                if not self.wait(self.loaded):
+                    return False
+        return True
+
+    def sort_details(self, path):
+        if not self.open_directory(path):
+            return False
+        self.window.set_view_mode(True)
+        view = self.window.details_view
+        for column in range(1, view.model().columnCount()):
+            for order in (Qt.DescendingOrder, Qt.AscendingOrder):
+                view.sortByColumn(column, order)
+                self.app.processEvents()
+        view.sortByColumn(0, Qt.AscendingOrder)
+        self.window.set_view_mode(False)
+        return True
+
+    def run_job(self, job):
+        self.window.file_ops.submit(job)
+        return self.wait(lambda: job in self.finished_jobs) and not job.error
+
+    def batch_delete(self, path):
+        if not self.open_directory(path):
+            return False
+        while self.window.model.canFetchMore(self.window.model.index(0, 0).parent()):
+            self.window.model.fetchMore(self.window.model.index(0, 0).parent())
+        self.window.list_view.selectAll()
+        paths = self.window.selected_paths()
+        return self.run_job(FileJob("delete", paths)) and not os.listdir(path)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(previous, current):
+    print(f"{'scenario':<16} {'before':>10} {'after':>10} {'change':>8}", file=sys.stderr)
+    for name, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before or not before["wall_s"]:
+            continue
+        change = (result["wall_s"] - before["wall_s"]) / before["wall_s"] * 100
+        print(f"{name:<16} {before['wall_s']:>10.3f} {result['wall_s']:>10.3f} {change:>+7.1f}%", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the Aldernys FileManager headlessly over synthetic trees.")
+    parser.add_argument("--work-dir", help="where the synthetic trees are created (default: temp dir)")
+    parser.add_argument("--move-target", help="destination for the move scenario, put it on another mount "
+                                              "(default: /dev/shm when it is a different device)")
+    parser.add_argument("--flat-count", type=int, default=500000)
+    parser.add_argument("--deep-depth", type=int, default=64)
+    parser.add_argument("--deep-width", type=int, default=20)
+    parser.add_argument("--tiny-count", type=int, default=20000)
+    parser.add_argument("--tiny-size", type=int, default=64)
+    parser.add_argument("--huge-count", type=int, default=2)
+    parser.add_argument("--huge-size", type=int, default=256 * 1024 * 1024)
+    parser.add_argument("--scroll-steps", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3, help="back/forward rounds")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds allowed per scenario")
+    parser.add_argument("--only", help="comma separated scenarios to run")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="previous JSON report to print a comparison against")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="aldernys-bench-", dir=args.work_dir)
+    os.environ["HOME"] = os.path.join(work, "home")
+    os.environ["XDG_CACHE_HOME"] = os.path.join(work, "home", ".cache")
+    os.makedirs(os.environ["XDG_CACHE_HOME"])
+    move_target = args.move_target
+    if move_target is None and os.path.isdir("/dev/shm") and os.stat("/dev/shm").st_dev != os.stat(work).st_dev:
+        move_target = "/dev/shm"
+    move_target = tempfile.mkdtemp(prefix="aldernys-bench-move-", dir=move_target or work)
+    only = set(args.only.split(",")) if args.only else None
+
+    app = QApplication(sys.argv[:1])
+    try:
+        flat, deep_root, tiny, huge = (os.path.join(work, name) for name in ("flat", "deep", "tiny", "huge"))
+        print("creating synthetic trees...", file=sys.stderr)
+        make_flat(flat, args.flat_count)
+        deepest = make_deep(deep_root, args.deep_depth, args.deep_width)
+        make_tiny(tiny, args.tiny_count, args.tiny_size)
+        make_huge(huge, args.huge_count, args.huge_size)
+
+        harness = Harness(app, args.timeout)
+        scenarios = [
+            ("open_flat", lambda: harness.open_directory(flat), {"entries": args.flat_count}),
+            ("scroll_flat", lambda: harness.scroll(args.scroll_steps), {"steps": args.scroll_steps}),
+            ("reopen_flat", lambda: harness.open_directory(flat), {"entries": args.flat_count}),
+            ("sort_details", lambda: harness.sort_details(flat), {"entries": args.flat_count}),
+            ("navigate_deep", lambda: harness.navigate(
+                [deep_root] + [os.path.dirname(deepest)] + [deepest, flat], args.rounds), {"rounds": args.rounds}),
+            ("batch_delete", lambda: harness.batch_delete(tiny), {"entries": args.tiny_count}),
+            ("move", lambda: harness.run_job(FileJob("move", [huge], move_target)), {
+                "bytes": args.huge_count * args.huge_size,
+                "cross_device": os.stat(work).st_dev != os.stat(move_target).st_dev,
+            }),
+        ]
+        for name, action, details in scenarios:
+            if only is None or name in only:
+                harness.measure(name, action, details)
+        harness.window.close()
+        report = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "scenarios": harness.results,
+            "operations": {name: {"count": count, "p50_ms": round(p50 * 1000, 3), "p95_ms": round(p95 * 1000, 3),
+                                  "max_ms": round(maximum * 1000, 3)}
+                           for name, count, p50, p95, p99, maximum in perf.snapshot()[0]},
+        }
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        shutil.rmtree(move_target, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,5633 @@
 import os
 import sys
+import re
 import json
-import subprocess
+import math
+import mmap
+import time
+import fnmatch
+import sqlite3
+import queue
+import stat
+import errno
+import struct
+import itertools
+import bisect
+import operator
+import hashlib
+import posixpath
+import tempfile
+import threading
+import traceback
+from array import array
+from collections import deque, OrderedDict
+from contextlib import contextmanager
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QFileSystemModel, QListView, QSplitter,
+    QApplication, QMainWindow, QFileIconProvider, QListView, QSplitter,
     QToolBar, QAction, QLineEdit, QStatusBar, QMessageBox, QMenu, 
-    QDockWidget, QListWidget, QListWidgetItem, QInputDialog
+    QDockWidget, QListWidget, QListWidgetItem, QInputDialog, QProgressBar,
+    QWidget, QVBoxLayout, QHBoxLayout, QCheckBox, QPushButton, QTreeWidget, QTreeWidgetItem, QLabel,
+    QTableView, QHeaderView, QStackedWidget, QActionGroup, QTabWidget, QPlainTextEdit,
+    QDialog, QDialogButtonBox, QFormLayout, QComboBox, QSpinBox
 )
-from PyQt5.QtGui import QIcon, QKeySequence, QPalette, QColor, QFont
-from PyQt5.QtCore import Qt, QDir, QSize, QMimeData, QTimer, QFileInfo
+from PyQt5.QtGui import (
+    QIcon, QKeySequence, QPalette, QColor, QFont, QImage, QImageReader, QImageWriter, QPixmap,
+    QSyntaxHighlighter, QTextCharFormat, QFontDatabase
+)
+from PyQt5.QtCore import (
+    Qt, QDir, QSize, QMimeData, QTimer, QFileInfo, QObject, QUrl, QMimeDatabase,
+    QAbstractListModel, QAbstractProxyModel, QAbstractTableModel, QModelIndex, QSocketNotifier, QFileSystemWatcher, QEvent, pyqtSignal
+)
+from PyQt5.QtNetwork import QLocalServer
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if size < 1024 or unit == "TB":
+            break
+        size /= 1024
+    if unit == "B":
+        return f"{int(size)} {unit}"
+    return f"{size:.1f} {unit}"
+
+
+class LatencyHistogram:
+    __slots__ = ("buckets", "count", "total", "maximum")
+
+    resolution = 8
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        micros = max(seconds * 1e6, 1.0)
+        bucket = int(math.log2(micros) * self.resolution)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= wanted:
+                return min(2 ** ((bucket + 1) / self.resolution) / 1e6, self.maximum)
+        return self.maximum
+
+
+class PerfMonitor:
+    recent_limit = 500
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.recent = deque(maxlen=self.recent_limit)
+        self.lock = threading.Lock()
+        self.trace_file = None
+        self.trace_path = None
+        self.origin = time.perf_counter()
+
+    def record(self, name, seconds, path="", start=None):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(seconds)
+            if seconds >= 0.001:
+                self.recent.append((seconds, name, path, time.time()))
+            if self.trace_file is not None:
+                if start is None:
+                    start = time.perf_counter() - seconds
+                event = {
+                    "name": name, "cat": name.split(".", 1)[0], "ph": "X", "pid": os.getpid(),
+                    "tid": threading.get_ident(), "ts": (start - self.origin) * 1e6, "dur": seconds * 1e6,
+                }
+                if path:
+                    event["args"] = {"path": path}
+                self.trace_file.write(json.dumps(event) + ",\n")
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name, path=""):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, path, start)
+
+    def start_trace(self, path):
+        with self.lock:
+            if self.trace_file is not None:
+                self.trace_file.close()
+            self.trace_file = open(path, "w", buffering=1024 * 1024)
+            self.trace_file.write("[\n")
+            self.trace_path = path
+
+    def stop_trace(self):
+        with self.lock:
+            if self.trace_file is None:
+                return None
+            self.trace_file.write(json.dumps({
+                "name": "trace stopped", "ph": "i", "s": "g", "pid": os.getpid(), "tid": 0,
+                "ts": (time.perf_counter() - self.origin) * 1e6
+            }) + "\n]\n")
+            self.trace_file.close()
+            self.trace_file = None
+            path, self.trace_path = self.trace_path, None
+            return path
+
+    def snapshot(self):
+        with self.lock:
+            rows = [(name, histogram.count, histogram.percentile(0.5), histogram.percentile(0.95),
+                     histogram.percentile(0.99), histogram.maximum)
+                    for name, histogram in self.histograms.items()]
+            counters = dict(self.counters)
+            slowest = sorted(self.recent, reverse=True)[:20]
+        return sorted(rows), counters, slowest
+
+
+perf = PerfMonitor()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+COPY_METHODS = ("reflink", "copy_file_range", "sendfile", "readinto")
+FICLONE = 0x40049409
+_unsupported_copy_methods = set()
+_copy_buffers = threading.local()
+
+
+def _copy_reflink(src, dst, size, buffer_size, on_progress):
+    import fcntl
+    fcntl.ioctl(dst, FICLONE, src)
+    if on_progress:
+        on_progress(size)
+
+
+def _copy_file_range(src, dst, size, buffer_size, on_progress):
+    offset = 0
+    while offset < size:
+        copied = os.copy_file_range(src, dst, min(buffer_size, size - offset), offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+        if on_progress:
+            on_progress(copied)
+    if offset < size:
+        raise OSError(errno.EIO, "copy_file_range stopped early")
+
+
+def _copy_sendfile(src, dst, size, buffer_size, on_progress):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst, src, offset, min(buffer_size, size - offset))
+        if sent == 0:
+            break
+        offset += sent
+        if on_progress:
+            on_progress(sent)
+    if offset < size:
+        raise OSError(errno.EIO, "sendfile stopped early")
+
+
+def _copy_readinto(src, dst, size, buffer_size, on_progress):
+    view = getattr(_copy_buffers, "view", None)
+    if view is None or len(view) != buffer_size:
+        view = _copy_buffers.view = memoryview(bytearray(buffer_size))
+    with open(src, "rb", buffering=0, closefd=False) as reader:
+        while True:
+            count = reader.readinto(view)
+            if not count:
+                break
+            written = 0
+            while written < count:
+                written += os.write(dst, view[written:count])
+            if on_progress:
+                on_progress(count)
+
+
+_copy_functions = {
+    "reflink": _copy_reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _copy_sendfile,
+    "readinto": _copy_readinto,
+}
+
+
+def _copy_method_available(method):
+    if method == "reflink":
+        return sys.platform.startswith("linux")
+    if method == "copy_file_range":
+        return hasattr(os, "copy_file_range")
+    if method == "sendfile":
+        return sys.platform.startswith("linux") and hasattr(os, "sendfile")
+    return True
+
+
+def fast_copy(source, target, on_progress=None, buffer_size=COPY_BUFFER_SIZE, methods=COPY_METHODS):
+    src = os.open(source, os.O_RDONLY)
+    try:
+        st = os.fstat(src)
+        dst = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(src, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            devices = (st.st_dev, os.fstat(dst).st_dev)
+            for method in methods:
+                if not _copy_method_available(method) or (method, devices) in _unsupported_copy_methods:
+                    continue
+                if method != "readinto" and st.st_size == 0:
+                    continue
+                try:
+                    _copy_functions[method](src, dst, st.st_size, buffer_size, on_progress)
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP,
+                                       errno.ENOTTY, errno.EBADF, errno.EPERM):
+                        raise
+                    if os.lseek(dst, 0, os.SEEK_END):
+                        raise
+                    _unsupported_copy_methods.add((method, devices))
+                    continue
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(src, 0, 0, os.POSIX_FADV_DONTNEED)
+                return method
+            raise OSError(errno.ENOTSUP, "no copy method available")
+        finally:
+            os.close(dst)
+    finally:
+        os.close(src)
+
+
+def stat_key(st):
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def unchanged_since(st, kept, keys):
+    key, kept_key = keys
+    try:
+        return stat_key(st) == key and stat_key(os.stat(kept)) == kept_key
+    except OSError:
+        return False
+
+
+class FileJob:
+    _ids = itertools.count(1)
+    verbs = {"copy": "Copying", "move": "Moving", "delete": "Deleting", "rename": "Renaming",
+             "trash": "Moving to trash", "restore": "Restoring", "purge": "Deleting", "link": "Linking"}
+
+    def __init__(self, kind, sources, destination=None, conflict_policy=None, targets=None, keys=None):
+        self.id = next(self._ids)
+        self.kind = kind
+        self.sources = list(sources)
+        self.destination = destination
+        self.targets = list(targets) if targets is not None else None
+        self.keys = list(keys) if keys is not None else None
+        self.conflict_policy = conflict_policy
+        self.plan = []
+        self.conflicts = []
+        self.skipped = 0
+        self.failed = []
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.files_total = 0
+        self.files_done = 0
+        self.current_path = ""
+        self.error = None
+        self.cancelled = False
+        self.paused = False
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+
+    def pause(self):
+        self.paused = True
+        self._resume_event.clear()
+
+    def resume(self):
+        self.paused = False
+        self._resume_event.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self._resume_event.set()
+
+    def resolve_conflicts(self, policy):
+        self.conflict_policy = policy
+        self.resume()
+
+    def checkpoint(self):
+        self._resume_event.wait()
+        if self.cancelled:
+            raise JobCancelled()
+
+    def describe(self):
+        if not self.bytes_total:
+            return f"{self.verbs[self.kind]} {self.files_done}/{self.files_total} files"
+        return (f"{self.verbs[self.kind]} {self.files_done}/{self.files_total} files, "
+                f"{format_size(self.bytes_done)} of {format_size(self.bytes_total)}")
+
+
+class PlannedItem:
+    __slots__ = ("source", "target", "same_device", "files", "size", "conflict")
+
+    def __init__(self, source, target, same_device, files, size, conflict=False):
+        self.source = source
+        self.target = target
+        self.same_device = same_device
+        self.files = files
+        self.size = size
+        self.conflict = conflict
+
+
+class FileOperationQueue(QObject):
+    job_started = pyqtSignal(object)
+    job_progress = pyqtSignal(object)
+    job_conflicts = pyqtSignal(object)
+    job_finished = pyqtSignal(object)
+
+    progress_interval = 0.1
+    buffer_size = COPY_BUFFER_SIZE
+
+    def __init__(self, remote=None, trash=None, parent=None):
+        super().__init__(parent)
+        self.remote = remote
+        self.trash = trash
+        self.jobs = queue.Queue()
+        self.pending = []
+        self.active_job = None
+        self._last_progress = 0.0
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="file-operations", daemon=True)
+        self._worker.start()
+
+    def submit(self, job):
+        with self._lock:
+            self.pending.append(job)
+        self.jobs.put(job)
+        return job
+
+    def all_jobs(self):
+        with self._lock:
+            jobs = list(self.pending)
+        if self.active_job is not None:
+            jobs.insert(0, self.active_job)
+        return jobs
+
+    def is_busy(self):
+        return bool(self.all_jobs())
+
+    def pause_all(self):
+        for job in self.all_jobs():
+            job.pause()
+
+    def resume_all(self):
+        for job in self.all_jobs():
+            if not job.conflicts or job.conflict_policy is not None:
+                job.resume()
+
+    def cancel_all(self):
+        for job in self.all_jobs():
+            job.cancel()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            with self._lock:
+                if job in self.pending:
+                    self.pending.remove(job)
+            self.active_job = job
+            self.job_started.emit(job)
+            started = time.perf_counter()
+            try:
+                job.checkpoint()
+                if self.remote is not None and self.remote.handles(job):
+                    self.remote.run_job(job, self)
+                elif self.trash is not None and job.kind in self.trash.kinds:
+                    self.trash.run_job(job, self)
+                else:
+                    if job.kind not in ("rename", "link"):
+                        self._plan(job)
+                    getattr(self, f"_run_{job.kind}")(job)
+            except JobCancelled:
+                pass
+            except Exception as e:
+                job.error = f"{job.current_path}: {e}" if job.current_path else str(e)
+            perf.record(f"job.{job.kind}", time.perf_counter() - started, job.sources[0] if job.sources else "", started)
+            perf.count(f"job.{job.kind}.files", job.files_done)
+            self.active_job = None
+            self.job_finished.emit(job)
+
+    def _report(self, job, force=False):
+        now = time.monotonic()
+        if force or now - self._last_progress >= self.progress_interval:
+            self._last_progress = now
+            self.job_progress.emit(job)
+
+    def _walk(self, path):
+        st = os.lstat(path)
+        if not stat.S_ISDIR(st.st_mode):
+            yield path, st
+            return
+        for entry in os.scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._walk(entry.path)
+            else:
+                yield entry.path, entry.stat(follow_symlinks=False)
+        yield path, st
+
+    def _plan(self, job):
+        destination_device = os.stat(job.destination).st_dev if job.destination else None
+        for source in job.sources:
+            job.checkpoint()
+            job.current_path = source
+            try:
+                st = os.lstat(source)
+            except FileNotFoundError:
+                job.skipped += 1
+                continue
+            target = None
+            conflict = False
+            if job.kind != "delete":
+                name = os.path.basename(source.rstrip(os.sep))
+                target = os.path.join(job.destination, name)
+                if stat.S_ISDIR(st.st_mode) and \
+                        (job.destination.rstrip(os.sep) + os.sep).startswith(source.rstrip(os.sep) + os.sep):
+                    raise OSError(errno.EINVAL, f"Cannot {job.kind} a folder into itself")
+                if os.path.lexists(target):
+                    if os.path.abspath(source) == os.path.abspath(target):
+                        if job.kind == "move":
+                            job.skipped += 1
+                            continue
+                        target = self._unique_target(target)
+                    else:
+                        conflict = True
+                        job.conflicts.append(target)
+            files, size = 0, 0
+            for path, entry_stat in self._walk(source):
+                job.checkpoint()
+                files += 1
+                if stat.S_ISREG(entry_stat.st_mode):
+                    size += entry_stat.st_size
+            job.plan.append(PlannedItem(source, target, st.st_dev == destination_device, files, size, conflict))
+            job.files_total += files
+            job.bytes_total += size
+            self._report(job)
+        job.current_path = ""
+        if job.conflicts:
+            if job.conflict_policy is None:
+                job.pause()
+                self.job_conflicts.emit(job)
+                job.checkpoint()
+            self._apply_conflict_policy(job)
+        if job.kind == "move":
+            job.plan.sort(key=lambda item: not item.same_device)
+        self._report(job, force=True)
+
+    def _apply_conflict_policy(self, job):
+        plan = []
+        for item in job.plan:
+            if item.conflict and job.conflict_policy == "skip":
+                job.skipped += 1
+                job.files_total -= item.files
+                job.bytes_total -= item.size
+                continue
+            if item.conflict and job.conflict_policy == "rename":
+                item.target = self._unique_target(item.target)
+                item.conflict = False
+            plan.append(item)
+        job.plan = plan
+
+    def _unique_target(self, target):
+        base, extension = os.path.splitext(target)
+        if os.path.isdir(target):
+            base, extension = target, ""
+        counter = 2
+        while os.path.lexists(f"{base} ({counter}){extension}"):
+            counter += 1
+        return f"{base} ({counter}){extension}"
+
+    def _remove_tree(self, job, path, count=True):
+        for entry_path, st in self._walk(path):
+            job.checkpoint()
+            job.current_path = entry_path
+            if stat.S_ISDIR(st.st_mode):
+                os.rmdir(entry_path)
+            else:
+                os.remove(entry_path)
+            if count:
+                if stat.S_ISREG(st.st_mode):
+                    job.bytes_done += st.st_size
+                job.files_done += 1
+                self._report(job)
+
+    def _clear_conflict(self, job, item):
+        if item.conflict:
+            self._remove_tree(job, item.target, count=False)
+
+    def _run_link(self, job):
+        job.files_total = len(job.sources)
+        self._report(job, force=True)
+        for path, source, (key, source_key) in zip(job.sources, job.targets, job.keys):
+            job.checkpoint()
+            job.current_path = path
+            temporary = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.aldernys-link-{job.id}")
+            try:
+                st, source_st = os.lstat(path), os.stat(source)
+                if stat_key(st) != key or stat_key(source_st) != source_key:
+                    raise OSError(errno.ESTALE, "File changed since the scan")
+                if (st.st_dev, st.st_ino) != (source_st.st_dev, source_st.st_ino):
+                    os.link(source, temporary)
+                    os.replace(temporary, path)
+                    job.bytes_done += st.st_size
+                job.files_done += 1
+            except OSError as e:
+                job.failed.append(f"{path}: {e.strerror}")
+                try:
+                    os.unlink(temporary)
+                except OSError:
+                    pass
+            self._report(job)
+        job.current_path = ""
+        self._report(job, force=True)
+
+    def _run_rename(self, job):
+        pending = dict(zip(job.sources, job.targets))
+        for source, target in pending.items():
+            job.checkpoint()
+            if os.path.lexists(target) and target not in pending:
+                raise OSError(errno.EEXIST, f"{target} already exists")
+        job.files_total = len(pending)
+        self._report(job, force=True)
+        done = set()
+        temporary = itertools.count(1)
+        for start in list(pending):
+            job.checkpoint()
+            chain, chained = [], set()
+            source = start
+            while source in pending and source not in done and source not in chained:
+                chain.append(source)
+                chained.add(source)
+                source = pending[source]
+            if source in chained:
+                held = os.path.join(os.path.dirname(source), f".aldernys-rename-{job.id}-{next(temporary)}")
+                os.rename(source, held)
+                done.add(source)
+                pending[held] = pending[source]
+                chain[chain.index(source)] = held
+            for source in reversed(chain):
+                job.current_path = source
+                os.rename(source, pending[source])
+                done.add(source)
+                job.files_done += 1
+                self._report(job)
+        job.current_path = ""
+        self._report(job, force=True)
+
+    def _run_delete(self, job):
+        for item in job.plan:
+            self._remove_tree(job, item.source)
+        self._report(job, force=True)
+
+    def _run_copy(self, job):
+        for item in job.plan:
+            self._clear_conflict(job, item)
+            self._copy_tree(job, item.source, item.target)
+        self._report(job, force=True)
+
+    def _run_move(self, job):
+        for item in job.plan:
+            job.checkpoint()
+            job.current_path = item.source
+            self._clear_conflict(job, item)
+            if item.same_device:
+                try:
+                    os.rename(item.source, item.target)
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                else:
+                    job.files_done += item.files
+                    job.bytes_done += item.size
+                    self._report(job)
+                    continue
+            self._copy_tree(job, item.source, item.target)
+            self._remove_tree(job, item.source, count=False)
+        self._report(job, force=True)
+
+    def _copy_tree(self, job, source, target):
+        job.checkpoint()
+        job.current_path = source
+        st = os.lstat(source)
+        if stat.S_ISLNK(st.st_mode):
+            os.symlink(os.readlink(source), target)
+        elif stat.S_ISDIR(st.st_mode):
+            os.mkdir(target)
+            for entry in os.scandir(source):
+                self._copy_tree(job, entry.path, os.path.join(target, entry.name))
+            os.chmod(target, stat.S_IMODE(st.st_mode))
+        else:
+            self._copy_file(job, source, target, st)
+        job.files_done += 1
+        self._report(job)
+
+    def _copy_file(self, job, source, target, st):
+        def on_progress(count):
+            job.bytes_done += count
+            self._report(job)
+            job.checkpoint()
+
+        try:
+            fast_copy(source, target, on_progress, self.buffer_size)
+        except BaseException:
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+            raise
+        os.chmod(target, stat.S_IMODE(st.st_mode))
+        os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+class TrashStore(QObject):
+    items_ready = pyqtSignal(int, object)
+
+    kinds = ("trash", "restore", "purge")
+    batch_size = 256
+
+    def __init__(self, cache_path, parent=None):
+        super().__init__(parent)
+        self.cache_path = cache_path
+        self.uid = os.getuid()
+        data_home = os.environ.get("XDG_DATA_HOME") or os.path.join(QDir.homePath(), ".local", "share")
+        self.home = os.path.join(data_home, "Trash")
+        self.lock = threading.RLock()
+        self.devices = {}
+        self.entries = {}
+        self.mtimes = {}
+        self.suffixes = {}
+        self.generation = 0
+        self.created = False
+
+    def connect(self):
+        with self.lock:
+            if not self.created:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            db = sqlite3.connect(self.cache_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            if not self.created:
+                db.executescript("""
+                    CREATE TABLE IF NOT EXISTS trashes (trash TEXT PRIMARY KEY, mtime REAL);
+                    CREATE TABLE IF NOT EXISTS items (
+                        trash TEXT, name TEXT, path TEXT, deleted TEXT, PRIMARY KEY (trash, name)
+                    );
+                """)
+                self.created = True
+        return db
+
+    def create(self, trash):
+        for name in ("files", "info"):
+            os.makedirs(os.path.join(trash, name), mode=0o700, exist_ok=True)
+        return trash
+
+    def top_dir(self, path, device):
+        path = os.path.abspath(path)
+        while True:
+            parent = os.path.dirname(path)
+            try:
+                if parent == path or os.lstat(parent).st_dev != device:
+                    return path
+            except OSError:
+                return path
+            path = parent
+
+    def top_of(self, trash):
+        if trash == self.home:
+            return os.path.dirname(trash)
+        parent = os.path.dirname(trash)
+        return os.path.dirname(parent) if os.path.basename(parent) == ".Trash" else parent
+
+    def trash_for(self, path, device):
+        if device in self.devices:
+            return self.devices[device]
+        trash = None
+        try:
+            self.create(self.home)
+            if os.stat(self.home).st_dev == device:
+                trash = self.home
+            else:
+                top = self.top_dir(path, device)
+                try:
+                    st = os.lstat(os.path.join(top, ".Trash"))
+                    if stat.S_ISDIR(st.st_mode) and st.st_mode & stat.S_ISVTX:
+                        trash = self.create(os.path.join(top, ".Trash", str(self.uid)))
+                except OSError:
+                    pass
+                if trash is None:
+                    trash = self.create(os.path.join(top, f".Trash-{self.uid}"))
+        except OSError:
+            trash = None
+        self.devices[device] = trash
+        return trash
+
+    def trash_dirs(self):
+        with self.connect() as db:
+            trashes = {self.home} | {row[0] for row in db.execute("SELECT trash FROM trashes")}
+        try:
+            with open("/proc/self/mounts") as f:
+                mounts = [line.split()[1] for line in f if line.startswith("/dev/")]
+        except OSError:
+            mounts = []
+        for mount in mounts:
+            top = re.sub(r"\\([0-7]{3})", lambda match: chr(int(match.group(1), 8)), mount)
+            for trash in (os.path.join(top, ".Trash", str(self.uid)), os.path.join(top, f".Trash-{self.uid}")):
+                if os.path.isdir(os.path.join(trash, "info")):
+                    trashes.add(trash)
+        return sorted(trashes)
+
+    def read_info(self, trash, name):
+        from urllib.parse import unquote
+        try:
+            with open(os.path.join(trash, "info", name + ".trashinfo"), "rb") as f:
+                data = f.read(8192).decode("utf-8", "replace")
+        except OSError:
+            return None
+        path = deleted = None
+        for line in data.splitlines():
+            if line.startswith("Path="):
+                path = unquote(line[5:])
+            elif line.startswith("DeletionDate="):
+                deleted = line[13:]
+        if not path:
+            return None
+        return os.path.join(self.top_of(trash), path), deleted or ""
+
+    def refresh(self):
+        with self.lock:
+            for trash in self.trash_dirs():
+                info = os.path.join(trash, "info")
+                try:
+                    mtime = os.stat(info).st_mtime
+                except OSError:
+                    continue
+                if trash not in self.entries:
+                    with self.connect() as db:
+                        self.entries[trash] = {name: (path, deleted) for name, path, deleted in db.execute(
+                            "SELECT name, path, deleted FROM items WHERE trash = ?", (trash,))}
+                        row = db.execute("SELECT mtime FROM trashes WHERE trash = ?", (trash,)).fetchone()
+                        self.mtimes[trash] = row[0] if row else None
+                if self.mtimes.get(trash) == mtime:
+                    continue
+                known = self.entries[trash]
+                names = {name[:-10] for name in os.listdir(info) if name.endswith(".trashinfo")}
+                removed = known.keys() - names
+                for name in removed:
+                    del known[name]
+                rows = []
+                for name in names - known.keys():
+                    parsed = self.read_info(trash, name)
+                    if parsed is not None:
+                        known[name] = parsed
+                        rows.append((trash, name) + parsed)
+                self.mtimes[trash] = mtime
+                with self.connect() as db:
+                    db.executemany("DELETE FROM items WHERE trash = ? AND name = ?", ((trash, name) for name in removed))
+                    db.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)", rows)
+                    db.execute("INSERT OR REPLACE INTO trashes VALUES (?, ?)", (trash, mtime))
+            items = [(trash, name, path, deleted)
+                     for trash, known in self.entries.items() for name, (path, deleted) in known.items()]
+        items.sort(key=operator.itemgetter(3), reverse=True)
+        return items
+
+    def load(self):
+        self.generation += 1
+        threading.Thread(target=self._load, args=(self.generation,), name="trash-index", daemon=True).start()
+        return self.generation
+
+    def _load(self, generation):
+        with perf.span("trash.index"):
+            items = self.refresh()
+        self.items_ready.emit(generation, items)
+
+    def add(self, trash, rows):
+        with self.lock:
+            known = self.entries.get(trash)
+            if known is not None:
+                for name, path, deleted in rows:
+                    known[name] = (path, deleted)
+            with self.connect() as db:
+                db.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)",
+                               ((trash, name, path, deleted) for name, path, deleted in rows))
+                db.execute("INSERT OR IGNORE INTO trashes VALUES (?, NULL)", (trash,))
+
+    def discard(self, removed):
+        with self.lock:
+            with self.connect() as db:
+                for trash, names in removed.items():
+                    known = self.entries.get(trash, {})
+                    for name in names:
+                        known.pop(name, None)
+                    db.executemany("DELETE FROM items WHERE trash = ? AND name = ?", ((trash, name) for name in names))
+
+    def reserve(self, trash, source, content, occupied):
+        name = os.path.basename(source.rstrip(os.sep))
+        stem, extension = os.path.splitext(name)
+        counter = self.suffixes.get((trash, name), 1)
+        while True:
+            candidate = name if counter == 1 else f"{stem}.{counter}{extension}"
+            info = os.path.join(trash, "info", candidate + ".trashinfo")
+            try:
+                fd = os.open(info, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                counter += 1
+                continue
+            if candidate in occupied:
+                os.close(fd)
+                os.remove(info)
+                counter += 1
+                continue
+            break
+        try:
+            os.write(fd, content)
+        finally:
+            os.close(fd)
+        self.suffixes[(trash, name)] = counter + 1
+        occupied.add(candidate)
+        return candidate
+
+    def remove_info(self, trash, name):
+        try:
+            os.remove(os.path.join(trash, "info", name + ".trashinfo"))
+        except FileNotFoundError:
+            pass
+
+    def run_job(self, job, queue):
+        getattr(self, f"_run_{job.kind}")(job, queue)
+
+    def _run_trash(self, job, queue):
+        from urllib.parse import quote
+        job.files_total = len(job.sources)
+        groups = {}
+        for position, source in enumerate(job.sources):
+            job.checkpoint()
+            try:
+                st = os.lstat(source)
+            except FileNotFoundError:
+                job.skipped += 1
+                continue
+            if job.keys is not None and not unchanged_since(st, job.targets[position], job.keys[position]):
+                job.skipped += 1
+                continue
+            trash = self.trash_for(source, st.st_dev)
+            if trash is None or (trash + os.sep).startswith(source.rstrip(os.sep) + os.sep):
+                job.failed.append(source)
+                continue
+            groups.setdefault(trash, []).append(source)
+        deleted = time.strftime("%Y-%m-%dT%H:%M:%S")
+        for trash, sources in groups.items():
+            top = self.top_of(trash)
+            occupied = set(os.listdir(os.path.join(trash, "files")))
+            for start in range(0, len(sources), self.batch_size):
+                job.checkpoint()
+                batch = []
+                for source in sources[start:start + self.batch_size]:
+                    original = source if trash == self.home else os.path.relpath(source, top)
+                    content = f"[Trash Info]\nPath={quote(original)}\nDeletionDate={deleted}\n".encode()
+                    batch.append((source, self.reserve(trash, source, content, occupied)))
+                rows = []
+                try:
+                    while batch:
+                        source, name = batch[0]
+                        job.current_path = source
+                        try:
+                            os.rename(source, os.path.join(trash, "files", name))
+                        except OSError as e:
+                            if e.errno not in (errno.EXDEV, errno.ENOENT):
+                                raise
+                            self.remove_info(trash, name)
+                            if e.errno == errno.EXDEV:
+                                job.failed.append(source)
+                            else:
+                                job.skipped += 1
+                        else:
+                            rows.append((name, source, deleted))
+                            job.files_done += 1
+                        batch.pop(0)
+                    queue._report(job)
+                finally:
+                    for source, name in batch:
+                        self.remove_info(trash, name)
+                    self.add(trash, rows)
+        job.current_path = ""
+        queue._report(job, force=True)
+
+    def _run_restore(self, job, queue):
+        job.files_total = len(job.sources)
+        removed = {}
+        try:
+            for source, target in zip(job.sources, job.targets):
+                job.checkpoint()
+                job.current_path = source
+                files, name = os.path.split(source)
+                trash = os.path.dirname(files)
+                if os.path.lexists(target):
+                    target = queue._unique_target(target)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                try:
+                    os.rename(source, target)
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    import shutil
+                    shutil.move(source, target)
+                self.remove_info(trash, name)
+                removed.setdefault(trash, []).append(name)
+                job.files_done += 1
+                queue._report(job)
+        finally:
+            self.discard(removed)
+        job.current_path = ""
+        queue._report(job, force=True)
+
+    def _run_purge(self, job, queue):
+        job.files_total = len(job.sources)
+        removed = {}
+        try:
+            for source in job.sources:
+                job.checkpoint()
+                job.current_path = source
+                files, name = os.path.split(source)
+                trash = os.path.dirname(files)
+                if os.path.lexists(source):
+                    queue._remove_tree(job, source, count=False)
+                self.remove_info(trash, name)
+                removed.setdefault(trash, []).append(name)
+                job.files_done += 1
+                queue._report(job)
+                if len(removed[trash]) >= self.batch_size:
+                    self.discard(removed)
+                    removed = {}
+        finally:
+            self.discard(removed)
+        job.current_path = ""
+        queue._report(job, force=True)
+
+
+class TrashModel(QAbstractTableModel):
+    headers = ("Name", "Original Location", "Deleted")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.items = []
+
+    def set_items(self, items):
+        self.beginResetModel()
+        self.items = items
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 3
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        trash, name, path, deleted = self.items[index.row()]
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return os.path.basename(path)
+            if column == 1:
+                return os.path.dirname(path)
+            return deleted.replace("T", " ")
+        if role == Qt.ToolTipRole:
+            return path
+        return None
+
+
+def entry_sort_key(entry):
+    return not stat.S_ISDIR(entry[1]), entry[0].casefold()
+
+
+def list_directory(path):
+    mtime = os.stat(path).st_mtime
+    entries = []
+    with os.scandir(path) as scan:
+        for entry in scan:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            entries.append((entry.name, stat.S_IFDIR if is_dir else stat.S_IFREG))
+    entries.sort(key=entry_sort_key)
+    return mtime, entries
+
+
+class DirectoryListing:
+    __slots__ = ("path", "mtime", "entries", "cost")
+
+    def __init__(self, path, mtime, entries):
+        self.path = path
+        self.mtime = mtime
+        self.entries = tuple(entries)
+        self.cost = sum(len(name) for name, mode in self.entries) * 2 + 120 * len(self.entries)
+
+
+class ListingCache:
+    max_entries = 1000000
+    max_bytes = 128 * 1024 * 1024
+
+    def __init__(self):
+        self.listings = OrderedDict()
+        self.entries = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        with self.lock:
+            listing = self.listings.get(path)
+            if listing is not None:
+                self.listings.move_to_end(path)
+            return listing
+
+    def put(self, path, mtime, entries):
+        listing = DirectoryListing(path, mtime, entries)
+        if len(listing.entries) > self.max_entries or listing.cost > self.max_bytes:
+            self.invalidate(path)
+            return None
+        with self.lock:
+            self._remove(path)
+            self.listings[path] = listing
+            self.entries += len(listing.entries)
+            self.bytes += listing.cost
+            while self.entries > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.listings)))
+        return listing
+
+    def invalidate(self, path):
+        with self.lock:
+            self._remove(path)
+
+    def _remove(self, path):
+        listing = self.listings.pop(path, None)
+        if listing is not None:
+            self.entries -= len(listing.entries)
+            self.bytes -= listing.cost
+
+
+class DirectoryPrefetcher:
+    queue_limit = 32
+
+    def __init__(self, cache, remote=None):
+        self.cache = cache
+        self.remote = remote
+        self.requests = OrderedDict()
+        self.condition = threading.Condition()
+        threading.Thread(target=self._run, name="directory-prefetch", daemon=True).start()
+
+    def prefetch(self, paths):
+        paths = [path for path in paths if path]
+        if self.remote is not None:
+            self.remote.prefetch(path for path in paths if is_remote_path(path))
+            paths = [path for path in paths if not is_remote_path(path)]
+        with self.condition:
+            for path in paths:
+                if path:
+                    self.requests[path] = True
+                    self.requests.move_to_end(path)
+            while len(self.requests) > self.queue_limit:
+                self.requests.popitem(last=False)
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.requests:
+                    self.condition.wait()
+                path, _ = self.requests.popitem(last=True)
+            try:
+                listing = self.cache.get(path)
+                if listing is not None and listing.mtime == os.stat(path).st_mtime:
+                    continue
+                self.cache.put(path, *list_directory(path))
+            except OSError:
+                continue
+
+
+class DirectoryScanner(QObject):
+    batch_ready = pyqtSignal(int, object)
+    scan_finished = pyqtSignal(int, str, float)
+
+    first_batch_size = 256
+    batch_size = 4096
+
+    def __init__(self, cache=None, remote=None, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.remote = remote
+        self.generation = 0
+
+    def scan(self, path, known_mtime=None, use_cache=True):
+        self.generation += 1
+        remote = self.remote is not None and is_remote_path(path)
+        threading.Thread(
+            target=self._run_remote if remote else self._run,
+            args=(path, known_mtime, self.generation) + ((use_cache,) if remote else ()),
+            name="directory-scan", daemon=True
+        ).start()
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def _run(self, path, known_mtime, generation):
+        batch = []
+        listing = []
+        limit = self.first_batch_size
+        error = ""
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError as e:
+            self.scan_finished.emit(generation, e.strerror or str(e), 0.0)
+            return
+        if mtime == known_mtime:
+            self.scan_finished.emit(generation, "", mtime)
+            return
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if generation != self.generation:
+                        return
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    batch.append((entry.name, stat.S_IFDIR if is_dir else stat.S_IFREG))
+                    if len(batch) >= limit:
+                        self.batch_ready.emit(generation, batch)
+                        listing.extend(batch)
+                        batch = []
+                        limit = self.batch_size
+        except OSError as e:
+            error = e.strerror or str(e)
+        if generation != self.generation:
+            return
+        if batch:
+            self.batch_ready.emit(generation, batch)
+            listing.extend(batch)
+        if self.cache is not None and not error:
+            listing.sort(key=entry_sort_key)
+            self.cache.put(path, mtime, listing)
+        self.scan_finished.emit(generation, error, mtime)
+
+    def _run_remote(self, path, known_mtime, generation, use_cache):
+        try:
+            mtime, listing = self.remote.list_directory(path, use_cache)
+        except OSError as e:
+            if generation == self.generation:
+                self.scan_finished.emit(generation, e.strerror or str(e), 0.0)
+            return
+        if generation != self.generation:
+            return
+        if not mtime or mtime != known_mtime:
+            for start in range(0, len(listing), self.batch_size):
+                self.batch_ready.emit(generation, listing[start:start + self.batch_size])
+        self.scan_finished.emit(generation, "", mtime)
+
+
+REMOTE_SCHEMES = {"sftp": 22, "webdav": 80, "webdavs": 443, "archive": 0}
+ARCHIVE_SUFFIXES = (".zip", ".jar", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+WEBDAV_ERRORS = {401: errno.EACCES, 403: errno.EACCES, 404: errno.ENOENT, 405: errno.EEXIST, 409: errno.ENOENT,
+                 412: errno.EEXIST, 507: errno.ENOSPC}
+WEBDAV_PROPFIND = (b'<?xml version="1.0" encoding="utf-8"?><propfind xmlns="DAV:"><prop>'
+                   b'<resourcetype/><getcontentlength/><getlastmodified/></prop></propfind>')
+
+
+def is_remote_path(path):
+    scheme, separator, rest = path.partition("://")
+    return bool(separator) and scheme.lower() in REMOTE_SCHEMES
+
+
+def normalize_remote_path(uri):
+    scheme, _, rest = uri.partition("://")
+    authority, _, path = rest.partition("/")
+    userinfo, at, hostport = authority.rpartition("@")
+    if at:
+        authority = userinfo.partition(":")[0] + at + hostport
+    path = posixpath.normpath("/" + path)
+    if path.startswith("//"):
+        path = path[1:]
+    return f"{scheme.lower()}://{authority}{path}"
+
+
+def is_archive_name(name):
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def split_archive_path(path):
+    end = 0
+    while end >= 0:
+        end = path.find("/", end + 1)
+        prefix = path if end < 0 else path[:end]
+        if is_archive_name(prefix) and os.path.isfile(prefix):
+            return prefix
+    raise FileNotFoundError(errno.ENOENT, "No archive in the path", path)
+
+
+def path_to_url(path):
+    return QUrl(path) if is_remote_path(path) else QUrl.fromLocalFile(path)
+
+
+def url_to_path(url):
+    if url.isLocalFile():
+        return url.toLocalFile()
+    path = url.toString()
+    return normalize_remote_path(path) if is_remote_path(path) else ""
+
+
+def remote_stat(mode, size, mtime):
+    return os.stat_result((mode, 0, 0, 1, 0, 0, size, mtime, mtime, mtime))
+
+
+class RemoteLocation:
+    __slots__ = ("scheme", "user", "password", "host", "port", "path", "key")
+
+    def __init__(self, uri):
+        from urllib.parse import unquote
+        scheme, _, rest = uri.partition("://")
+        authority, _, path = rest.partition("/")
+        userinfo, _, hostport = authority.rpartition("@")
+        host, _, port = hostport.rpartition(":") if not hostport.endswith("]") else (hostport, "", "")
+        if not host or not port.isdigit():
+            host, port = hostport, ""
+        self.scheme = scheme.lower()
+        if self.scheme not in REMOTE_SCHEMES or not (host or self.scheme == "archive"):
+            raise OSError(errno.EINVAL, f"Unsupported location: {uri}")
+        user, _, password = userinfo.partition(":")
+        self.user = unquote(user) or None
+        self.password = unquote(password) if password else None
+        self.host = host.strip("[]")
+        self.port = int(port) if port else REMOTE_SCHEMES[self.scheme]
+        self.path = posixpath.normpath("/" + path)
+        self.key = (self.scheme, self.user, self.host, self.port)
+
+
+class LocalFiles:
+    ranged_reads = True
+    ranged_writes = True
+
+    def listdir(self, path):
+        entries = []
+        with os.scandir(path) as scan:
+            for entry in scan:
+                st = entry.stat(follow_symlinks=False)
+                entries.append((entry.name, st.st_mode, st.st_size, st.st_mtime))
+        return entries
+
+    def stat(self, path):
+        return os.lstat(path)
+
+    def read_range(self, path, offset, size):
+        with open(path, "rb", buffering=0) as f:
+            chunks = []
+            while size > 0:
+                data = os.pread(f.fileno(), size, offset)
+                if not data:
+                    break
+                chunks.append(data)
+                offset += len(data)
+                size -= len(data)
+            return b"".join(chunks)
+
+    def write_range(self, path, offset, data):
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(fd, view, offset)
+                view = view[written:]
+                offset += written
+        finally:
+            os.close(fd)
+
+    def create(self, path):
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+
+    def mkdir(self, path):
+        os.mkdir(path)
+
+    def remove(self, path, is_dir):
+        if is_dir:
+            os.rmdir(path)
+        else:
+            os.remove(path)
+
+    def rename(self, source, target):
+        os.replace(source, target)
+
+    def utime(self, path, mtime):
+        os.utime(path, (mtime, mtime))
+
+    def alive(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class SftpConnection:
+    ranged_reads = True
+    ranged_writes = True
+    read_aheads = 64
+
+    def __init__(self, client):
+        self.client = client
+        self.sftp = client.get_transport().open_sftp_client()
+        self.sftp.get_channel().settimeout(30)
+
+    def listdir(self, path):
+        entries = []
+        for attr in self.sftp.listdir_iter(path, read_aheads=self.read_aheads):
+            mode = attr.st_mode or stat.S_IFREG
+            if stat.S_ISLNK(mode):
+                try:
+                    attr = self.sftp.stat(posixpath.join(path, attr.filename))
+                    mode = attr.st_mode or stat.S_IFREG
+                except OSError:
+                    pass
+            entries.append((attr.filename, mode, attr.st_size or 0, float(attr.st_mtime or 0)))
+        return entries
+
+    def stat(self, path):
+        attr = self.sftp.stat(path)
+        return remote_stat(attr.st_mode or stat.S_IFREG, attr.st_size or 0, float(attr.st_mtime or 0))
+
+    def read_range(self, path, offset, size):
+        if not size:
+            return b""
+        with self.sftp.open(path, "rb") as f:
+            return b"".join(f.readv([(offset, size)]))
+
+    def write_range(self, path, offset, data):
+        with self.sftp.open(path, "r+b") as f:
+            f.set_pipelined(True)
+            f.seek(offset)
+            f.write(data)
+
+    def create(self, path):
+        self.sftp.open(path, "wb").close()
+
+    def mkdir(self, path):
+        self.sftp.mkdir(path)
+
+    def remove(self, path, is_dir):
+        if is_dir:
+            self.sftp.rmdir(path)
+        else:
+            self.sftp.remove(path)
+
+    def rename(self, source, target):
+        try:
+            self.sftp.posix_rename(source, target)
+        except OSError:
+            self.sftp.rename(source, target)
+
+    def utime(self, path, mtime):
+        self.sftp.utime(path, (mtime, mtime))
+
+    def alive(self):
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active() and not self.sftp.sock.closed
+
+    def close(self):
+        self.sftp.close()
+
+
+class WebDavConnection:
+    ranged_reads = True
+    ranged_writes = False
+
+    def __init__(self, location):
+        import http.client
+        import base64
+        if location.scheme == "webdavs":
+            self.http = http.client.HTTPSConnection(location.host, location.port, timeout=30)
+        else:
+            self.http = http.client.HTTPConnection(location.host, location.port, timeout=30)
+        self.base = f"{'https' if location.scheme == 'webdavs' else 'http'}://{location.host}:{location.port}"
+        self.headers = {}
+        user, password = location.user, location.password
+        if password is None:
+            import netrc
+            try:
+                credentials = netrc.netrc().authenticators(location.host)
+            except (OSError, netrc.NetrcParseError):
+                credentials = None
+            if credentials and (user is None or user == credentials[0]):
+                user, password = credentials[0], credentials[2]
+        if user:
+            token = base64.b64encode(f"{user}:{password or ''}".encode()).decode()
+            self.headers["Authorization"] = f"Basic {token}"
+        self.broken = False
+
+    def request(self, method, path, body=None, headers=None, expect=(200,)):
+        import http.client
+        from urllib.parse import quote
+        try:
+            self.http.request(method, quote(path), body, dict(self.headers, **(headers or {})))
+            response = self.http.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.broken = True
+            self.http.close()
+            raise OSError(errno.EIO, f"{method} {path}: {e}")
+        if response.will_close:
+            self.broken = True
+        if response.status not in expect:
+            raise OSError(WEBDAV_ERRORS.get(response.status, errno.EIO), f"{response.status} {response.reason}", path)
+        return response, data
+
+    def propfind(self, path, depth):
+        import xml.etree.ElementTree as ElementTree
+        from email.utils import parsedate_to_datetime
+        from urllib.parse import unquote, urlsplit
+        response, data = self.request("PROPFIND", path, WEBDAV_PROPFIND, {
+            "Depth": str(depth), "Content-Type": 'application/xml; charset="utf-8"'}, expect=(207,))
+        entries = []
+        for node in ElementTree.fromstring(data).iter("{DAV:}response"):
+            href = unquote(urlsplit(node.findtext("{DAV:}href", "")).path)
+            is_dir = node.find(".//{DAV:}resourcetype/{DAV:}collection") is not None
+            size = node.findtext(".//{DAV:}getcontentlength")
+            modified = node.findtext(".//{DAV:}getlastmodified")
+            try:
+                mtime = parsedate_to_datetime(modified).timestamp() if modified else 0.0
+            except (TypeError, ValueError):
+                mtime = 0.0
+            entries.append((posixpath.normpath("/" + href.lstrip("/")), stat.S_IFDIR | 0o755 if is_dir else stat.S_IFREG | 0o644,
+                            int(size) if size and size.isdigit() else 0, mtime))
+        return entries
+
+    def listdir(self, path):
+        path = posixpath.normpath(path)
+        return [(posixpath.basename(href), mode, size, mtime)
+                for href, mode, size, mtime in self.propfind(path.rstrip("/") + "/", 1) if href != path]
+
+    def stat(self, path):
+        entries = self.propfind(path, 0)
+        if not entries:
+            raise FileNotFoundError(errno.ENOENT, "Not found", path)
+        href, mode, size, mtime = entries[0]
+        return remote_stat(mode, size, mtime)
+
+    def read_range(self, path, offset, size):
+        if not size:
+            return b""
+        response, data = self.request("GET", path, headers={"Range": f"bytes={offset}-{offset + size - 1}"},
+                                      expect=(200, 206))
+        return data if response.status == 206 else data[offset:offset + size]
+
+    def write(self, path, chunks, size):
+        self.request("PUT", path, chunks, {"Content-Length": str(size)}, expect=(200, 201, 204))
+
+    def create(self, path):
+        self.write(path, b"", 0)
+
+    def mkdir(self, path):
+        self.request("MKCOL", path, expect=(201,))
+
+    def remove(self, path, is_dir):
+        self.request("DELETE", path, expect=(200, 204, 404))
+
+    def rename(self, source, target):
+        from urllib.parse import quote
+        self.request("MOVE", source, headers={"Destination": self.base + quote(target), "Overwrite": "T"},
+                     expect=(201, 204))
+
+    def utime(self, path, mtime):
+        pass
+
+    def alive(self):
+        return not self.broken
+
+    def close(self):
+        self.http.close()
+
+
+class ArchiveIndex:
+    def __init__(self, path):
+        import zipfile
+        import tarfile
+        self.path = path
+        st = os.stat(path)
+        self.signature = (st.st_mtime, st.st_size)
+        self.lock = threading.Lock()
+        self.users = 0
+        self.closed = False
+        self.directories = {"": {}}
+        self.members = {}
+        with perf.span("archive.index", path):
+            if zipfile.is_zipfile(path):
+                self.archive = zipfile.ZipFile(path)
+                times = {}
+                for info in self.archive.infolist():
+                    mtime = times.get(info.date_time)
+                    if mtime is None:
+                        mtime = times[info.date_time] = time.mktime(info.date_time + (0, 0, -1))
+                    self.add(info.filename, info.is_dir(), info.file_size, mtime, info)
+            else:
+                try:
+                    self.archive = tarfile.open(path, "r:*")
+                except tarfile.TarError as e:
+                    raise OSError(errno.EINVAL, f"Not a readable archive: {e}", path)
+                for info in self.archive:
+                    mode = stat.S_IFDIR if info.isdir() else stat.S_IFREG if info.isreg() else stat.S_IFLNK
+                    self.add(info.name, info.isdir(), info.size, float(info.mtime), info, mode | info.mode)
+
+    def add(self, name, is_dir, size, mtime, info, mode=None):
+        path = name.strip("/")
+        parent, _, base = path.rpartition("/")
+        if "/." in "/" + path or "//" in path or not path:
+            parts = [part for part in path.split("/") if part and part != "."]
+            if not parts or ".." in parts:
+                return
+            path = "/".join(parts)
+            parent, _, base = path.rpartition("/")
+        entries = self.directories.get(parent)
+        if entries is None:
+            parts = parent.split("/")
+            for depth in range(len(parts)):
+                directory = "/".join(parts[:depth + 1])
+                if directory not in self.directories:
+                    self.directories[directory] = {}
+                    self.directories["/".join(parts[:depth])][parts[depth]] = (stat.S_IFDIR | 0o755, 0, mtime)
+            entries = self.directories[parent]
+        if mode is None:
+            mode = stat.S_IFDIR | 0o755 if is_dir else stat.S_IFREG | 0o644
+        entries[base] = (mode, 0 if is_dir else size, mtime)
+        if is_dir:
+            self.directories.setdefault(path, {})
+        else:
+            self.members[path] = info
+
+    def acquire(self):
+        with self.lock:
+            self.users += 1
+        return self
+
+    def release(self):
+        with self.lock:
+            self.users -= 1
+            if self.closed and not self.users:
+                self.archive.close()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            if not self.users:
+                self.archive.close()
+
+    @contextmanager
+    def open(self, name):
+        info = self.members.get(name)
+        if info is None:
+            raise FileNotFoundError(errno.ENOENT, "No such archive member", name)
+        if hasattr(self.archive, "extractfile"):
+            with self.lock:
+                reader = self.archive.extractfile(info)
+            yield LockedReader(reader, self.lock)
+        else:
+            with self.archive.open(info) as reader:
+                yield reader
+
+
+class LockedReader:
+    def __init__(self, reader, lock):
+        self.reader = reader
+        self.lock = lock
+
+    def read(self, size=-1):
+        with self.lock:
+            return self.reader.read(size)
+
+
+class ArchiveConnection:
+    ranged_reads = False
+    ranged_writes = False
+
+    def __init__(self, index):
+        self.index = index
+
+    def member(self, path):
+        return path[len(self.index.path):].strip("/")
+
+    def listdir(self, path):
+        entries = self.index.directories.get(self.member(path))
+        if entries is None:
+            raise NotADirectoryError(errno.ENOTDIR, "Not a folder in the archive", path)
+        return [(name, mode, size, mtime) for name, (mode, size, mtime) in entries.items()]
+
+    def stat(self, path):
+        name = self.member(path)
+        if not name:
+            st = os.stat(self.index.path)
+            return remote_stat(stat.S_IFDIR | 0o755, 0, st.st_mtime)
+        parent, _, base = name.rpartition("/")
+        entry = self.index.directories.get(parent, {}).get(base)
+        if entry is None:
+            raise FileNotFoundError(errno.ENOENT, "No such archive member", path)
+        return remote_stat(*entry)
+
+    def open(self, path):
+        return self.index.open(self.member(path))
+
+    def read_only(self, *args):
+        raise OSError(errno.EROFS, "Archives are read-only")
+
+    create = mkdir = remove = rename = utime = write = write_range = read_only
+
+    def alive(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class UnknownHostKey(Exception):
+    def __init__(self, hostname, fingerprint):
+        super().__init__(f"{hostname} is not in known_hosts")
+        self.hostname = hostname
+        self.fingerprint = fingerprint
+
+
+class UnknownHostPolicy:
+    def missing_host_key(self, client, hostname, key):
+        import base64
+        digest = base64.b64encode(hashlib.sha256(key.asbytes()).digest()).decode().rstrip("=")
+        raise UnknownHostKey(hostname, f"{key.get_name()} SHA256:{digest}")
+
+
+class ConnectionPool:
+    max_per_host = 4
+    idle_timeout = 60.0
+    connect_timeout = 15
+
+    def __init__(self):
+        self.idle = {}
+        self.counts = {}
+        self.clients = {}
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def connection(self, location):
+        connection = self.acquire(location)
+        broken = False
+        try:
+            yield connection
+        except (OSError, JobCancelled):
+            raise
+        except Exception as e:
+            broken = True
+            raise OSError(errno.EIO, f"{location.host}: {e}") from e
+        finally:
+            self.release(location, connection, broken)
+
+    def acquire(self, location):
+        key = location.key
+        with self.condition:
+            while True:
+                self._expire(key)
+                idle = self.idle.get(key)
+                if idle:
+                    return idle.pop()[0]
+                if self.counts.get(key, 0) < self.max_per_host:
+                    self.counts[key] = self.counts.get(key, 0) + 1
+                    break
+                self.condition.wait()
+        try:
+            return self._connect(location)
+        except BaseException as e:
+            with self.condition:
+                self.counts[key] -= 1
+                self.condition.notify()
+            if isinstance(e, OSError) or not isinstance(e, Exception):
+                raise
+            raise OSError(errno.EIO, f"{location.host}: {e}") from e
+
+    def release(self, location, connection, broken=False):
+        key = location.key
+        with self.condition:
+            if not broken and connection.alive():
+                self.idle.setdefault(key, []).append((connection, time.monotonic()))
+            else:
+                self.counts[key] -= 1
+                connection.close()
+            self.condition.notify()
+
+    def _expire(self, key):
+        idle = self.idle.get(key)
+        deadline = time.monotonic() - self.idle_timeout
+        while idle and idle[0][1] < deadline:
+            idle.pop(0)[0].close()
+            self.counts[key] -= 1
+
+    def _connect(self, location):
+        if location.scheme != "sftp":
+            return WebDavConnection(location)
+        try:
+            import paramiko
+        except ImportError:
+            raise OSError(errno.ENOTSUP, "SFTP locations need the paramiko package")
+        with self.condition:
+            client = self.clients.get(location.key)
+        if client is None or client.get_transport() is None or not client.get_transport().is_active():
+            import getpass
+            client = paramiko.SSHClient()
+            client.load_system_host_keys()
+            client.set_missing_host_key_policy(UnknownHostPolicy())
+            try:
+                client.connect(location.host, location.port, username=location.user or getpass.getuser(),
+                               password=location.password, timeout=self.connect_timeout,
+                               banner_timeout=self.connect_timeout, auth_timeout=self.connect_timeout)
+            except paramiko.BadHostKeyException:
+                client.close()
+                raise OSError(errno.EACCES, f"The host key of {location.host} does not match known_hosts, "
+                                            "the connection may be intercepted")
+            except UnknownHostKey as e:
+                client.close()
+                raise OSError(errno.EACCES, f"{location.host} is not a known host ({e.fingerprint}), connect once "
+                                            "with ssh to verify its fingerprint and add it to ~/.ssh/known_hosts")
+            client.get_transport().set_keepalive(30)
+            with self.condition:
+                self.clients[location.key] = client
+        return SftpConnection(client)
+
+    def close(self):
+        with self.condition:
+            for idle in self.idle.values():
+                for connection, used in idle:
+                    connection.close()
+            self.idle.clear()
+            self.counts.clear()
+            for client in self.clients.values():
+                client.close()
+            self.clients.clear()
+
+
+class RemoteFileSystem(QObject):
+    operation_finished = pyqtSignal(str, str)
+
+    listing_ttl = 30.0
+    max_listings = 256
+    chunk_size = 4 * 1024 * 1024
+    transfer_workers = 4
+    prefetch_workers = 4
+    max_archives = 8
+
+    def __init__(self, cache=None, state_dir=None, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.state_dir = state_dir
+        self.pool = ConnectionPool()
+        self.local = LocalFiles()
+        self.listings = OrderedDict()
+        self.in_flight = set()
+        self.lock = threading.Lock()
+        self.archives = OrderedDict()
+        self.archive_lock = threading.Lock()
+        self.passwords = {}
+        self._executor = None
+
+    def executor(self):
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self.prefetch_workers, thread_name_prefix="remote")
+        return self._executor
+
+    def remember_password(self, uri):
+        location = RemoteLocation(uri)
+        if location.password is not None:
+            self.passwords[location.key] = location.password
+
+    def split(self, path):
+        if is_remote_path(path):
+            location = RemoteLocation(path)
+            if location.password is None:
+                location.password = self.passwords.get(location.key)
+            return location, location.path
+        return None, path
+
+    @contextmanager
+    def connection(self, location):
+        if location is None:
+            yield self.local
+        elif location.scheme == "archive":
+            index = self.archive_index(location.path)
+            try:
+                yield ArchiveConnection(index)
+            finally:
+                index.release()
+        else:
+            with self.pool.connection(location) as connection:
+                yield connection
+
+    def archive_index(self, path):
+        path = split_archive_path(path)
+        st = os.stat(path)
+        with self.archive_lock:
+            index = self.archives.get(path)
+            if index is None or index.signature != (st.st_mtime, st.st_size):
+                if index is not None:
+                    index.close()
+                index = self.archives[path] = ArchiveIndex(path)
+            self.archives.move_to_end(path)
+            while len(self.archives) > self.max_archives:
+                self.archives.popitem(last=False)[1].close()
+            return index.acquire()
+
+    def listdir(self, uri, use_cache=True):
+        uri = normalize_remote_path(uri)
+        with self.lock:
+            listing = self.listings.get(uri)
+            if listing is not None and use_cache and listing[0] > time.monotonic():
+                self.listings.move_to_end(uri)
+                return listing[1], listing[2]
+        location, path = self.split(uri)
+        with self.connection(location) as connection:
+            entries = {name: (mode, size, mtime) for name, mode, size, mtime in connection.listdir(path)}
+            try:
+                mtime = connection.stat(path).st_mtime
+            except OSError:
+                mtime = 0.0
+        with self.lock:
+            self.listings[uri] = (time.monotonic() + self.listing_ttl, mtime, entries)
+            self.listings.move_to_end(uri)
+            while len(self.listings) > self.max_listings:
+                self.listings.popitem(last=False)
+        return mtime, entries
+
+    def list_directory(self, uri, use_cache=True):
+        mtime, entries = self.listdir(uri, use_cache)
+        listing = sorted(((name, stat.S_IFDIR if stat.S_ISDIR(mode) else stat.S_IFREG)
+                          for name, (mode, size, entry_mtime) in entries.items()), key=entry_sort_key)
+        if self.cache is not None:
+            self.cache.put(normalize_remote_path(uri), mtime, listing)
+        return mtime, listing
+
+    def cached_stat(self, uri):
+        parent, name = posixpath.split(normalize_remote_path(uri))
+        with self.lock:
+            listing = self.listings.get(normalize_remote_path(parent))
+            entry = listing[2].get(name) if listing is not None else None
+        if entry is None:
+            raise FileNotFoundError(errno.ENOENT, "Not in the remote metadata cache", uri)
+        return remote_stat(*entry)
+
+    def invalidate(self, uri):
+        with self.lock:
+            self.listings.pop(normalize_remote_path(uri), None)
+
+    def prefetch(self, uris):
+        now = time.monotonic()
+        for uri in uris:
+            uri = normalize_remote_path(uri)
+            with self.lock:
+                listing = self.listings.get(uri)
+                if uri in self.in_flight or (listing is not None and listing[0] > now):
+                    continue
+                self.in_flight.add(uri)
+            self.executor().submit(self._prefetch, uri)
+
+    def _prefetch(self, uri):
+        try:
+            self.list_directory(uri)
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.in_flight.discard(uri)
+
+    def submit(self, operation, *uris):
+        self.executor().submit(self._operate, operation, uris)
+
+    def _operate(self, operation, uris):
+        error = ""
+        try:
+            locations = [self.split(uri) for uri in uris]
+            with self.connection(locations[0][0]) as connection:
+                if operation == "create":
+                    connection.create(locations[0][1])
+                elif operation == "mkdir":
+                    connection.mkdir(locations[0][1])
+                elif operation == "rename":
+                    connection.rename(locations[0][1], locations[1][1])
+        except OSError as e:
+            error = e.strerror or str(e)
+        for uri in uris:
+            self.invalidate(posixpath.dirname(uri))
+        self.operation_finished.emit(uris[0], error)
+
+    def handles(self, job):
+        return any(is_remote_path(path) for path in job.sources + [job.destination or ""])
+
+    def walk(self, path, st=None):
+        location, local_path = self.split(path)
+        with self.connection(location) as connection:
+            if st is None:
+                st = connection.stat(local_path)
+            entries = connection.listdir(local_path) if stat.S_ISDIR(st.st_mode) else ()
+        for name, mode, size, mtime in entries:
+            yield from self.walk(os.path.join(path, name), remote_stat(mode, size, mtime))
+        yield path, st
+
+    def exists(self, path):
+        location, local_path = self.split(path)
+        try:
+            with self.connection(location) as connection:
+                connection.stat(local_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def run_job(self, job, queue):
+        self.plan(job, queue)
+        for item in job.plan:
+            job.checkpoint()
+            job.current_path = item.source
+            if item.conflict:
+                self.remove_tree(job, queue, item.target, count=False)
+            if job.kind == "delete":
+                self.remove_tree(job, queue, item.source)
+                continue
+            if job.kind == "move" and item.same_device:
+                location, source = self.split(item.source)
+                with self.connection(location) as connection:
+                    connection.rename(source, self.split(item.target)[1])
+                job.files_done += item.files
+                job.bytes_done += item.size
+                queue._report(job)
+                continue
+            self.copy_tree(job, queue, item.source, item.target)
+            if job.kind == "move":
+                self.remove_tree(job, queue, item.source, count=False)
+        for path in job.sources + [job.destination or ""]:
+            if is_remote_path(path):
+                self.invalidate(path)
+                self.invalidate(posixpath.dirname(path))
+        queue._report(job, force=True)
+
+    def plan(self, job, queue):
+        destination = self.split(job.destination)[0] if job.destination else None
+        if destination is not None and destination.scheme == "archive":
+            raise OSError(errno.EROFS, "Archives are read-only")
+        for source in job.sources:
+            job.checkpoint()
+            job.current_path = source
+            location = self.split(source)[0]
+            if job.kind != "copy" and location is not None and location.scheme == "archive":
+                raise OSError(errno.EROFS, "Archives are read-only")
+            try:
+                entries = list(self.walk(source))
+            except FileNotFoundError:
+                job.skipped += 1
+                continue
+            target = None
+            conflict = False
+            if job.kind != "delete":
+                target = os.path.join(job.destination, posixpath.basename(source.rstrip("/")))
+                if (job.destination.rstrip("/") + "/").startswith(source.rstrip("/") + "/"):
+                    raise OSError(errno.EINVAL, f"Cannot {job.kind} a folder into itself")
+                if self.exists(target):
+                    if job.kind == "move" and source == target:
+                        job.skipped += 1
+                        continue
+                    conflict = source != target
+                    if conflict:
+                        job.conflicts.append(target)
+                    else:
+                        target = self.unique_target(target)
+            size = sum(st.st_size for path, st in entries if stat.S_ISREG(st.st_mode))
+            same_device = location is not None and destination is not None and location.key == destination.key
+            job.plan.append(PlannedItem(source, target, same_device, len(entries), size, conflict))
+            job.files_total += len(entries)
+            job.bytes_total += size
+            queue._report(job)
+        job.current_path = ""
+        if job.conflicts:
+            if job.conflict_policy is None:
+                job.pause()
+                queue.job_conflicts.emit(job)
+                job.checkpoint()
+            for item in job.plan:
+                if item.conflict and job.conflict_policy == "rename":
+                    item.target = self.unique_target(item.target)
+                    item.conflict = False
+            queue._apply_conflict_policy(job)
+        queue._report(job, force=True)
+
+    def unique_target(self, target):
+        base, extension = posixpath.splitext(target)
+        counter = 2
+        while self.exists(f"{base} ({counter}){extension}"):
+            counter += 1
+        return f"{base} ({counter}){extension}"
+
+    def remove_tree(self, job, queue, path, count=True):
+        for entry_path, st in list(self.walk(path)):
+            job.checkpoint()
+            job.current_path = entry_path
+            location, local_path = self.split(entry_path)
+            with self.connection(location) as connection:
+                connection.remove(local_path, stat.S_ISDIR(st.st_mode))
+            if count:
+                if stat.S_ISREG(st.st_mode):
+                    job.bytes_done += st.st_size
+                job.files_done += 1
+                queue._report(job)
+
+    def copy_tree(self, job, queue, source, target, st=None):
+        job.checkpoint()
+        job.current_path = source
+        location, source_path = self.split(source)
+        target_location, target_path = self.split(target)
+        with self.connection(location) as connection:
+            if st is None:
+                st = connection.stat(source_path)
+            entries = connection.listdir(source_path) if stat.S_ISDIR(st.st_mode) else ()
+        if stat.S_ISDIR(st.st_mode):
+            with self.connection(target_location) as connection:
+                connection.mkdir(target_path)
+            for name, mode, size, mtime in entries:
+                self.copy_tree(job, queue, os.path.join(source, name), os.path.join(target, name),
+                               remote_stat(mode, size, mtime))
+        elif stat.S_ISREG(st.st_mode):
+            self.copy_file(job, queue, source, target, st)
+        else:
+            job.skipped += 1
+        job.files_done += 1
+        queue._report(job)
+
+    def copy_file(self, job, queue, source, target, st):
+        location, source_path = self.split(source)
+        target_location, target_path = self.split(target)
+        part = target_path + ".part"
+        lock = threading.Lock()
+
+        def on_progress(count):
+            with lock:
+                job.bytes_done += count
+            queue._report(job)
+
+        with self.connection(location) as connection:
+            ranged = connection.ranged_reads
+        with self.connection(target_location) as connection:
+            ranged = ranged and connection.ranged_writes
+        if not ranged:
+            self.stream_file(job, location, source_path, target_location, part, st.st_size, on_progress)
+        else:
+            self.copy_chunks(job, source, target, location, source_path, target_location, part, st, on_progress)
+        with self.connection(target_location) as connection:
+            connection.rename(part, target_path)
+            connection.utime(target_path, st.st_mtime)
+
+    def read_chunks(self, job, location, path, size, on_progress):
+        with self.connection(location) as connection:
+            if not connection.ranged_reads:
+                with connection.open(path) as reader:
+                    while True:
+                        job.checkpoint()
+                        data = reader.read(self.chunk_size)
+                        if not data:
+                            return
+                        on_progress(len(data))
+                        yield data
+        for offset in range(0, size, self.chunk_size):
+            job.checkpoint()
+            with self.connection(location) as connection:
+                data = connection.read_range(path, offset, min(self.chunk_size, size - offset))
+            on_progress(len(data))
+            yield data
+
+    def stream_file(self, job, location, source_path, target_location, part, size, on_progress):
+        chunks = self.read_chunks(job, location, source_path, size, on_progress)
+        with self.connection(target_location) as connection:
+            if not connection.ranged_writes:
+                connection.write(part, chunks, size)
+                return
+            connection.create(part)
+            offset = 0
+            for data in chunks:
+                connection.write_range(part, offset, data)
+                offset += len(data)
+
+    def copy_chunks(self, job, source, target, location, source_path, target_location, part, st, on_progress):
+        from concurrent.futures import ThreadPoolExecutor
+        size = st.st_size
+        state_path = None
+        if self.state_dir:
+            state_path = os.path.join(self.state_dir, hashlib.sha1(f"{source}\0{target}".encode()).hexdigest() + ".json")
+        done = self.load_transfer_state(state_path, size, st.st_mtime)
+        with self.connection(target_location) as connection:
+            if done:
+                try:
+                    done = done if connection.stat(part).st_size == size else set()
+                except FileNotFoundError:
+                    done = set()
+            if not done:
+                connection.create(part)
+        chunks = [index for index in range(-(-size // self.chunk_size)) if index not in done]
+        on_progress(size - sum(min(self.chunk_size, size - index * self.chunk_size) for index in chunks))
+        lock = threading.Lock()
+
+        def copy_chunk(index):
+            job.checkpoint()
+            offset = index * self.chunk_size
+            length = min(self.chunk_size, size - offset)
+            with self.connection(location) as connection:
+                data = connection.read_range(source_path, offset, length)
+            if len(data) != length:
+                raise OSError(errno.EIO, "Source changed during the transfer", source_path)
+            with self.connection(target_location) as connection:
+                connection.write_range(part, offset, data)
+            with lock:
+                done.add(index)
+                self.save_transfer_state(state_path, size, st.st_mtime, done)
+            on_progress(length)
+
+        if chunks:
+            with self.connection(target_location) as connection:
+                if connection.stat(part).st_size < size:
+                    connection.write_range(part, size - 1, b"\0")
+            pool = ThreadPoolExecutor(max_workers=min(self.transfer_workers, len(chunks)),
+                                      thread_name_prefix="remote-transfer")
+            try:
+                for future in [pool.submit(copy_chunk, index) for index in chunks]:
+                    future.result()
+            finally:
+                pool.shutdown(cancel_futures=True)
+        if state_path is not None:
+            try:
+                os.remove(state_path)
+            except FileNotFoundError:
+                pass
+
+    def load_transfer_state(self, path, size, mtime):
+        if path is None:
+            return set()
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if state.get("size") != size or state.get("mtime") != mtime:
+            return set()
+        return set(state.get("done", ()))
+
+    def save_transfer_state(self, path, size, mtime, done):
+        if path is None:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"size": size, "mtime": mtime, "done": sorted(done)}, f)
+        os.replace(path + ".tmp", path)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.close()
+        with self.archive_lock:
+            for index in self.archives.values():
+                index.close()
+            self.archives.clear()
+
+
+class ThumbnailCache(QObject):
+    thumbnail_ready = pyqtSignal(str)
+    rendered = pyqtSignal(object, object)
+
+    size = 128
+    memory_limit = 2000
+    queue_limit = 512
+    video_tools = ("ffmpegthumbnailer",)
+    pdf_tools = ("pdftoppm",)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(QDir.homePath(), ".cache")
+        self.root = os.path.join(cache_home, "thumbnails")
+        self.normal_dir = os.path.join(self.root, "normal")
+        self.fail_dir = os.path.join(self.root, "fail", "aldernys")
+        self.icons = OrderedDict()
+        self.failed = set()
+        self.requests = OrderedDict()
+        self.image_types = {bytes(name).decode() for name in QImageReader.supportedMimeTypes()}
+        self.tools = {}
+        self.supported = {}
+        self._condition = threading.Condition()
+        self.rendered.connect(self.on_rendered)
+        for i in range(min(4, os.cpu_count() or 1)):
+            threading.Thread(target=self._work, name=f"thumbnails-{i}", daemon=True).start()
+
+    def can_thumbnail(self, mime_name):
+        supported = self.supported.get(mime_name)
+        if supported is None:
+            supported = self.supported[mime_name] = self._can_thumbnail(mime_name)
+        return supported
+
+    def _can_thumbnail(self, mime_name):
+        if mime_name in self.image_types:
+            return True
+        if mime_name == "application/pdf":
+            return self.tool(self.pdf_tools) is not None
+        if mime_name.startswith("video/"):
+            return self.tool(self.video_tools) is not None
+        return False
+
+    def tool(self, names):
+        if names not in self.tools:
+            import shutil
+            self.tools[names] = next((shutil.which(name) for name in names if shutil.which(name)), None)
+        return self.tools[names]
+
+    def icon(self, path, mtime, mime_name):
+        key = (path, int(mtime))
+        icon = self.icons.get(key)
+        if icon is not None:
+            self.icons.move_to_end(key)
+            return icon
+        if key in self.failed or self.root in path:
+            return None
+        with self._condition:
+            self.requests[key] = mime_name
+            self.requests.move_to_end(key)
+            while len(self.requests) > self.queue_limit:
+                self.requests.popitem(last=False)
+            self._condition.notify()
+        return None
+
+    def clear_requests(self):
+        with self._condition:
+            self.requests.clear()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self.requests:
+                    self._condition.wait()
+                key, mime_name = self.requests.popitem(last=True)
+            with perf.span("thumbnail.load", key[0]):
+                image = self._load(key[0], key[1], mime_name)
+            self.rendered.emit(key, image)
+
+    def on_rendered(self, key, image):
+        if image is None or image.isNull():
+            self.failed.add(key)
+        else:
+            self.icons[key] = QIcon(QPixmap.fromImage(image))
+            while len(self.icons) > self.memory_limit:
+                self.icons.popitem(last=False)
+        self.thumbnail_ready.emit(key[0])
+
+    def thumbnail_path(self, uri, directory):
+        return os.path.join(directory, hashlib.md5(uri.encode()).hexdigest() + ".png")
+
+    def _load(self, path, mtime, mime_name):
+        uri = QUrl.fromLocalFile(path).toString(QUrl.FullyEncoded)
+        cached = self.thumbnail_path(uri, self.normal_dir)
+        image = QImage(cached)
+        if not image.isNull() and image.text("Thumb::MTime") == str(mtime):
+            return image
+        failed = self.thumbnail_path(uri, self.fail_dir)
+        if QImage(failed).text("Thumb::MTime") == str(mtime):
+            return None
+        try:
+            image = self._render(path, mime_name)
+        except Exception:
+            image = None
+        if image is None or image.isNull():
+            self._store(QImage(1, 1, QImage.Format_ARGB32), failed, uri, mtime)
+            return None
+        self._store(image, cached, uri, mtime)
+        return image
+
+    def _render(self, path, mime_name):
+        if mime_name in self.image_types:
+            reader = QImageReader(path)
+            reader.setAutoTransform(True)
+            size = reader.size()
+            if size.isValid() and (size.width() > self.size or size.height() > self.size):
+                reader.setScaledSize(size.scaled(self.size, self.size, Qt.KeepAspectRatio))
+            return reader.read()
+        with tempfile.TemporaryDirectory(prefix="aldernys-thumb-") as work:
+            output = os.path.join(work, "thumb.png")
+            if mime_name == "application/pdf":
+                command = [self.tool(self.pdf_tools), "-q", "-f", "1", "-l", "1", "-singlefile", "-png",
+                           "-scale-to", str(self.size), path, output[:-4]]
+            else:
+                command = [self.tool(self.video_tools), "-i", path, "-o", output, "-s", str(self.size)]
+            import subprocess
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+            image = QImage(output)
+        if image.width() > self.size or image.height() > self.size:
+            image = image.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        return image
+
+    def _store(self, image, target, uri, mtime):
+        try:
+            os.makedirs(os.path.dirname(target), mode=0o700, exist_ok=True)
+            temp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            image.setText("Thumb::URI", uri)
+            image.setText("Thumb::MTime", str(mtime))
+            image.setText("Software", "Aldernys File Manager")
+            writer = QImageWriter(temp, b"png")
+            if writer.write(image):
+                os.chmod(temp, 0o600)
+                os.replace(temp, target)
+        except OSError:
+            pass
+
+
+def parse_size(text):
+    units = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    text = text.strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in units else ""
+    return int(float(text[:len(text) - len(unit)]) * units[unit])
+
+
+def parse_age(text):
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    text = text.strip().lower()
+    unit = text[-1:] if text[-1:] in units else "d"
+    return float(text.rstrip("smhdw")) * units[unit]
+
+
+class SearchQuery:
+    def __init__(self, text):
+        self.text = text
+        self.min_size = None
+        self.max_size = None
+        self.newer_than = None
+        self.older_than = None
+        terms = []
+        for token in text.split():
+            lowered = token.lower()
+            if lowered.startswith(("size>", "size<")):
+                if lowered[4] == ">":
+                    self.min_size = parse_size(token[5:])
+                else:
+                    self.max_size = parse_size(token[5:])
+            elif lowered.startswith(("age<", "age>")):
+                if lowered[3] == "<":
+                    self.newer_than = time.time() - parse_age(token[4:])
+                else:
+                    self.older_than = time.time() - parse_age(token[4:])
+            else:
+                terms.append(token)
+        self.pattern = " ".join(terms)
+        if self.pattern.startswith("re:"):
+            self.mode = "regex"
+            self.pattern = self.pattern[3:]
+            self.regex = re.compile(self.pattern, re.IGNORECASE)
+        elif any(char in self.pattern for char in "*?["):
+            self.mode = "glob"
+            self.regex = re.compile(fnmatch.translate(self.pattern), re.IGNORECASE)
+        else:
+            self.mode = "name"
+            self.pattern = self.pattern.casefold()
+            self.regex = None
+
+    def needs_stat(self):
+        return any(value is not None for value in
+                   (self.min_size, self.max_size, self.newer_than, self.older_than))
+
+    def match_name(self, name):
+        if self.regex is not None:
+            return self.regex.search(name) is not None if self.mode == "regex" else self.regex.match(name) is not None
+        return self.pattern in name.casefold()
+
+    def match_stat(self, size, mtime):
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+        if self.newer_than is not None and mtime < self.newer_than:
+            return False
+        if self.older_than is not None and mtime > self.older_than:
+            return False
+        return True
+
+
+def walk_parallel(root, cancelled, workers=8, skip_dirs=()):
+    directories = queue.Queue()
+    results = queue.Queue()
+    pending = [1]
+    lock = threading.Lock()
+    directories.put(root)
+
+    def work():
+        while True:
+            path = directories.get()
+            if path is None:
+                return
+            found = []
+            if not cancelled.is_set():
+                try:
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            try:
+                                is_dir = entry.is_dir(follow_symlinks=False)
+                            except OSError:
+                                is_dir = False
+                            if is_dir:
+                                if entry.name in skip_dirs:
+                                    continue
+                                with lock:
+                                    pending[0] += 1
+                                directories.put(entry.path)
+                            found.append(entry)
+                except OSError:
+                    pass
+            results.put(found)
+            with lock:
+                pending[0] -= 1
+                if pending[0] == 0:
+                    results.put(None)
+
+    threads = [threading.Thread(target=work, name="search-walk", daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            found = results.get()
+            if found is None:
+                break
+            yield from found
+    finally:
+        cancelled.set()
+        for _ in threads:
+            directories.put(None)
+
+
+def match_entries(entries, query):
+    for entry in entries:
+        if not query.match_name(entry.name):
+            continue
+        if query.needs_stat():
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if not query.match_stat(st.st_size, st.st_mtime):
+                continue
+        yield entry.path
+
+
+def batched(items, cancelled, size=500, interval=0.1):
+    batch = []
+    last = time.monotonic()
+    for item in items:
+        if cancelled.is_set():
+            return
+        batch.append(item)
+        now = time.monotonic()
+        if len(batch) >= size or now - last >= interval:
+            yield batch
+            batch = []
+            last = now
+    if batch:
+        yield batch
+
+
+class SearchIndex:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connect() as db:
+            self.fts = self.create_schema(db)
+
+    def connect(self, query=None):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        if query is not None:
+            db.create_function("matches", 1, query.match_name, deterministic=True)
+        return db
+
+    def create_schema(self, db):
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime REAL);
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY, dir INTEGER, name TEXT, is_dir INTEGER, size INTEGER, mtime REAL
+            );
+            CREATE INDEX IF NOT EXISTS entries_dir ON entries(dir);
+        """)
+        try:
+            db.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS names
+                    USING fts5(name, content='entries', content_rowid='id', tokenize='trigram');
+                CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+                    INSERT INTO names(rowid, name) VALUES (new.id, new.name);
+                END;
+                CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+                    INSERT INTO names(names, rowid, name) VALUES ('delete', old.id, old.name);
+                END;
+            """)
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    def is_indexed(self, root):
+        with self.connect() as db:
+            return db.execute("SELECT 1 FROM dirs WHERE path = ?", (root,)).fetchone() is not None
+
+    def search(self, root, query):
+        sql = ("SELECT d.path, e.name FROM entries e JOIN dirs d ON d.id = e.dir "
+               "WHERE (d.path = ? OR substr(d.path, 1, ?) = ?)")
+        params = [root, len(root) + 1, root.rstrip(os.sep) + os.sep]
+        if query.mode == "name" and self.fts and len(query.pattern) >= 3:
+            sql += " AND e.id IN (SELECT rowid FROM names WHERE names MATCH ?)"
+            params.append('"' + query.pattern.replace('"', '""') + '"')
+        elif query.pattern:
+            sql += " AND matches(e.name)"
+        if query.min_size is not None:
+            sql += " AND e.size >= ?"
+            params.append(query.min_size)
+        if query.max_size is not None:
+            sql += " AND e.size <= ?"
+            params.append(query.max_size)
+        if query.newer_than is not None:
+            sql += " AND e.mtime >= ?"
+            params.append(query.newer_than)
+        if query.older_than is not None:
+            sql += " AND e.mtime <= ?"
+            params.append(query.older_than)
+        with self.connect(query) as db:
+            for directory, name in db.execute(sql, params):
+                if query.mode != "name" or query.match_name(name):
+                    yield os.path.join(directory, name)
+
+    def update(self, root, cancelled, on_changed=None):
+        with self.lock, self.connect() as db:
+            stack = [root]
+            changes = 0
+            while stack and not cancelled.is_set():
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    self.forget(db, path)
+                    continue
+                row = db.execute("SELECT id, mtime FROM dirs WHERE path = ?", (path,)).fetchone()
+                if row is not None and row[1] == mtime:
+                    stack.extend(os.path.join(path, name) for (name,) in db.execute(
+                        "SELECT name FROM entries WHERE dir = ? AND is_dir = 1", (row[0],)))
+                    continue
+                stack.extend(self.reindex(db, path, mtime, row, on_changed))
+                changes += 1
+                if changes % 200 == 0:
+                    db.commit()
+
+    def reindex(self, db, path, mtime, row, on_changed):
+        entries = []
+        try:
+            with os.scandir(path) as scan:
+                for entry in scan:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                        is_dir = stat.S_ISDIR(st.st_mode)
+                    except OSError:
+                        continue
+                    entries.append((entry.name, is_dir, st.st_size, st.st_mtime))
+        except OSError:
+            return []
+        if row is None:
+            dir_id = db.execute("INSERT INTO dirs (path, mtime) VALUES (?, ?)", (path, mtime)).lastrowid
+        else:
+            dir_id = row[0]
+            names = {entry[0] for entry in entries if entry[1]}
+            for (name,) in db.execute("SELECT name FROM entries WHERE dir = ? AND is_dir = 1", (dir_id,)).fetchall():
+                if name not in names:
+                    self.forget(db, os.path.join(path, name))
+            db.execute("DELETE FROM entries WHERE dir = ?", (dir_id,))
+            db.execute("UPDATE dirs SET mtime = ? WHERE id = ?", (mtime, dir_id))
+        db.executemany("INSERT INTO entries (dir, name, is_dir, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                       [(dir_id, name, is_dir, size, entry_mtime) for name, is_dir, size, entry_mtime in entries])
+        if on_changed is not None:
+            on_changed(path, entries)
+        return [os.path.join(path, entry[0]) for entry in entries if entry[1]]
+
+    def forget(self, db, path):
+        prefix = path.rstrip(os.sep) + os.sep
+        ids = [row[0] for row in db.execute(
+            "SELECT id FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (path, len(prefix), prefix))]
+        for dir_id in ids:
+            db.execute("DELETE FROM entries WHERE dir = ?", (dir_id,))
+            db.execute("DELETE FROM dirs WHERE id = ?", (dir_id,))
+
+
+class FileSearch(QObject):
+    results_found = pyqtSignal(int, object)
+    search_finished = pyqtSignal(int, int)
+
+    def __init__(self, index_path, parent=None):
+        super().__init__(parent)
+        self.index_path = index_path
+        self._index = None
+        self._index_lock = threading.Lock()
+        self.generation = 0
+        self.cancelled = threading.Event()
+
+    @property
+    def index(self):
+        with self._index_lock:
+            if self._index is None:
+                self._index = SearchIndex(self.index_path)
+            return self._index
+
+    def start(self, root, query, indexed_root=None):
+        self.cancel()
+        self.generation += 1
+        self.cancelled = threading.Event()
+        threading.Thread(
+            target=self._run, args=(root, query, indexed_root, self.generation, self.cancelled),
+            name="file-search", daemon=True
+        ).start()
+        return self.generation
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _run(self, root, query, indexed_root, generation, cancelled):
+        found = 0
+        try:
+            if indexed_root is not None:
+                found = self._run_indexed(root, query, indexed_root, generation, cancelled)
+            else:
+                for batch in batched(match_entries(walk_parallel(root, threading.Event()), query), cancelled):
+                    found += len(batch)
+                    self.results_found.emit(generation, batch)
+        except (OSError, sqlite3.Error):
+            pass
+        if not cancelled.is_set():
+            self.search_finished.emit(generation, found)
+
+    def _run_indexed(self, root, query, indexed_root, generation, cancelled):
+        seen = set()
+        if self.index.is_indexed(indexed_root):
+            for batch in batched(self.index.search(root, query), cancelled):
+                seen.update(batch)
+                self.results_found.emit(generation, batch)
+        prefix = root.rstrip(os.sep) + os.sep
+
+        def on_changed(path, entries):
+            if path != root and not path.startswith(prefix):
+                return
+            batch = []
+            for name, is_dir, size, mtime in entries:
+                full_path = os.path.join(path, name)
+                if full_path not in seen and query.match_name(name) and query.match_stat(size, mtime):
+                    seen.add(full_path)
+                    batch.append(full_path)
+            if batch:
+                self.results_found.emit(generation, batch)
+
+        self.index.update(indexed_root, cancelled, on_changed)
+        return len(seen)
+
+
+class FilterQuery:
+    def __init__(self, text):
+        self.text = text
+        if text.startswith("~"):
+            self.mode = "fuzzy"
+            self.pattern = text[1:]
+        elif any(char in text for char in "*?["):
+            self.mode = "glob"
+            self.pattern = text
+        else:
+            self.mode = "substring"
+            self.pattern = text
+        self.case_sensitive = self.pattern != self.pattern.casefold()
+        if not self.case_sensitive:
+            self.pattern = self.pattern.casefold()
+        if self.mode == "fuzzy":
+            self.regex = re.compile(".*?".join(map(re.escape, self.pattern)), re.DOTALL)
+        elif self.mode == "glob":
+            self.regex = re.compile(fnmatch.translate(self.pattern))
+        else:
+            self.regex = None
+
+    def match_name(self, name):
+        if not self.case_sensitive:
+            name = name.casefold()
+        if self.mode == "substring":
+            return self.pattern in name
+        if self.mode == "glob":
+            return self.regex.match(name) is not None
+        return self.regex.search(name) is not None
+
+
+FUZZY_SEPARATORS = frozenset(" _-./")
+
+
+def fuzzy_score(name, pattern, original):
+    position = -1
+    for char in pattern:
+        position = name.find(char, position + 1)
+        if position < 0:
+            return None
+    start = position + 1
+    for char in reversed(pattern):
+        start = name.rfind(char, 0, start)
+    score = 0
+    previous = -2
+    position = start - 1
+    for char in pattern:
+        position = name.find(char, position + 1)
+        if position == 0:
+            bonus = 10
+        elif name[position - 1] in FUZZY_SEPARATORS:
+            bonus = 8
+        elif original[position - 1].islower() and original[position].isupper():
+            bonus = 7
+        else:
+            bonus = 0
+        if position == previous + 1:
+            bonus += 4
+        elif previous >= 0:
+            score -= 3 + position - previous - 2
+        score += 16 + bonus
+        previous = position
+    return score
+
+
+class NameFilter(QObject):
+    filtered = pyqtSignal(int, object, object)
+
+    check_interval = 4096
+    chunk_size = 8192
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self.requests = queue.Queue()
+        self.worker = None
+        self.entries = None
+        self.names = None
+        self.folded = None
+
+    def filter(self, text, entries):
+        self.generation += 1
+        self.requests.put((self.generation, FilterQuery(text), entries))
+        if self.worker is None:
+            self.worker = threading.Thread(target=self._work, name="name-filter", daemon=True)
+            self.worker.start()
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def _work(self):
+        while True:
+            request = self.requests.get()
+            while not self.requests.empty():
+                request = self.requests.get_nowait()
+            generation, query, entries = request
+            if generation != self.generation:
+                continue
+            with perf.span("filter.match", query.text):
+                rows = self.match(generation, query, entries)
+            if rows is not None and generation == self.generation:
+                self.filtered.emit(generation, entries, rows)
+
+    def match(self, generation, query, entries):
+        if entries is not self.entries:
+            self.entries = entries
+            self.names = [entry[0] for entry in entries]
+            self.folded = None
+        if query.case_sensitive:
+            names = self.names
+        else:
+            if self.folded is None:
+                self.folded = list(map(str.casefold, self.names))
+            names = self.folded
+        if not query.pattern:
+            return list(range(len(names)))
+        hits = []
+        prefixed = []
+        for start in range(0, len(names), self.chunk_size):
+            if generation != self.generation:
+                return None
+            chunk = names[start:start + self.chunk_size]
+            rows = range(start, start + len(chunk))
+            if query.mode == "glob":
+                hits += itertools.compress(rows, map(query.regex.match, chunk))
+            elif query.mode == "fuzzy":
+                hits += itertools.compress(rows, map(query.regex.search, chunk))
+            else:
+                found = list(itertools.compress(rows, map(operator.contains, chunk, itertools.repeat(query.pattern))))
+                starts = list(map(str.startswith, map(names.__getitem__, found), itertools.repeat(query.pattern)))
+                prefixed += itertools.compress(found, starts)
+                hits += itertools.compress(found, map(operator.not_, starts))
+        if query.mode != "fuzzy":
+            return prefixed + hits
+        candidates = hits
+        ranked = []
+        for count, row in enumerate(candidates):
+            if count % self.check_interval == 0 and generation != self.generation:
+                return None
+            name = names[row]
+            original = self.names[row] if len(self.names[row]) == len(name) else name
+            ranked.append((-fuzzy_score(name, query.pattern, original), len(name), row))
+        ranked.sort()
+        return [row for score, length, row in ranked]
+
+
+def required_literal(pattern):
+    if "|" in pattern or re.compile(pattern).flags & (re.IGNORECASE | re.VERBOSE):
+        return b""
+    best, current = "", ""
+    depth = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\":
+            if depth == 0 and index + 1 < len(pattern) and not pattern[index + 1].isalnum():
+                current += pattern[index + 1]
+            else:
+                best = max(best, current, key=len)
+                current = ""
+            index += 2
+            continue
+        if char in ".^$*+?{}[]()":
+            if char in "*?{" and current:
+                current = current[:-1]
+            best = max(best, current, key=len)
+            current = ""
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            elif char == "{":
+                end = pattern.find("}", index + 1)
+                index = end if end != -1 else index
+            elif char == "[":
+                index += 1
+                if pattern.startswith("^", index):
+                    index += 1
+                if pattern.startswith("]", index):
+                    index += 1
+                while index < len(pattern) and pattern[index] != "]":
+                    index += 2 if pattern[index] == "\\" else 1
+        elif depth == 0:
+            current += char
+        index += 1
+    return max(best, current, key=len).encode()
+
+
+def scan_files_for_content(paths, pattern, is_regex, ignore_case, max_hits, max_line):
+    if is_regex:
+        regex = re.compile(pattern.encode(), re.IGNORECASE if ignore_case else 0)
+        literal = b"" if ignore_case else required_literal(pattern)
+    elif ignore_case:
+        regex = re.compile(re.escape(pattern.encode()), re.IGNORECASE)
+        literal = b""
+    else:
+        regex = None
+        literal = pattern.encode()
+    hits = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if data.find(b"\0", 0, 8192) != -1:
+                        continue
+                    if literal and data.find(literal) == -1:
+                        continue
+                    hits.extend(_content_hits(path, data, regex, literal, max_hits, max_line))
+        except (OSError, ValueError):
+            continue
+    return hits
+
+
+def _content_hits(path, data, regex, literal, max_hits, max_line):
+    if regex is not None:
+        offsets = (match.start() for match in regex.finditer(data))
+    else:
+        def find_all():
+            position = data.find(literal)
+            while position != -1:
+                yield position
+                position = data.find(literal, position + len(literal))
+        offsets = find_all()
+    line, counted, last_line_start = 1, 0, -1
+    for offset in offsets:
+        line_start = data.rfind(b"\n", 0, offset) + 1
+        if line_start == last_line_start:
+            continue
+        line += data[counted:line_start].count(b"\n")
+        counted = line_start
+        last_line_start = line_start
+        line_end = data.find(b"\n", offset)
+        if line_end == -1:
+            line_end = len(data)
+        text = data[line_start:min(line_end, line_start + max_line)].decode("utf-8", "replace").rstrip("\r")
+        yield path, line, offset, text
+        max_hits -= 1
+        if max_hits <= 0:
+            return
+
+
+def hash_file_edges(path, size, chunk):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        fd = f.fileno()
+        digest.update(os.pread(fd, chunk, 0))
+        if size > chunk:
+            digest.update(os.pread(fd, chunk, max(chunk, size - chunk)))
+    return digest.digest()
+
+
+def hash_files(paths):
+    digests = []
+    for path in paths:
+        digest = hashlib.blake2b(digest_size=20)
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        if hasattr(data, "madvise"):
+                            data.madvise(mmap.MADV_SEQUENTIAL)
+                        digest.update(data)
+            digests.append(digest.digest())
+        except (OSError, ValueError):
+            digests.append(None)
+    return digests
+
+
+class ContentSearch(QObject):
+    hits_found = pyqtSignal(int, object)
+    search_finished = pyqtSignal(int, int, int)
+
+    rules = {
+        "max_file_size": 64 * 1024 * 1024,
+        "skip_dirs": (".git", ".hg", ".svn", "node_modules", "__pycache__"),
+        "skip_globs": ("*.min.js", "*.map", "*.iso", "*.img", "*.zip", "*.gz", "*.xz", "*.so", "*.o"),
+        "max_hits_per_file": 1000,
+        "max_line_length": 300,
+    }
+    batch_files = 64
+    batch_bytes = 32 * 1024 * 1024
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.workers = os.cpu_count() or 1
+        self.pool = None
+        self.generation = 0
+        self.cancelled = threading.Event()
+
+    def start(self, root, pattern, is_regex, ignore_case):
+        self.cancel()
+        self.generation += 1
+        self.cancelled = threading.Event()
+        if self.pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        threading.Thread(
+            target=self._run, args=(root, pattern, is_regex, ignore_case, self.generation, self.cancelled),
+            name="content-search", daemon=True
+        ).start()
+        return self.generation
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def shutdown(self):
+        self.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def _candidates(self, root, cancelled):
+        rules = self.rules
+        for entry in walk_parallel(root, threading.Event(), skip_dirs=rules["skip_dirs"]):
+            if cancelled.is_set():
+                return
+            if any(fnmatch.fnmatch(entry.name, pattern) for pattern in rules["skip_globs"]):
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode) and st.st_size <= rules["max_file_size"]:
+                yield entry.path, st.st_size
+
+    def _run(self, root, pattern, is_regex, ignore_case, generation, cancelled):
+        from concurrent.futures import wait, FIRST_COMPLETED
+        args = (pattern, is_regex, ignore_case, self.rules["max_hits_per_file"], self.rules["max_line_length"])
+        outstanding = set()
+        scanned = hits = 0
+
+        def collect():
+            nonlocal hits
+            done, _ = wait(outstanding, return_when=FIRST_COMPLETED)
+            for future in done:
+                outstanding.discard(future)
+                try:
+                    found = future.result()
+                except Exception:
+                    continue
+                if found and not cancelled.is_set():
+                    hits += len(found)
+                    self.hits_found.emit(generation, found)
+
+        try:
+            batch, batch_bytes = [], 0
+            for path, size in self._candidates(root, cancelled):
+                batch.append(path)
+                batch_bytes += size
+                if len(batch) >= self.batch_files or batch_bytes >= self.batch_bytes:
+                    outstanding.add(self.pool.submit(scan_files_for_content, batch, *args))
+                    scanned += len(batch)
+                    batch, batch_bytes = [], 0
+                    while len(outstanding) >= self.workers * 2 and not cancelled.is_set():
+                        collect()
+            if batch and not cancelled.is_set():
+                outstanding.add(self.pool.submit(scan_files_for_content, batch, *args))
+                scanned += len(batch)
+            while outstanding and not cancelled.is_set():
+                collect()
+        except RuntimeError:
+            pass
+        for future in outstanding:
+            future.cancel()
+        if not cancelled.is_set():
+            self.search_finished.emit(generation, scanned, hits)
+
+
+class HashCache:
+    def __init__(self, path):
+        self.path = path
+        self.created = False
+        self.lock = threading.Lock()
+
+    def connect(self):
+        with self.lock:
+            if not self.created:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            if not self.created:
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS hashes (
+                        dev INTEGER, ino INTEGER, size INTEGER, mtime INTEGER, partial BLOB, full BLOB,
+                        PRIMARY KEY (dev, ino)
+                    )
+                """)
+                self.created = True
+        return db
+
+    def lookup(self, db, key):
+        row = db.execute("SELECT size, mtime, partial, full FROM hashes WHERE dev = ? AND ino = ?",
+                         key[:2]).fetchone()
+        if row is None or tuple(row[:2]) != key[2:]:
+            return None, None
+        return row[2], row[3]
+
+    def store(self, db, key, partial, full=None):
+        db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)", (*key, partial, full))
+
+
+class DuplicateFinder(QObject):
+    duplicates_found = pyqtSignal(int, object)
+    scan_progress = pyqtSignal(int, str, int, int)
+    scan_finished = pyqtSignal(int, int, int)
+
+    edge_chunk = 64 * 1024
+    min_size = 1
+    batch_files = 64
+    batch_bytes = 64 * 1024 * 1024
+    progress_interval = 0.2
+
+    def __init__(self, cache_path, parent=None):
+        super().__init__(parent)
+        self.cache = HashCache(cache_path)
+        self.workers = os.cpu_count() or 1
+        self.pool = None
+        self.generation = 0
+        self.cancelled = threading.Event()
+
+    def start(self, roots):
+        self.cancel()
+        self.generation += 1
+        self.cancelled = threading.Event()
+        if self.pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        threading.Thread(
+            target=self._run, args=(list(roots), self.generation, self.cancelled),
+            name="duplicate-finder", daemon=True
+        ).start()
+        return self.generation
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def shutdown(self):
+        self.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def _progress(self, generation, stage, done, total, force=False):
+        now = time.monotonic()
+        if force or now - self.last_progress >= self.progress_interval:
+            self.last_progress = now
+            self.scan_progress.emit(generation, stage, done, total)
+
+    def _sizes(self, roots, generation, cancelled):
+        by_size = {}
+        files = 0
+        for root in roots:
+            for entry in walk_parallel(root, threading.Event()):
+                if cancelled.is_set():
+                    return {}
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode) or st.st_size < self.min_size:
+                    continue
+                inodes = by_size.setdefault(st.st_size, {})
+                key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+                paths = inodes.setdefault(key, [])
+                if entry.path not in paths:
+                    paths.append(entry.path)
+                files += 1
+                self._progress(generation, "Sizing", files, 0)
+        return {size: inodes for size, inodes in by_size.items() if len(inodes) > 1}
+
+    def _run(self, roots, generation, cancelled):
+        self.last_progress = time.monotonic()
+        by_size = self._sizes(roots, generation, cancelled)
+        if cancelled.is_set():
+            return
+        groups = wasted = 0
+        with self.cache.connect() as db:
+            candidates = self._partial_hashes(db, by_size, generation, cancelled)
+            full_hashes = {}
+            pending = []
+            for (size, partial), inodes in candidates.items():
+                for key in inodes:
+                    full = self.cache.lookup(db, key)[1]
+                    if full is None and size <= 2 * self.edge_chunk:
+                        full = partial
+                    if full is not None:
+                        full_hashes[key] = full
+                    else:
+                        pending.append(key)
+            self._full_hashes(db, pending, by_size, full_hashes, generation, cancelled)
+            if cancelled.is_set():
+                return
+        for (size, partial), inodes in sorted(candidates.items(), key=lambda item: -item[0][0]):
+            found = {}
+            for key in inodes:
+                if key in full_hashes:
+                    found.setdefault(full_hashes[key], []).append(key)
+            batch = []
+            for digest, keys in found.items():
+                if len(keys) > 1:
+                    batch.append((size, digest, [(key, by_size[size][key]) for key in keys]))
+                    wasted += size * (len(keys) - 1)
+            if batch:
+                groups += len(batch)
+                self.duplicates_found.emit(generation, batch)
+        self.scan_finished.emit(generation, groups, wasted)
+
+    def _partial_hashes(self, db, by_size, generation, cancelled):
+        candidates = {}
+        total = sum(len(inodes) for inodes in by_size.values())
+        done = 0
+        for size, inodes in by_size.items():
+            for key, paths in inodes.items():
+                if cancelled.is_set():
+                    return candidates
+                partial, full = self.cache.lookup(db, key)
+                if partial is None:
+                    try:
+                        partial = hash_file_edges(paths[0], size, self.edge_chunk)
+                    except OSError:
+                        continue
+                    self.cache.store(db, key, partial)
+                candidates.setdefault((size, partial), []).append(key)
+                done += 1
+                self._progress(generation, "Comparing", done, total)
+        db.commit()
+        return {group: keys for group, keys in candidates.items() if len(keys) > 1}
+
+    def _full_hashes(self, db, pending, by_size, full_hashes, generation, cancelled):
+        from concurrent.futures import wait, FIRST_COMPLETED
+        outstanding = {}
+        done = 0
+
+        def collect():
+            nonlocal done
+            finished, _ = wait(outstanding, return_when=FIRST_COMPLETED)
+            for future in finished:
+                keys = outstanding.pop(future)
+                try:
+                    digests = future.result()
+                except Exception:
+                    continue
+                for key, digest in zip(keys, digests):
+                    if digest is not None:
+                        full_hashes[key] = digest
+                        db.execute("UPDATE hashes SET full = ? WHERE dev = ? AND ino = ?", (digest, *key[:2]))
+                done += len(keys)
+                self._progress(generation, "Hashing", done, len(pending))
+            db.commit()
+
+        try:
+            batch, batch_bytes = [], 0
+            for key in pending:
+                if cancelled.is_set():
+                    break
+                batch.append(key)
+                batch_bytes += key[2]
+                if len(batch) >= self.batch_files or batch_bytes >= self.batch_bytes:
+                    outstanding[self.pool.submit(hash_files, [by_size[k[2]][k][0] for k in batch])] = batch
+                    batch, batch_bytes = [], 0
+                    while len(outstanding) >= self.workers * 2 and not cancelled.is_set():
+                        collect()
+            if batch and not cancelled.is_set():
+                outstanding[self.pool.submit(hash_files, [by_size[k[2]][k][0] for k in batch])] = batch
+            while outstanding and not cancelled.is_set():
+                collect()
+        except RuntimeError:
+            pass
+        for future in outstanding:
+            future.cancel()
+
+
+class DirectorySize:
+    __slots__ = ("path", "mtime", "device", "own_size", "own_files", "hardlinks", "children", "size", "files")
+
+    def __init__(self, path, mtime, device):
+        self.path = path
+        self.mtime = mtime
+        self.device = device
+        self.own_size = 0
+        self.own_files = 0
+        self.hardlinks = []
+        self.children = {}
+        self.size = 0
+        self.files = 0
+
+
+class DiskUsageScanner(QObject):
+    child_sized = pyqtSignal(int, object)
+    scan_progress = pyqtSignal(int, int, int)
+    scan_finished = pyqtSignal(int, object)
+
+    progress_interval = 0.2
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cache = {}
+        self.generation = 0
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self, root):
+        self.cancel()
+        self.generation += 1
+        self.cancelled = threading.Event()
+        threading.Thread(
+            target=self._run, args=(root, self.generation, self.cancelled),
+            name="disk-usage", daemon=True
+        ).start()
+        return self.generation
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _run(self, root, generation, cancelled):
+        with self.lock:
+            self.seen = set()
+            self.totals = [0, 0]
+            self.last_progress = time.monotonic()
+            try:
+                node = self._list(root, os.stat(root), cancelled)
+            except OSError:
+                return
+            node.size, node.files = node.own_size, node.own_files
+            node.size += self._count_hardlinks(node)
+            for name in sorted(node.children):
+                if cancelled.is_set():
+                    return
+                if node.children[name].device != node.device:
+                    node.children[name] = None
+                    continue
+                child = self._visit(node.children[name], generation, cancelled)
+                node.children[name] = child
+                if child is not None:
+                    node.size += child.size
+                    node.files += child.files
+                    self.child_sized.emit(generation, child)
+            node.children = {name: child for name, child in node.children.items() if child is not None}
+            if not cancelled.is_set():
+                self.scan_finished.emit(generation, node)
+
+    def _visit(self, node, generation, cancelled):
+        if cancelled.is_set():
+            return node
+        try:
+            st = os.lstat(node.path)
+        except OSError:
+            self.cache.pop(node.path, None)
+            return None
+        if not stat.S_ISDIR(st.st_mode):
+            return None
+        node = self._list(node.path, st, cancelled)
+        node.size, node.files = node.own_size, node.own_files
+        node.size += self._count_hardlinks(node)
+        self.totals[0] += node.size
+        self.totals[1] += node.files
+        now = time.monotonic()
+        if now - self.last_progress >= self.progress_interval:
+            self.last_progress = now
+            self.scan_progress.emit(generation, self.totals[0], self.totals[1])
+        for name, child in list(node.children.items()):
+            if child.device != node.device:
+                del node.children[name]
+                continue
+            child = self._visit(child, generation, cancelled)
+            if child is None:
+                del node.children[name]
+                continue
+            node.children[name] = child
+            node.size += child.size
+            node.files += child.files
+        return node
+
+    def _count_hardlinks(self, node):
+        size = 0
+        for key, file_size in node.hardlinks:
+            if key not in self.seen:
+                self.seen.add(key)
+                size += file_size
+        return size
+
+    def _list(self, path, st, cancelled):
+        node = self.cache.get(path)
+        if node is not None and node.mtime == st.st_mtime:
+            return node
+        previous = node.children if node is not None else {}
+        node = DirectorySize(path, st.st_mtime, st.st_dev)
+        node.own_size = st.st_blocks * 512 if hasattr(st, "st_blocks") else 0
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if cancelled.is_set():
+                        return node
+                    try:
+                        entry_stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stat.S_ISDIR(entry_stat.st_mode):
+                        node.children[entry.name] = previous.get(entry.name) or \
+                            DirectorySize(entry.path, None, entry_stat.st_dev)
+                        continue
+                    size = entry_stat.st_blocks * 512 if hasattr(entry_stat, "st_blocks") else entry_stat.st_size
+                    node.own_files += 1
+                    if entry_stat.st_nlink > 1:
+                        node.hardlinks.append(((entry_stat.st_dev, entry_stat.st_ino), size))
+                    else:
+                        node.own_size += size
+        except OSError:
+            pass
+        self.cache[path] = node
+        return node
+
+
+class SizeItem(QTreeWidgetItem):
+    def __lt__(self, other):
+        column = self.treeWidget().sortColumn() if self.treeWidget() else 0
+        if column == 0:
+            return self.text(0).casefold() < other.text(0).casefold()
+        return (self.data(column, Qt.UserRole) or 0) < (other.data(column, Qt.UserRole) or 0)
+
+
+PREVIEW_COMMENTS = {
+    ".py": "#", ".sh": "#", ".bash": "#", ".rb": "#", ".pl": "#", ".yaml": "#", ".yml": "#", ".toml": "#",
+    ".cfg": "#", ".conf": "#", ".ini": ";", ".cmake": "#", ".r": "#",
+    ".c": "//", ".h": "//", ".cc": "//", ".cpp": "//", ".hpp": "//", ".js": "//", ".ts": "//", ".java": "//",
+    ".go": "//", ".rs": "//", ".cs": "//", ".kt": "//", ".swift": "//", ".php": "//", ".qml": "//",
+    ".sql": "--", ".lua": "--", ".hs": "--",
+}
+
+
+def hex_dump(data, width=16):
+    lines = []
+    for offset in range(0, len(data), width):
+        chunk = data[offset:offset + width]
+        text = "".join(chr(byte) if 32 <= byte < 127 else "." for byte in chunk)
+        lines.append(f"{offset:08x}  {chunk.hex(' '):<{width * 3 - 1}}  {text}")
+    return "\n".join(lines)
+
+
+class Preview:
+    def __init__(self, kind, text="", image=None, comment=None):
+        self.kind = kind
+        self.text = text
+        self.image = image
+        self.comment = comment
+
+
+class PreviewRenderer(QObject):
+    rendered = pyqtSignal(int, object, object)
+    preview_ready = pyqtSignal(int, object)
+
+    text_bytes = 32 * 1024
+    hex_bytes = 4096
+    memory_limit = 32
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.previews = OrderedDict()
+        self.image_types = {bytes(name).decode() for name in QImageReader.supportedMimeTypes()}
+        self.generation = 0
+        self.request = None
+        self.cancelled = threading.Event()
+        self._condition = threading.Condition()
+        self.rendered.connect(self.on_rendered)
+        threading.Thread(target=self._work, name="preview", daemon=True).start()
+
+    def preview(self, key, mime_name, target):
+        self.cancel()
+        self.generation += 1
+        preview = self.previews.get(key)
+        if preview is not None:
+            self.previews.move_to_end(key)
+            return preview
+        self.cancelled = threading.Event()
+        with self._condition:
+            self.request = (self.generation, key, mime_name, target, self.cancelled)
+            self._condition.notify()
+        return None
+
+    def cancel(self):
+        self.cancelled.set()
+        with self._condition:
+            self.request = None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while self.request is None:
+                    self._condition.wait()
+                generation, key, mime_name, target, cancelled = self.request
+                self.request = None
+            with perf.span("preview.render", key[0]):
+                try:
+                    preview = self._render(key[0], mime_name, target, cancelled)
+                except (OSError, ValueError) as e:
+                    preview = Preview("error", getattr(e, "strerror", None) or str(e))
+            if preview is not None and not cancelled.is_set():
+                self.rendered.emit(generation, key, preview)
+
+    def on_rendered(self, generation, key, preview):
+        self.previews[key] = preview
+        while len(self.previews) > self.memory_limit:
+            self.previews.popitem(last=False)
+        self.preview_ready.emit(generation, preview)
+
+    def _render(self, path, mime_name, target, cancelled):
+        if mime_name in self.image_types:
+            reader = QImageReader(path)
+            reader.setAutoTransform(True)
+            size = reader.size()
+            if size.isValid() and (size.width() > target.width() or size.height() > target.height()):
+                reader.setScaledSize(size.scaled(target, Qt.KeepAspectRatio))
+            image = reader.read()
+            if not image.isNull():
+                return Preview("image", f"{size.width()} × {size.height()}", image)
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return Preview("text")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                head = data[:self.text_bytes]
+                if head.find(b"\0", 0, 8192) != -1:
+                    return Preview("hex", hex_dump(head[:self.hex_bytes]))
+                if cancelled.is_set():
+                    return None
+                if size > 2 * self.text_bytes:
+                    tail = data[size - self.text_bytes:]
+                    head = head[:head.rfind(b"\n") + 1] or head
+                    tail = tail[tail.find(b"\n") + 1:] or tail
+                    skipped = format_size(size - len(head) - len(tail))
+                    text = f"{head.decode('utf-8', 'replace')}\n… {skipped} not shown …\n\n" \
+                           f"{tail.decode('utf-8', 'replace')}"
+                else:
+                    text = data[:].decode("utf-8", "replace")
+        suffix = os.path.splitext(path)[1].lower()
+        return Preview("text", text, comment=PREVIEW_COMMENTS.get(suffix))
+
+
+class PreviewHighlighter(QSyntaxHighlighter):
+    keywords = re.compile(
+        r"\b(?:and|as|async|await|break|case|catch|class|const|continue|def|elif|else|enum|except|export|false|"
+        r"False|finally|fn|for|from|func|function|if|impl|import|in|interface|is|lambda|let|local|match|mut|new|"
+        r"nil|None|not|null|or|package|pass|private|protected|pub|public|raise|return|self|static|struct|switch|"
+        r"then|this|throw|true|True|try|type|use|var|void|while|with|yield)\b")
+    numbers = re.compile(r"\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d+)?)\b")
+    strings = re.compile(r"\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'")
+
+    def __init__(self, document):
+        super().__init__(document)
+        self.comment = None
+        self.formats = {}
+        for name, color, bold in (("keyword", "#1f4fa8", True), ("number", "#a0522d", False),
+                                  ("string", "#2e7d32", False), ("comment", "#808080", False)):
+            text_format = QTextCharFormat()
+            text_format.setForeground(QColor(color))
+            if bold:
+                text_format.setFontWeight(QFont.Bold)
+            self.formats[name] = text_format
+
+    def highlightBlock(self, text):
+        if self.comment is None:
+            return
+        for name, pattern in (("keyword", self.keywords), ("number", self.numbers), ("string", self.strings)):
+            for match in pattern.finditer(text):
+                self.setFormat(match.start(), match.end() - match.start(), self.formats[name])
+        position = text.find(self.comment)
+        while position != -1:
+            if not any(match.start() < position < match.end() for match in self.strings.finditer(text)):
+                self.setFormat(position, len(text) - position, self.formats["comment"])
+                return
+            position = text.find(self.comment, position + 1)
+
+
+class DirectoryWatcher(QObject):
+    directory_changed = pyqtSignal(str, object)
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    event_header = struct.Struct("iIII")
+
+    debounce_ms = 150
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.watches = {}
+        self.paths = {}
+        self.refcounts = {}
+        self.pending = {}
+        self.held = {}
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.timeout.connect(self.flush)
+        self.fd = -1
+        self.fallback = None
+        if sys.platform.startswith("linux"):
+            try:
+                import ctypes
+                libc = ctypes.CDLL(None, use_errno=True)
+                self.inotify_add_watch = libc.inotify_add_watch
+                self.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                self.inotify_rm_watch = libc.inotify_rm_watch
+                self.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+                self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+            except (OSError, AttributeError):
+                self.fd = -1
+        if self.fd >= 0:
+            self.notifier = QSocketNotifier(self.fd, QSocketNotifier.Read, self)
+            self.notifier.activated.connect(self.read_events)
+        else:
+            self.fallback = QFileSystemWatcher(self)
+            self.fallback.directoryChanged.connect(lambda path: self.queue_change(path, "rescan", None))
+
+    def watch(self, path):
+        self.refcounts[path] = self.refcounts.get(path, 0) + 1
+        if self.refcounts[path] > 1:
+            return self.is_watching(path)
+        if self.fallback is not None:
+            return self.fallback.addPath(path)
+        mask = (self.IN_CREATE | self.IN_DELETE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_ATTRIB
+                | self.IN_CLOSE_WRITE | self.IN_DELETE_SELF | self.IN_MOVE_SELF | self.IN_ONLYDIR)
+        wd = self.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            return False
+        self.watches[wd] = path
+        self.paths[path] = wd
+        return True
+
+    def unwatch(self, path):
+        if path not in self.refcounts:
+            return
+        self.refcounts[path] -= 1
+        if self.refcounts[path] > 0:
+            return
+        del self.refcounts[path]
+        self.pending.pop(path, None)
+        if self.fallback is not None:
+            self.fallback.removePath(path)
+            return
+        wd = self.paths.pop(path, None)
+        if wd is not None:
+            self.watches.pop(wd, None)
+            self.inotify_rm_watch(self.fd, wd)
+
+    def hold(self, path):
+        self.held[path] = self.held.get(path, 0) + 1
+
+    def release(self, path):
+        self.held[path] -= 1
+        if self.held[path] > 0:
+            return
+        del self.held[path]
+        if path in self.pending and not self.debounce_timer.isActive():
+            self.debounce_timer.start(self.debounce_ms)
+
+    def is_watching(self, path):
+        if self.fallback is not None:
+            return path in self.fallback.directories()
+        return path in self.paths
+
+    def read_events(self):
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + self.event_header.size <= len(data):
+            wd, mask, cookie, length = self.event_header.unpack_from(data, offset)
+            offset += self.event_header.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                for path in self.paths:
+                    self.queue_change(path, "rescan", None)
+                continue
+            path = self.watches.get(wd)
+            if path is None:
+                continue
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+                if self.paths.get(path) == wd:
+                    del self.paths[path]
+                self.queue_change(path, "rescan", None)
+            elif mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                self.queue_change(path, "rescan", None)
+            elif mask & self.IN_MOVED_FROM:
+                self.queue_change(path, "moved_from", name, cookie)
+            elif mask & self.IN_MOVED_TO:
+                self.queue_change(path, "moved_to", name, cookie)
+            elif mask & self.IN_CREATE:
+                self.queue_change(path, "added", name)
+            elif mask & self.IN_DELETE:
+                self.queue_change(path, "removed", name)
+            else:
+                self.queue_change(path, "changed", name)
+
+    def queue_change(self, path, kind, name, cookie=0):
+        changes = self.pending.setdefault(path, {
+            "added": set(), "removed": set(), "changed": set(), "renamed": [], "moves": {}, "rescan": False
+        })
+        if path in self.held:
+            changes["rescan"] = True
+            return
+        if kind == "rescan":
+            changes["rescan"] = True
+        elif kind == "added":
+            if name in changes["removed"]:
+                changes["removed"].discard(name)
+                changes["changed"].add(name)
+            else:
+                changes["added"].add(name)
+        elif kind == "removed":
+            if name in changes["added"]:
+                changes["added"].discard(name)
+            else:
+                changes["removed"].add(name)
+            changes["changed"].discard(name)
+        elif kind == "changed":
+            if name not in changes["added"]:
+                changes["changed"].add(name)
+        elif kind == "moved_from":
+            changes["moves"][cookie] = name
+            self.queue_change(path, "removed", name)
+        elif kind == "moved_to":
+            old_name = changes["moves"].pop(cookie, None)
+            if old_name is not None and old_name in changes["removed"]:
+                changes["removed"].discard(old_name)
+                changes["renamed"].append((old_name, name))
+            else:
+                self.queue_change(path, "added", name)
+        if not self.debounce_timer.isActive():
+            self.debounce_timer.start(self.debounce_ms)
+
+    def flush(self):
+        pending = {path: changes for path, changes in self.pending.items() if path not in self.held}
+        self.pending = {path: changes for path, changes in self.pending.items() if path in self.held}
+        for path, changes in pending.items():
+            del changes["moves"]
+            self.directory_changed.emit(path, changes)
+
+
+class DirectoryModel(QAbstractListModel):
+    rows_pending = pyqtSignal()
+    loading_finished = pyqtSignal(str)
+    stats_ready = pyqtSignal(int, object, bool)
+    stats_loaded = pyqtSignal(bool)
+
+    fetch_batch_size = 1000
+    eager_rows = 1000
+    bulk_remove_threshold = 64
+
+    def __init__(self, thumbnails=None, watcher=None, cache=None, remote=None, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.remote = remote
+        self.remote_root = False
+        self.revalidating = False
+        self.revalidated_mtime = None
+        self.revalidated_entries = []
+        self.watcher = watcher
+        if watcher is not None:
+            watcher.directory_changed.connect(self.on_directory_changed)
+        self.results_mode = False
+        self.thumbnails = thumbnails
+        self.thumbnail_rows = {}
+        if thumbnails is not None:
+            thumbnails.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.root_path = ""
+        self.show_hidden = True
+        self.name_filter = None
+        self.filter_base = None
+        self.loading = False
+        self.load_started = time.perf_counter()
+        self.generation = 0
+        self.icon_provider = QFileIconProvider()
+        self.mime_db = QMimeDatabase()
+        self.icons = {}
+        self.scanner = DirectoryScanner(cache, remote, self)
+        self.scanner.batch_ready.connect(self.on_batch_ready)
+        self.scanner.scan_finished.connect(self.on_scan_finished)
+        self.stats_generation = None
+        self.stats_ready.connect(self.on_stats_ready)
+        self.clear_entries()
+
+    def clear_entries(self):
+        self.names = []
+        self.modes = array("L")
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        self.pending = deque()
+        self.row_lookup = None
+
+    def set_root_path(self, path, use_cache=True):
+        self.beginResetModel()
+        self.watch(path)
+        self.results_mode = False
+        self.name_filter = None
+        self.filter_base = None
+        self.root_path = path
+        self.remote_root = is_remote_path(path)
+        self.clear_entries()
+        self.thumbnail_rows.clear()
+        if self.thumbnails is not None:
+            self.thumbnails.clear_requests()
+        listing = self.cache.get(path) if self.cache is not None and use_cache else None
+        self.load_started = time.perf_counter()
+        perf.count("listing_cache.hit" if listing is not None else "listing_cache.miss")
+        if listing is not None:
+            self.pending.extend(entry for entry in listing.entries if self.accepts(entry[0]))
+            self.loading = False
+            self.revalidating = True
+            self.revalidated_mtime = listing.mtime
+            self.revalidated_entries = []
+            self.generation = self.scanner.scan(path, listing.mtime)
+        else:
+            self.loading = True
+            self.revalidating = False
+            self.generation = self.scanner.scan(path, use_cache=use_cache)
+        self.endResetModel()
+        if listing is not None:
+            self.fetchMore(QModelIndex())
+            self.rows_pending.emit()
+
+    def watch(self, path):
+        if self.watcher is None:
+            return
+        if self.root_path and not self.results_mode:
+            self.watcher.unwatch(self.root_path)
+        if path and not is_remote_path(path):
+            self.watcher.watch(path)
+
+    def is_watched(self):
+        return self.watcher is not None and self.watcher.is_watching(self.root_path)
+
+    def begin_results(self, root):
+        self.beginResetModel()
+        self.watch(None)
+        self.results_mode = True
+        self.name_filter = None
+        self.filter_base = None
+        self.scanner.cancel()
+        self.generation = self.scanner.generation
+        self.root_path = root
+        self.remote_root = is_remote_path(root)
+        self.clear_entries()
+        self.thumbnail_rows.clear()
+        self.loading = True
+        self.endResetModel()
+
+    def add_results(self, paths):
+        prefix = len(self.root_path.rstrip(os.sep)) + 1
+        self.pending.extend((path[prefix:], 0) for path in paths)
+        if len(self.names) < self.eager_rows:
+            self.fetchMore(QModelIndex())
+        self.rows_pending.emit()
+
+    def finish_results(self):
+        self.loading = False
+        self.loading_finished.emit("")
+
+    def filter_entries(self):
+        if self.filter_base is None:
+            self.filter_base = list(zip(self.names, self.modes)) + list(self.pending)
+        return self.filter_base
+
+    def show_filtered(self, query, entries):
+        self.beginResetModel()
+        self.name_filter = query
+        self.clear_entries()
+        self.thumbnail_rows.clear()
+        if self.thumbnails is not None:
+            self.thumbnails.clear_requests()
+        self.pending.extend(entries)
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+        self.rows_pending.emit()
+
+    def clear_name_filter(self):
+        if self.filter_base is None:
+            return
+        entries, self.filter_base = self.filter_base, None
+        self.show_filtered(None, entries)
+
+    def update_filter_base(self, changes):
+        gone = set(changes["removed"]).union(old_name for old_name, new_name in changes["renamed"])
+        new = set(changes["added"]).union(new_name for old_name, new_name in changes["renamed"])
+        if not gone and not new:
+            return
+        base = [entry for entry in self.filter_base if entry[0] not in gone and entry[0] not in new]
+        for name in sorted(new, key=str.casefold):
+            if self.show_hidden or not name.startswith("."):
+                try:
+                    st = self.stat_path(os.path.join(self.root_path, name))
+                except OSError:
+                    continue
+                base.append((name, stat.S_IFDIR if stat.S_ISDIR(st.st_mode) else stat.S_IFREG))
+        self.filter_base = base
+
+    def set_show_hidden(self, show):
+        self.show_hidden = show
+        if self.root_path:
+            self.set_root_path(self.root_path)
+
+    def on_batch_ready(self, generation, batch):
+        if generation != self.generation:
+            return
+        if self.revalidating:
+            self.revalidated_entries.extend(batch)
+            return
+        if self.filter_base is not None:
+            self.filter_base = self.filter_base + sorted(
+                (entry for entry in batch if self.show_hidden or not entry[0].startswith(".")), key=entry_sort_key)
+        batch = sorted((entry for entry in batch if self.accepts(entry[0])), key=entry_sort_key)
+        self.pending.extend(batch)
+        if len(self.names) < self.eager_rows:
+            self.fetchMore(QModelIndex())
+        self.rows_pending.emit()
+
+    def on_directory_changed(self, path, changes):
+        if self.results_mode or path != self.root_path:
+            return
+        if changes["rescan"]:
+            self.set_root_path(self.root_path)
+            return
+        if self.filter_base is not None:
+            self.update_filter_base(changes)
+        rows = {name: row for row, name in enumerate(self.names)}
+        removed = set(changes["removed"])
+        changed = set(changes["changed"])
+        added = set(changes["added"])
+        for old_name, new_name in changes["renamed"]:
+            row = rows.pop(old_name, None)
+            if row is None or new_name in rows or not self.accepts(new_name):
+                if row is not None:
+                    removed.add(old_name)
+                    rows[old_name] = row
+                if new_name in rows:
+                    changed.add(new_name)
+                else:
+                    added.add(new_name)
+                continue
+            self.names[row] = new_name
+            self.sizes[row] = -1
+            self.row_lookup = None
+            rows[new_name] = row
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+        self.remove_rows(sorted((rows[name] for name in removed if name in rows), reverse=True))
+        if self.pending and (removed or added):
+            self.pending = deque(entry for entry in self.pending if entry[0] not in removed)
+            added -= {entry[0] for entry in self.pending}
+        rows = {name: row for row, name in enumerate(self.names)} if removed else rows
+        for name in changed:
+            row = rows.get(name)
+            if row is not None:
+                self.sizes[row] = -1
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+        self.insert_names([name for name in added if name not in rows and self.accepts(name)])
+
+    def accepts(self, name):
+        return ((self.show_hidden or not name.startswith("."))
+                and (self.name_filter is None or self.name_filter.match_name(name)))
+
+    def remove_rows(self, rows):
+        self.row_lookup = None
+        if len(rows) > self.bulk_remove_threshold:
+            self.remove_rows_bulk(set(rows))
+            return
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self.names[first:last + 1]
+            del self.modes[first:last + 1]
+            del self.sizes[first:last + 1]
+            del self.mtimes[first:last + 1]
+            self.endRemoveRows()
+
+    def remove_rows_bulk(self, rows):
+        self.layoutAboutToBeChanged.emit()
+        keep = [row for row in range(len(self.names)) if row not in rows]
+        new_rows = {old: new for new, old in enumerate(keep)}
+        old_indexes = self.persistentIndexList()
+        new_indexes = []
+        for index in old_indexes:
+            row = new_rows.get(index.row())
+            new_indexes.append(self.index(row) if row is not None else QModelIndex())
+        self.names = [self.names[row] for row in keep]
+        self.modes = array("L", (self.modes[row] for row in keep))
+        self.sizes = array("q", (self.sizes[row] for row in keep))
+        self.mtimes = array("d", (self.mtimes[row] for row in keep))
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def insert_names(self, names):
+        entries = []
+        for name in sorted(names, key=str.casefold):
+            try:
+                st = self.stat_path(os.path.join(self.root_path, name))
+            except OSError:
+                continue
+            entries.append((name, st))
+        if not entries:
+            return
+        first = len(self.names)
+        self.beginInsertRows(QModelIndex(), first, first + len(entries) - 1)
+        for name, st in entries:
+            self.names.append(name)
+            self.modes.append(st.st_mode)
+            self.sizes.append(st.st_size)
+            self.mtimes.append(st.st_mtime)
+        self.endInsertRows()
+
+    def on_thumbnail_ready(self, path):
+        row = self.thumbnail_rows.pop(path, None)
+        if row is None or row >= len(self.names) or os.path.join(self.root_path, self.names[row]) != path:
+            return
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def on_scan_finished(self, generation, error, mtime):
+        if generation != self.generation:
+            return
+        if self.revalidating:
+            self.revalidating = False
+            if error or mtime == self.revalidated_mtime:
+                return
+            current = set(self.names).union(entry[0] for entry in self.pending)
+            found = {name for name, mode in self.revalidated_entries if self.accepts(name)}
+            self.revalidated_entries = []
+            self.on_directory_changed(self.root_path, {
+                "added": found - current, "removed": current - found, "changed": set(), "renamed": [],
+                "rescan": False
+            })
+            return
+        if not self.results_mode:
+            perf.record("directory.list", time.perf_counter() - self.load_started, self.root_path, self.load_started)
+        self.loading = False
+        self.loading_finished.emit(error)
+
+    def entry_count(self):
+        return len(self.names) + len(self.pending)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.names)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and bool(self.pending)
+
+    def fetchMore(self, parent):
+        if parent.isValid() or not self.pending:
+            return
+        self.fetch_rows(min(self.fetch_batch_size, len(self.pending)))
+
+    def fetch_all(self):
+        if self.pending:
+            self.fetch_rows(len(self.pending))
+
+    def fetch_rows(self, count):
+        first = len(self.names)
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        if count == len(self.pending):
+            entries = list(self.pending)
+            self.pending.clear()
+        else:
+            entries = [self.pending.popleft() for _ in range(count)]
+        names, modes = zip(*entries)
+        self.names.extend(names)
+        self.modes.extend(modes)
+        self.sizes.extend(array("q", [-1]) * count)
+        self.mtimes.extend(array("d", [0.0]) * count)
+        self.endInsertRows()
+
+    def file_path(self, index):
+        if not index.isValid():
+            return self.root_path
+        return os.path.join(self.root_path, self.names[index.row()])
+
+    def is_dir(self, index):
+        if not index.isValid():
+            return False
+        if not self.modes[index.row()]:
+            self.ensure_stat(index.row())
+        return stat.S_ISDIR(self.modes[index.row()])
+
+    def ensure_stat(self, row):
+        if self.sizes[row] >= 0:
+            return
+        try:
+            st = self.stat_path(os.path.join(self.root_path, self.names[row]))
+        except OSError:
+            self.modes[row] = self.modes[row] or stat.S_IFREG
+            self.sizes[row] = 0
+            return
+        self.modes[row] = st.st_mode
+        self.sizes[row] = st.st_size
+        self.mtimes[row] = st.st_mtime
+
+    def stat_path(self, path):
+        if self.remote_root and self.remote is not None:
+            return self.remote.cached_stat(path)
+        try:
+            return os.stat(path)
+        except OSError:
+            return os.lstat(path)
+
+    def request_stats(self):
+        if self.stats_generation == self.generation:
+            return
+        names = [self.names[row] for row in range(len(self.names)) if self.sizes[row] < 0]
+        if not names:
+            return
+        self.stats_generation = self.generation
+        threading.Thread(target=self._stat_names, args=(self.generation, self.root_path, names),
+                         daemon=True).start()
+
+    def _stat_names(self, generation, root, names):
+        batch = []
+        for name in names:
+            if generation != self.generation:
+                return
+            try:
+                st = self.stat_path(os.path.join(root, name))
+            except OSError:
+                continue
+            batch.append((name, st.st_mode, st.st_size, st.st_mtime))
+            if len(batch) >= 5000:
+                self.stats_ready.emit(generation, batch, False)
+                batch = []
+        self.stats_ready.emit(generation, batch, True)
+
+    def on_stats_ready(self, generation, stats, finished):
+        if generation != self.generation:
+            return
+        if finished:
+            self.stats_generation = None
+        if self.row_lookup is None:
+            self.row_lookup = {name: row for row, name in enumerate(self.names)}
+        for name, mode, size, mtime in stats:
+            row = self.row_lookup.get(name)
+            if row is not None and self.sizes[row] < 0:
+                self.modes[row] = mode
+                self.sizes[row] = size
+                self.mtimes[row] = mtime
+        self.stats_loaded.emit(finished)
+
+    def icon_for_row(self, row):
+        if not self.modes[row]:
+            self.ensure_stat(row)
+        if stat.S_ISDIR(self.modes[row]):
+            key = "inode/directory"
+        else:
+            key = self.mime_db.mimeTypeForFile(self.names[row], QMimeDatabase.MatchExtension).name()
+            if self.thumbnails is not None and not self.remote_root and self.thumbnails.can_thumbnail(key):
+                self.ensure_stat(row)
+                path = os.path.join(self.root_path, self.names[row])
+                icon = self.thumbnails.icon(path, self.mtimes[row], key)
+                if icon is not None:
+                    return icon
+                self.thumbnail_rows[path] = row
+        icon = self.icons.get(key)
+        if icon is None:
+            if key == "inode/directory":
+                icon = QIcon.fromTheme("folder", self.icon_provider.icon(QFileIconProvider.Folder))
+            else:
+                mime = self.mime_db.mimeTypeForName(key)
+                icon = QIcon.fromTheme(mime.iconName(), QIcon.fromTheme(
+                    mime.genericIconName(), self.icon_provider.icon(QFileIconProvider.File)))
+            self.icons[key] = icon
+        return icon
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            return self.names[row]
+        if role == Qt.DecorationRole:
+            with perf.span("model.icon"):
+                return self.icon_for_row(row)
+        if role == Qt.ToolTipRole:
+            self.ensure_stat(row)
+            modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.mtimes[row]))
+            if stat.S_ISDIR(self.modes[row]):
+                return f"{self.names[row]}\nModified: {modified}"
+            return f"{self.names[row]}\nSize: {format_size(self.sizes[row])}\nModified: {modified}"
+        if role == Qt.UserRole:
+            return os.path.join(self.root_path, self.names[row])
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+        if self.is_dir(index):
+            flags |= Qt.ItemIsDropEnabled
+        return flags
+
+    def mimeTypes(self):
+        return ["text/uri-list"]
+
+    def mimeData(self, indexes):
+        mime_data = QMimeData()
+        mime_data.setUrls([path_to_url(self.file_path(index)) for index in indexes])
+        return mime_data
+
+    def supportedDragActions(self):
+        return Qt.CopyAction | Qt.MoveAction
+
+    def supportedDropActions(self):
+        return Qt.CopyAction | Qt.MoveAction
+
+
+NATURAL_SPLIT = re.compile(r"\d+")
+
+
+def pad_digits(match):
+    return match.group().rjust(20, "0")
+
+
+def natural_key(name):
+    return NATURAL_SPLIT.sub(pad_digits, name.casefold())
+
+
+class DescendingKey:
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+def merge_sorted(order, rows, key):
+    rows = sorted(rows, key=key)
+    positions = [bisect.bisect_right(order, key(row), key=key) for row in rows]
+    merged = []
+    start = 0
+    for position, row in zip(positions, rows):
+        merged += order[start:position]
+        merged.append(row)
+        start = position
+    merged += order[start:]
+    return merged, rows, positions
+
+
+class RowSlots:
+    def __init__(self):
+        self.reset(0)
+
+    def reset(self, count):
+        self.alive = bytearray(b"\x01") * count
+        self.dead = 0
+        self.tree = None
+        self.capacity = 0
+
+    def build(self):
+        self.capacity = 1 << (len(self.alive) * 2).bit_length()
+        prefix = list(itertools.accumulate(self.alive, initial=0))
+        prefix += [prefix[-1]] * (self.capacity + 1 - len(prefix))
+        self.tree = array("l", [0]) + array("l", [prefix[i] - prefix[i & (i - 1)] for i in range(1, self.capacity + 1)])
+
+    def add(self, slot, delta):
+        tree = self.tree
+        i = slot + 1
+        while i <= self.capacity:
+            tree[i] += delta
+            i += i & -i
+
+    def append(self, count):
+        start = len(self.alive)
+        self.alive += b"\x01" * count
+        if self.tree is not None:
+            if len(self.alive) > self.capacity:
+                self.build()
+            else:
+                for slot in range(start, len(self.alive)):
+                    self.add(slot, 1)
+        return range(start, len(self.alive))
+
+    def remove(self, slots):
+        if self.tree is None:
+            self.build()
+        for slot in slots:
+            self.alive[slot] = 0
+            self.add(slot, -1)
+        self.dead += len(slots)
+
+    def live(self):
+        return list(itertools.compress(range(len(self.alive)), self.alive))
+
+    def row(self, slot):
+        if self.tree is None:
+            return slot
+        tree = self.tree
+        total = 0
+        while slot:
+            total += tree[slot]
+            slot &= slot - 1
+        return total
+
+    def slot(self, row):
+        if self.tree is None:
+            return row
+        tree = self.tree
+        slot = 0
+        remaining = row + 1
+        step = self.capacity
+        while step:
+            if slot + step <= self.capacity and tree[slot + step] < remaining:
+                slot += step
+                remaining -= tree[slot]
+            step >>= 1
+        return slot
+
+
+class DetailsProxyModel(QAbstractProxyModel):
+    columns = ("Name", "Size", "Type", "Modified", "Permissions")
+    layout_threshold = 64
+    key_cache_roots = 3
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.sort_column = 0
+        self.sort_order = Qt.AscendingOrder
+        self.mime_db = QMimeDatabase()
+        self.type_names = {}
+        self.key_caches = OrderedDict()
+        self.key_cache = {}
+        self.persistent_names = []
+        self.removed_persistent = None
+        self.removed_slots = []
+        self.slots = RowSlots()
+        self.drain_timer = QTimer(self)
+        self.drain_timer.setSingleShot(True)
+        self.drain_timer.timeout.connect(self.drain)
+        self.clear()
+
+    def clear(self):
+        self.order = []
+        self.name_order = []
+        self.name_keys = []
+        self.dir_flags = bytearray()
+        self.types = None
+        self.values = []
+        self.slots.reset(0)
+
+    def setSourceModel(self, model):
+        old = self.sourceModel()
+        if old is model:
+            return
+        if old is not None:
+            for signal, slot in self.source_connections(old):
+                signal.disconnect(slot)
+        if model is not None:
+            model.fetch_all()
+        self.beginResetModel()
+        super().setSourceModel(model)
+        if model is not None:
+            for signal, slot in self.source_connections(model):
+                signal.connect(slot)
+            self.rebuild()
+        else:
+            self.clear()
+        self.endResetModel()
+        if model is not None and not model.loading:
+            model.request_stats()
+
+    def source_connections(self, model):
+        return [
+            (model.rowsInserted, self.on_rows_inserted),
+            (model.rowsAboutToBeRemoved, self.on_rows_about_to_be_removed),
+            (model.rowsRemoved, self.on_rows_removed),
+            (model.modelAboutToBeReset, self.beginResetModel),
+            (model.modelReset, self.on_model_reset),
+            (model.layoutAboutToBeChanged, self.on_layout_about_to_be_changed),
+            (model.layoutChanged, self.on_layout_changed),
+            (model.dataChanged, self.on_data_changed),
+            (model.rows_pending, self.on_rows_pending),
+            (model.loading_finished, self.on_loading_finished),
+            (model.stats_loaded, self.on_stats_loaded),
+        ]
+
+    def name_key(self, name):
+        key = self.key_cache.get(name)
+        if key is None:
+            key = self.key_cache[name] = natural_key(name)
+        return key
+
+    def column_values(self):
+        source = self.sourceModel()
+        if self.sort_column == 1:
+            return list(source.sizes)
+        if self.sort_column == 2:
+            if self.types is None:
+                self.types = self.type_names_for(range(len(source.names)))
+            return self.types
+        if self.sort_column == 3:
+            return list(source.mtimes)
+        if self.sort_column == 4:
+            return [mode & 0o7777 for mode in source.modes]
+        return []
+
+    def column_value(self, row):
+        source = self.sourceModel()
+        if self.sort_column == 1:
+            return source.sizes[row]
+        if self.sort_column == 2:
+            return self.types[row]
+        if self.sort_column == 3:
+            return source.mtimes[row]
+        return source.modes[row] & 0o7777
+
+    def type_name(self, row):
+        return self.type_names_for([row])[0]
+
+    def type_names_for(self, rows):
+        source = self.sourceModel()
+        names, modes = source.names, source.modes
+        cache = self.type_names
+        types = []
+        for row in rows:
+            if modes[row] & 0o170000 == 0o040000:
+                types.append("Folder")
+                continue
+            name = names[row]
+            stem, dot, extension = name.rpartition(".")
+            key = extension.lower() if stem else name
+            type_name = cache.get(key)
+            if type_name is None:
+                type_name = cache[key] = self.mime_db.mimeTypeForFile(name, QMimeDatabase.MatchExtension).comment()
+            types.append(type_name)
+        return types
+
+    def is_dir_flags(self, rows):
+        modes = self.sourceModel().modes
+        return bytearray(modes[row] & 0o170000 == 0o040000 for row in rows)
+
+    def sort_key(self, slot):
+        is_dir = self.dir_flags[slot]
+        name = self.name_keys[slot]
+        descending = self.sort_order == Qt.DescendingOrder
+        if self.sort_column == 0:
+            return not is_dir, DescendingKey(name) if descending else name
+        value = self.values[slot]
+        return not is_dir, DescendingKey(value) if descending else value, name
+
+    def find(self, order, slot, key):
+        position = bisect.bisect_left(order, key(slot), key=key)
+        while order[position] != slot:
+            position += 1
+        return position
+
+    def position(self, slot):
+        return self.find(self.order, slot, self.sort_key)
+
+    def source_position(self, row):
+        return self.position(self.slots.slot(row))
+
+    def source_row(self, position):
+        return self.slots.row(self.order[position])
+
+    def sorted_rows(self):
+        rows = self.name_order
+        descending = self.sort_order == Qt.DescendingOrder
+        if self.sort_column == 0:
+            if descending:
+                rows = rows[::-1]
+        else:
+            rows = sorted(rows, key=self.values.__getitem__, reverse=descending)
+        flags = self.dir_flags
+        if not any(flags):
+            return list(rows)
+        return (list(itertools.compress(rows, map(flags.__getitem__, rows)))
+                + list(itertools.filterfalse(flags.__getitem__, rows)))
+
+    def rebuild(self):
+        source = self.sourceModel()
+        self.key_cache = self.key_caches.pop(source.root_path, None) or {}
+        self.key_caches[source.root_path] = self.key_cache
+        while len(self.key_caches) > self.key_cache_roots:
+            self.key_caches.popitem(last=False)
+        self.name_keys = [self.name_key(name) for name in source.names]
+        self.dir_flags = self.is_dir_flags(range(len(source.names)))
+        self.slots.reset(len(source.names))
+        self.types = None
+        self.name_order = sorted(range(len(self.name_keys)), key=self.name_keys.__getitem__)
+        self.values = self.column_values()
+        self.order = self.sorted_rows()
+
+    def compact(self):
+        if not self.slots.dead:
+            return
+        live = self.slots.live()
+        slots = array("l", [-1]) * len(self.slots.alive)
+        for slot, old in enumerate(live):
+            slots[old] = slot
+        self.order = [slots[old] for old in self.order]
+        self.name_order = [slots[old] for old in self.name_order]
+        self.name_keys = [self.name_keys[old] for old in live]
+        self.dir_flags = bytearray(self.dir_flags[old] for old in live)
+        aliased = self.values is self.types
+        if self.types is not None:
+            self.types = [self.types[old] for old in live]
+        if aliased:
+            self.values = self.types
+        elif self.sort_column in (1, 3, 4):
+            self.values = [self.values[old] for old in live]
+        self.slots.reset(len(live))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if (column, order) == (self.sort_column, self.sort_order):
+            return
+        self.sort_column = column
+        self.sort_order = order
+        if self.sourceModel() is not None:
+            self.resort()
+
+    def resort(self):
+        with perf.span("details.sort"):
+            self.compact()
+            persistent = self.begin_layout()
+            self.values = self.column_values()
+            self.order = self.sorted_rows()
+            self.end_layout(persistent)
+
+    def begin_layout(self):
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        return persistent, [self.order[index.row()] for index in persistent]
+
+    def end_layout(self, persistent):
+        persistent, slots = persistent
+        alive = self.slots.alive
+        self.changePersistentIndexList(persistent, [
+            self.index(self.position(slot), index.column()) if alive[slot] else QModelIndex()
+            for index, slot in zip(persistent, slots)])
+        self.layoutChanged.emit()
+
+    def on_rows_pending(self):
+        if not self.drain_timer.isActive():
+            self.drain_timer.start(0)
+
+    def drain(self):
+        source = self.sourceModel()
+        if source is None:
+            return
+        source.fetch_all()
+        if not source.loading:
+            source.request_stats()
+
+    def on_loading_finished(self, error):
+        self.drain()
+
+    def on_stats_loaded(self, finished):
+        if self.order:
+            self.dataChanged.emit(self.index(0, 1), self.index(len(self.order) - 1, len(self.columns) - 1))
+        if finished and self.sort_column in (1, 3, 4):
+            self.resort()
+
+    def on_rows_inserted(self, parent, first, last):
+        source = self.sourceModel()
+        if first < len(self.order):
+            self.beginResetModel()
+            self.rebuild()
+            self.endResetModel()
+            return
+        rows = range(first, last + 1)
+        slots = self.slots.append(len(rows))
+        self.name_keys += [self.name_key(source.names[row]) for row in rows]
+        self.dir_flags += self.is_dir_flags(rows)
+        if self.types is not None:
+            self.types += self.type_names_for(rows)
+        if self.sort_column in (1, 3, 4):
+            if len(rows) <= self.layout_threshold:
+                for row in rows:
+                    source.ensure_stat(row)
+            self.values += [self.column_value(row) for row in rows]
+        if len(rows) > max(self.layout_threshold, len(self.order) // 8):
+            persistent = self.begin_layout()
+            self.name_order = sorted(self.name_order + list(slots), key=self.name_keys.__getitem__)
+            self.order = self.sorted_rows()
+            self.end_layout(persistent)
+            return
+        if len(rows) > self.layout_threshold:
+            self.name_order = merge_sorted(self.name_order, slots, self.name_keys.__getitem__)[0]
+            persistent = self.begin_layout()
+            self.order = merge_sorted(self.order, slots, self.sort_key)[0]
+            self.end_layout(persistent)
+            return
+        for slot in slots:
+            bisect.insort_right(self.name_order, slot, key=self.name_keys.__getitem__)
+        for slot in sorted(slots, key=self.sort_key):
+            position = bisect.bisect_right(self.order, self.sort_key(slot), key=self.sort_key)
+            self.beginInsertRows(QModelIndex(), position, position)
+            self.order.insert(position, slot)
+            self.endInsertRows()
+
+    def on_rows_about_to_be_removed(self, parent, first, last):
+        self.removed_slots = [self.slots.slot(row) for row in range(first, last + 1)]
+        if len(self.removed_slots) > self.layout_threshold:
+            self.removed_persistent = self.begin_layout()
+            return
+        self.removed_persistent = None
+        for slot in self.removed_slots:
+            position = self.position(slot)
+            self.beginRemoveRows(QModelIndex(), position, position)
+            del self.order[position]
+            self.endRemoveRows()
+
+    def on_rows_removed(self, parent, first, last):
+        slots, self.removed_slots = self.removed_slots, []
+        if self.removed_persistent is not None:
+            self.slots.remove(slots)
+            alive = self.slots.alive
+            self.order = list(filter(alive.__getitem__, self.order))
+            self.name_order = list(filter(alive.__getitem__, self.name_order))
+            persistent, self.removed_persistent = self.removed_persistent, None
+            self.end_layout(persistent)
+        else:
+            for slot in slots:
+                del self.name_order[self.find(self.name_order, slot, self.name_keys.__getitem__)]
+            self.slots.remove(slots)
+        if self.slots.dead > len(self.order):
+            self.compact()
+
+    def on_model_reset(self):
+        self.rebuild()
+        self.endResetModel()
+
+    def on_layout_about_to_be_changed(self):
+        self.layoutAboutToBeChanged.emit()
+        source = self.sourceModel()
+        persistent = self.persistentIndexList()
+        self.persistent_names = (persistent, [source.names[self.source_row(index.row())] for index in persistent])
+
+    def on_layout_changed(self):
+        self.rebuild()
+        persistent, names = self.persistent_names
+        self.persistent_names = []
+        rows = {name: row for row, name in enumerate(self.sourceModel().names)}
+        self.changePersistentIndexList(persistent, [
+            self.index(self.source_position(rows[name]), index.column()) if name in rows else QModelIndex()
+            for index, name in zip(persistent, names)])
+        self.layoutChanged.emit()
+
+    def on_data_changed(self, top_left, bottom_right, roles=[]):
+        first, last = top_left.row(), bottom_right.row()
+        if list(roles) == [Qt.DecorationRole]:
+            for row in range(first, last + 1):
+                index = self.index(self.source_position(row), 0)
+                self.dataChanged.emit(index, index, roles)
+            return
+        source = self.sourceModel()
+        for row in range(first, last + 1):
+            slot = self.slots.slot(row)
+            name_position = self.find(self.name_order, slot, self.name_keys.__getitem__)
+            position = self.position(slot)
+            self.name_keys[slot] = self.name_key(source.names[row])
+            self.dir_flags[slot] = self.is_dir_flags([row])[0]
+            if self.types is not None:
+                self.types[slot] = self.type_name(row)
+            if self.sort_column in (1, 3, 4):
+                source.ensure_stat(row)
+                self.values[slot] = self.column_value(row)
+            self.move_into_place(slot, self.name_order, name_position, self.name_keys.__getitem__)
+            position = self.move_into_place(slot, self.order, position, self.sort_key, True)
+            self.dataChanged.emit(self.index(position, 0), self.index(position, len(self.columns) - 1))
+
+    def move_into_place(self, slot, order, position, key, notify=False):
+        del order[position]
+        target = bisect.bisect_right(order, key(slot), key=key)
+        order.insert(position, slot)
+        if target == position:
+            return position
+        if notify:
+            self.beginMoveRows(QModelIndex(), position, position, QModelIndex(),
+                               target if target < position else target + 1)
+        del order[position]
+        order.insert(target, slot)
+        if notify:
+            self.endMoveRows()
+        return target
+
+    def index(self, row, column=0, parent=QModelIndex()):
+        if parent.isValid() or not 0 <= row < len(self.order) or not 0 <= column < len(self.columns):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def hasChildren(self, parent=QModelIndex()):
+        return not parent.isValid()
+
+    def mapToSource(self, index):
+        if not index.isValid() or self.sourceModel() is None:
+            return QModelIndex()
+        return self.sourceModel().index(self.source_row(index.row()))
+
+    def mapFromSource(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.index(self.source_position(index.row()), 0)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.columns[section]
+        if orientation == Qt.Horizontal and role == Qt.TextAlignmentRole and section == 1:
+            return Qt.AlignRight | Qt.AlignVCenter
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        source = self.sourceModel()
+        row = self.source_row(index.row())
+        column = index.column()
+        if column == 0:
+            return source.data(source.index(row), role)
+        if role == Qt.DisplayRole:
+            source.ensure_stat(row)
+            mode = source.modes[row]
+            if column == 1:
+                return "" if stat.S_ISDIR(mode) else format_size(source.sizes[row])
+            if column == 2:
+                return self.type_name(row)
+            if column == 3:
+                return time.strftime("%Y-%m-%d %H:%M", time.localtime(source.mtimes[row]))
+            return stat.filemode(mode)
+        if role == Qt.TextAlignmentRole and column == 1:
+            return Qt.AlignRight | Qt.AlignVCenter
+        if role == Qt.UserRole:
+            return source.data(source.index(row), role)
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled | Qt.ItemNeverHasChildren
+        if self.sourceModel().modes[self.source_row(index.row())] & 0o170000 == 0o040000:
+            flags |= Qt.ItemIsDropEnabled
+        return flags
+
+    def mimeData(self, indexes):
+        return self.sourceModel().mimeData([self.mapToSource(index) for index in indexes if index.column() == 0])
+
+
+class PathValidator(QObject):
+    validated = pyqtSignal(object)
+
+    timeout = 2.0
+
+    def check(self, paths):
+        paths = list(paths)
+        threading.Thread(target=self._run, args=(paths,), name="path-validator", daemon=True).start()
+
+    def _run(self, paths):
+        results = dict.fromkeys(paths)
+
+        def probe(path):
+            results[path] = os.path.exists(path)
+
+        threads = []
+        for path in paths:
+            thread = threading.Thread(target=probe, args=(path,), name="path-probe", daemon=True)
+            thread.start()
+            threads.append(thread)
+        deadline = time.monotonic() + self.timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self.validated.emit(dict(results))
+
+
+class StartupProfile(QObject):
+    final_phases = {"first paint", "initial listing complete", "sidebar validated"}
+
+    def __init__(self):
+        super().__init__()
+        self.enabled = False
+        self.start = time.perf_counter()
+        self.marks = []
+        self.reported = False
+
+    def enable(self):
+        self.enabled = True
+        self.start = time.perf_counter()
+        self.marks = [("python startup and imports", self.process_age())]
+
+    def process_age(self):
+        try:
+            with open("/proc/self/stat") as f:
+                started = int(f.read().rsplit(")", 1)[1].split()[19])
+            with open("/proc/uptime") as f:
+                uptime = float(f.read().split()[0])
+            return max(0.0, uptime - started / os.sysconf("SC_CLK_TCK"))
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def mark(self, phase):
+        if not self.enabled or self.reported or any(phase == name for name, moment in self.marks):
+            return
+        self.marks.append((phase, time.perf_counter()))
+        if self.final_phases.issubset(name for name, moment in self.marks):
+            self.report()
+
+    def watch_first_paint(self, widget):
+        if self.enabled:
+            widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint:
+            watched.removeEventFilter(self)
+            self.mark("first paint")
+        return False
+
+    def report(self):
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        lines = ["Startup profile:"]
+        imports = self.marks[0][1]
+        if imports is not None:
+            lines.append(f"  {'python startup and imports':<30} {imports * 1000:9.1f} ms")
+        previous = self.start
+        for phase, moment in self.marks[1:]:
+            lines.append(f"  {phase:<30} {(moment - previous) * 1000:9.1f} ms  (at {(moment - self.start) * 1000:.1f} ms)")
+            previous = moment
+        sys.stderr.write("\n".join(lines) + "\n")
+
+
+startup_profile = StartupProfile()
+
+
+class EventLoopWatchdog(QObject):
+    history_limit = 200
+
+    def __init__(self, threshold=0.2, interval=0.05):
+        super().__init__()
+        self.threshold = threshold
+        self.interval = interval
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.heartbeat)
+        self.lock = threading.Lock()
+        self.last_beat = time.monotonic()
+        self.samples = []
+        self.stalls = deque(maxlen=self.history_limit)
+        self.stall_count = 0
+        self.blocked = 0.0
+        self.gui_thread = None
+        self.running = False
+
+    def start(self, threshold=None):
+        if threshold is not None:
+            self.threshold = threshold
+        if self.running:
+            return
+        self.running = True
+        self.gui_thread = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.timer.start(int(self.interval * 1000))
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        self.timer.stop()
+
+    def heartbeat(self):
+        now = time.monotonic()
+        with self.lock:
+            stalled = now - self.last_beat - self.interval
+            self.last_beat = now
+            samples, self.samples = self.samples, []
+        if stalled >= self.threshold:
+            self._record(stalled, samples)
+
+    def _watch(self):
+        while self.running:
+            time.sleep(self.threshold / 2)
+            with self.lock:
+                if time.monotonic() - self.last_beat - self.interval < self.threshold:
+                    continue
+                frame = sys._current_frames().get(self.gui_thread)
+                if frame is not None:
+                    self.samples.append("".join(traceback.format_stack(frame)))
+                del frame
+
+    def _record(self, duration, samples):
+        stack = max(set(samples), key=samples.count) if samples else ""
+        lines = stack.rstrip().splitlines()
+        location = lines[-2].strip() if len(lines) > 1 else ""
+        self.stall_count += 1
+        self.blocked += duration
+        self.stalls.append((duration, time.time(), location, stack))
+        perf.record("gui.stall", duration, location, time.perf_counter() - duration)
+        sys.stderr.write(f"Event loop stalled for {duration * 1000:.0f} ms"
+                         + (f" in:\n{stack}" if stack else " (no stack captured)\n"))
+
+    def summary(self, window=300):
+        cutoff = time.time() - window
+        recent = [duration for duration, when, location, stack in self.stalls if when >= cutoff]
+        return {
+            "count": self.stall_count, "blocked": self.blocked,
+            "recent_count": len(recent), "recent_blocked": sum(recent),
+            "longest": max(recent, default=0.0), "window": window,
+        }
+
+
+watchdog = EventLoopWatchdog()
+
+
+class StateStore:
+    debounce = 0.5
+    max_delay = 3.0
+
+    def __init__(self, path, defaults):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.condition = threading.Condition()
+        self.changes = {}
+        self.changed_at = None
+        self.version = 0
+        self.closed = False
+        self.data = dict(defaults)
+        self.data.update(self.read())
+        self.thread = threading.Thread(target=self._run, name="state-store", daemon=True)
+        self.thread.start()
+
+    def read(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if isinstance(data, list):
+            return {"pinned_folders": data}
+        return data if isinstance(data, dict) else {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def get_item(self, key, item, default=None):
+        return self.data.get(key, {}).get(item, default)
+
+    def set(self, key, value):
+        value = json.loads(json.dumps(value))
+        if self.data.get(key) != value:
+            self.data[key] = value
+            self._changed((key, None), value)
+
+    def set_item(self, key, item, value, limit=None):
+        value = json.loads(json.dumps(value))
+        items = self.data.setdefault(key, {})
+        if items.get(item) == value:
+            return
+        items.pop(item, None)
+        if value is not None:
+            items[item] = value
+        while limit is not None and len(items) > limit:
+            stale = next(iter(items))
+            del items[stale]
+            self._changed((key, stale), None)
+        self._changed((key, item), value)
+
+    def _changed(self, key, value):
+        with self.condition:
+            self.changes[key] = value
+            self.version += 1
+            if self.changed_at is None:
+                self.changed_at = time.monotonic()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.changes and not self.closed:
+                    self.condition.wait()
+                if self.closed and not self.changes:
+                    return
+                while not self.closed and time.monotonic() - self.changed_at < self.max_delay:
+                    version = self.version
+                    self.condition.wait(self.debounce)
+                    if self.version == version:
+                        break
+                changes, self.changes, self.changed_at = self.changes, {}, None
+            try:
+                self.write(changes)
+            except OSError as e:
+                sys.stderr.write(f"Failed to save {self.path}: {e}\n")
+
+    def write(self, changes):
+        import fcntl
+        with perf.span("state.write", self.path), open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self.read()
+            for (key, item), value in changes.items():
+                if item is None:
+                    data[key] = value
+                elif value is None:
+                    data.get(key, {}).pop(item, None)
+                else:
+                    if not isinstance(data.get(key), dict):
+                        data[key] = {}
+                    data[key].pop(item, None)
+                    data[key][item] = value
+            directory = os.path.dirname(self.path)
+            fd, temporary = tempfile.mkstemp(prefix=".aldernys-state-", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(data, f, indent=1)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporary, self.path)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def close(self, timeout=5):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join(timeout)
+
+
+class BrowserPane(QStackedWidget):
+    def __init__(self, thumbnails, watcher, listing_cache, remote=None, parent=None):
+        super().__init__(parent)
+        self.model = DirectoryModel(thumbnails, watcher, listing_cache, remote, self)
+        self.current_path = ""
+        self.history = []
+        self.history_index = -1
+        self.search_generation = 0
+        self.filter_generation = 0
+        self.filter_text = ""
+
+        self.list_view = QListView()
+        self.list_view.setModel(self.model)
+        self.list_view.setViewMode(QListView.IconMode)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setLayoutMode(QListView.Batched)
+        self.list_view.setBatchSize(500)
+        self.list_view.setIconSize(QSize(64, 64))
+        self.list_view.setGridSize(QSize(100, 80))
+        self.list_view.setSelectionMode(QListView.ExtendedSelection)
+        self.list_view.setMouseTracking(True)
+        self.list_view.setDragEnabled(True)
+        self.list_view.setAcceptDrops(True)
+        self.list_view.setDropIndicatorShown(True)
+
+        self.details_model = DetailsProxyModel(self)
+        self.details_view = QTableView()
+        self.details_view.setModel(self.details_model)
+        self.details_view.setShowGrid(False)
+        self.details_view.setWordWrap(False)
+        self.details_view.verticalHeader().hide()
+        self.details_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.details_view.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
+        self.details_view.horizontalHeader().setHighlightSections(False)
+        self.details_view.horizontalHeader().setStretchLastSection(True)
+        self.details_view.setSortingEnabled(True)
+        self.details_view.sortByColumn(0, Qt.AscendingOrder)
+        self.details_view.setSelectionMode(QTableView.ExtendedSelection)
+        self.details_view.setSelectionBehavior(QTableView.SelectRows)
+        self.details_view.setIconSize(QSize(16, 16))
+        self.details_view.setColumnWidth(0, 320)
+        self.details_view.setMouseTracking(True)
+        self.details_view.setDragEnabled(True)
+        self.details_view.setAcceptDrops(True)
+        self.details_view.setDropIndicatorShown(True)
+
+        self.addWidget(self.list_view)
+        self.addWidget(self.details_view)
+        self.view = self.list_view
+
+    def views(self):
+        return self.list_view, self.details_view
+
+    def title(self):
+        if self.search_generation:
+            return "Search"
+        return os.path.basename(self.current_path.rstrip(os.sep)) or self.current_path or "/"
+
+    def set_details(self, details):
+        if details:
+            self.details_model.setSourceModel(self.model)
+            self.view = self.details_view
+        else:
+            self.details_model.setSourceModel(None)
+            self.view = self.list_view
+        self.setCurrentWidget(self.view)
+
+    def source_index(self, index):
+        if index.isValid() and index.model() is self.details_model:
+            return self.details_model.mapToSource(index)
+        return index
+
+    def close_pane(self):
+        self.details_model.setSourceModel(None)
+        self.model.watch(None)
+        self.model.scanner.cancel()
+        self.deleteLater()
+
+
+RENAME_TOKEN = re.compile(r"\{(name|ext|parent|n|date|exif)(?::([^}]*))?\}")
+RENAME_CASES = ("Keep case", "lowercase", "UPPERCASE", "Title Case")
+RENAME_PROBLEMS = {"invalid": "Invalid name", "duplicate": "Duplicate name", "exists": "Already exists"}
+
+
+def exif_datetime(path, limit=128 * 1024):
+    try:
+        with open(path, "rb") as f:
+            data = f.read(limit)
+    except OSError:
+        return None
+    start = data.find(b"Exif\0\0")
+    if not data.startswith(b"\xff\xd8") or start < 0:
+        return None
+    tiff = data[start + 6:]
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None:
+        return None
+
+    def entries(offset):
+        count, = struct.unpack_from(endian + "H", tiff, offset)
+        for position in range(offset + 2, offset + 2 + count * 12, 12):
+            yield struct.unpack_from(endian + "HHII", tiff, position)
+
+    try:
+        found = {}
+        for tag, kind, count, value in entries(struct.unpack_from(endian + "I", tiff, 4)[0]):
+            if tag == 0x0132:
+                found[tag] = value
+            elif tag == 0x8769:
+                for exif_tag, exif_kind, exif_count, exif_value in entries(value):
+                    if exif_tag == 0x9003:
+                        found[exif_tag] = exif_value
+        offset = found.get(0x9003, found.get(0x0132))
+        if offset is None:
+            return None
+        return time.mktime(time.strptime(tiff[offset:offset + 19].decode("ascii"), "%Y:%m:%d %H:%M:%S"))
+    except (struct.error, ValueError, UnicodeDecodeError, OverflowError):
+        return None
+
+
+class RenamePattern:
+    def __init__(self, find="", replace="{name}{ext}", is_regex=False, case=0, start=1, step=1):
+        self.find = find
+        self.replace = replace
+        self.is_regex = is_regex
+        self.case = case
+        self.start = start
+        self.step = step
+        self.regex = re.compile(find) if is_regex and find else None
+        self.tokens = RENAME_TOKEN.search(replace) is not None
+
+    def token(self, match, path, position, cache):
+        kind, spec = match.groups()
+        name = os.path.basename(path)
+        if kind == "name":
+            return os.path.splitext(name)[0]
+        if kind == "ext":
+            return os.path.splitext(name)[1]
+        if kind == "parent":
+            return os.path.basename(os.path.dirname(path))
+        if kind == "n":
+            return str(self.start + position * self.step).zfill(int(spec) if spec and spec.isdigit() else 0)
+        moment = None
+        if kind == "exif":
+            key = ("exif", path)
+            if key not in cache:
+                cache[key] = exif_datetime(path)
+            moment = cache[key]
+        if moment is None:
+            key = ("mtime", path)
+            if key not in cache:
+                try:
+                    cache[key] = os.lstat(path).st_mtime
+                except OSError:
+                    cache[key] = 0
+            moment = cache[key]
+        return time.strftime(spec or "%Y-%m-%d", time.localtime(moment))
+
+    def new_name(self, path, position, cache):
+        def expand(match):
+            value = self.token(match, path, position, cache)
+            return value.replace("\\", "\\\\") if self.regex is not None else value
+
+        replacement = RENAME_TOKEN.sub(expand, self.replace) if self.tokens else self.replace
+        name = path.rpartition(os.sep)[2]
+        if not self.find:
+            result = replacement
+        elif self.regex is not None:
+            result = self.regex.sub(replacement, name)
+        else:
+            result = name.replace(self.find, replacement)
+        if self.case:
+            stem, extension = os.path.splitext(result)
+            stem = (str.lower, str.upper, str.title)[self.case - 1](stem)
+            result = stem + extension
+        return result
+
+
+def plan_renames(paths, pattern, cancelled, cache):
+    results = []
+    targets = []
+    moving = set()
+    counts = {}
+    for position, path in enumerate(paths):
+        if position % 1000 == 0 and cancelled.is_set():
+            return None
+        try:
+            new_name = pattern.new_name(path, position, cache)
+        except (re.error, IndexError, ValueError):
+            new_name = ""
+        result = [path, new_name, ""]
+        results.append(result)
+        if not new_name or new_name in (".", "..") or os.sep in new_name or "\0" in new_name:
+            result[2] = "invalid"
+            targets.append(None)
+            continue
+        target = path.rpartition(os.sep)[0] + os.sep + new_name
+        targets.append(target)
+        counts[target] = counts.get(target, 0) + 1
+        if target == path:
+            result[2] = "unchanged"
+        else:
+            moving.add(path)
+    listings = {}
+    for position, (result, target) in enumerate(zip(results, targets)):
+        if position % 1000 == 0 and cancelled.is_set():
+            return None
+        path, new_name, status = result
+        if status == "invalid":
+            continue
+        if counts[target] > 1:
+            result[2] = "duplicate"
+        elif status != "unchanged":
+            directory = path.rpartition(os.sep)[0]
+            names = listings.get(directory)
+            if names is None:
+                try:
+                    names = listings[directory] = set(os.listdir(directory))
+                except OSError:
+                    names = listings[directory] = set()
+            if new_name in names and target not in moving:
+                result[2] = "exists"
+    return results
+
+
+class RenamePreviewer(QObject):
+    preview_ready = pyqtSignal(int, object)
+
+    def __init__(self, paths, parent=None):
+        super().__init__(parent)
+        self.paths = paths
+        self.cache = {}
+        self.generation = 0
+        self.cancelled = threading.Event()
+
+    def start(self, pattern):
+        self.cancel()
+        self.generation += 1
+        self.cancelled = threading.Event()
+        threading.Thread(
+            target=self._run, args=(pattern, self.generation, self.cancelled),
+            name="rename-preview", daemon=True
+        ).start()
+        return self.generation
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _run(self, pattern, generation, cancelled):
+        with perf.span("rename.preview", str(len(self.paths))):
+            results = plan_renames(self.paths, pattern, cancelled, self.cache)
+        if results is not None and not cancelled.is_set():
+            self.preview_ready.emit(generation, results)
+
+
+class RenamePreviewModel(QAbstractTableModel):
+    headers = ("Name", "New Name")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.results = []
+
+    def set_results(self, results):
+        self.beginResetModel()
+        self.results = results
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.results)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        path, new_name, status = self.results[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(path) if index.column() == 0 else new_name
+        if role == Qt.ForegroundRole and index.column() == 1:
+            if status in RENAME_PROBLEMS:
+                return QColor(200, 0, 0)
+            if status == "unchanged":
+                return QColor(128, 128, 128)
+        if role == Qt.ToolTipRole:
+            return RENAME_PROBLEMS.get(status, path)
+        return None
+
+
+class BulkRenameDialog(QDialog):
+    preview_delay = 150
+
+    def __init__(self, paths, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Rename {len(paths)} Items")
+        self.resize(720, 520)
+        self.results = []
+        self.error = None
+        self.previewer = RenamePreviewer(paths, self)
+        self.previewer.preview_ready.connect(self.on_preview_ready)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.timeout.connect(self.update_preview)
+
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        self.find_edit = QLineEdit()
+        self.find_edit.setPlaceholderText("Leave empty to rename whole names")
+        form.addRow("Find:", self.find_edit)
+        self.replace_edit = QLineEdit("{name}{ext}")
+        self.replace_edit.setToolTip("Tokens: {name} {ext} {parent} {n} {n:3} {date} {date:%Y%m%d} {exif} {exif:%Y-%m-%d}\n"
+                                     "With regular expressions, \\1 or \\g<name> insert groups.")
+        form.addRow("Replace with:", self.replace_edit)
+        options = QHBoxLayout()
+        self.regex_check = QCheckBox("Regular expression")
+        options.addWidget(self.regex_check)
+        self.case_combo = QComboBox()
+        self.case_combo.addItems(RENAME_CASES)
+        options.addWidget(self.case_combo)
+        options.addWidget(QLabel("Counter start:"))
+        self.start_spin = QSpinBox()
+        self.start_spin.setRange(0, 10 ** 9)
+        self.start_spin.setValue(1)
+        options.addWidget(self.start_spin)
+        options.addWidget(QLabel("Step:"))
+        self.step_spin = QSpinBox()
+        self.step_spin.setRange(1, 10 ** 6)
+        options.addWidget(self.step_spin)
+        options.addStretch(1)
+        form.addRow(options)
+        layout.addLayout(form)
+
+        self.preview_model = RenamePreviewModel(self)
+        self.preview_view = QTableView()
+        self.preview_view.setModel(self.preview_model)
+        self.preview_view.setShowGrid(False)
+        self.preview_view.setWordWrap(False)
+        self.preview_view.verticalHeader().hide()
+        self.preview_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.preview_view.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
+        self.preview_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.preview_view, 1)
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        self.buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        self.buttons.button(QDialogButtonBox.Ok).setText("Rename")
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        layout.addWidget(self.buttons)
+
+        for edit in (self.find_edit, self.replace_edit):
+            edit.textChanged.connect(self.schedule_preview)
+        self.regex_check.toggled.connect(self.schedule_preview)
+        self.case_combo.currentIndexChanged.connect(self.schedule_preview)
+        self.start_spin.valueChanged.connect(self.schedule_preview)
+        self.step_spin.valueChanged.connect(self.schedule_preview)
+        self.update_preview()
+
+    def schedule_preview(self):
+        self.buttons.button(QDialogButtonBox.Ok).setEnabled(False)
+        self.preview_timer.start(self.preview_delay)
+
+    def pattern(self):
+        return RenamePattern(self.find_edit.text(), self.replace_edit.text(), self.regex_check.isChecked(),
+                             self.case_combo.currentIndex(), self.start_spin.value(), self.step_spin.value())
+
+    def update_preview(self):
+        try:
+            pattern = self.pattern()
+        except re.error as e:
+            self.previewer.cancel()
+            self.status_label.setText(f"Invalid regular expression: {e}")
+            self.buttons.button(QDialogButtonBox.Ok).setEnabled(False)
+            return
+        self.status_label.setText("Updating preview...")
+        self.previewer.start(pattern)
+
+    def on_preview_ready(self, generation, results):
+        if generation != self.previewer.generation:
+            return
+        self.results = results
+        self.preview_model.set_results(results)
+        renamed = sum(1 for path, new_name, status in results if not status)
+        problems = sum(1 for path, new_name, status in results if status in RENAME_PROBLEMS)
+        message = f"{renamed} of {len(results)} items will be renamed"
+        if problems:
+            message += f", {problems} with problems"
+        self.status_label.setText(message)
+        self.buttons.button(QDialogButtonBox.Ok).setEnabled(renamed > 0 and not problems)
+
+    def renames(self):
+        return [(path, os.path.join(os.path.dirname(path), new_name))
+                for path, new_name, status in self.results if not status]
+
+    def done(self, result):
+        self.previewer.cancel()
+        self.preview_timer.stop()
+        super().done(result)
+
+
+class SharedServices(QObject):
+    def __init__(self, daemon=False, parent=None):
+        super().__init__(parent)
+        self.daemon = daemon
+        self.windows = []
+        self.closed = False
+        self.state = StateStore(os.path.join(QDir.homePath(), ".aldernys_config.json"), {
+            "pinned_folders": [
+                QDir.homePath(),
+                os.path.join(QDir.homePath(), "Documents"),
+                os.path.join(QDir.homePath(), "Downloads"),
+            ],
+        })
+        self.pinned_folders = [normalize_remote_path(folder) if is_remote_path(folder) else folder
+                               for folder in self.state.get("pinned_folders")]
+        self.state.set("pinned_folders", self.pinned_folders)
+        startup_profile.mark("config")
+
+        self.thumbnails = ThumbnailCache(self)
+        self.watcher = DirectoryWatcher(self)
+        self.listing_cache = ListingCache()
+        self.cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(QDir.homePath(), ".cache")
+        self.remote = RemoteFileSystem(
+            self.listing_cache, os.path.join(self.cache_home, "aldernys", "transfers"), self)
+        self.remote_cache_dir = os.path.join(self.cache_home, "aldernys", "remote")
+        self.prefetcher = DirectoryPrefetcher(self.listing_cache, self.remote)
+        self.trash = TrashStore(os.path.join(self.cache_home, "aldernys", "trash-index.sqlite"), self)
+        self.file_ops = FileOperationQueue(self.remote, self.trash, self)
+        startup_profile.mark("models and services")
+
+    def open_window(self, path=None):
+        window = FileManager(self, path)
+        window.setAttribute(Qt.WA_DeleteOnClose)
+        window.show()
+        window.raise_()
+        window.activateWindow()
+        return window
+
+    def window_closed(self, window):
+        if window in self.windows:
+            self.windows.remove(window)
+        if not self.windows and not self.daemon:
+            self.shutdown()
+
+    def shutdown(self):
+        if self.closed:
+            return
+        self.closed = True
+        perf.stop_trace()
+        self.remote.shutdown()
+        self.state.close()
+
+
+class InstanceServer(QObject):
+    def __init__(self, services, path, parent=None):
+        super().__init__(parent)
+        self.services = services
+        self.path = path
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self.on_new_connection)
+
+    @staticmethod
+    def socket_path():
+        directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+        return os.path.join(directory, f"aldernys-{os.getuid()}.socket")
+
+    @staticmethod
+    def alive(path):
+        import socket
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(0.5)
+                client.connect(path)
+                return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def send(path, paths, timeout=5.0):
+        import socket
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(timeout)
+                client.connect(path)
+                client.sendall(json.dumps({"paths": paths}).encode() + b"\n")
+                return client.makefile("rb").readline().strip() == b"ok"
+        except (OSError, ValueError):
+            return False
+
+    def listen(self):
+        if self.server.listen(self.path):
+            return True
+        if self.alive(self.path):
+            return False
+        QLocalServer.removeServer(self.path)
+        return self.server.listen(self.path)
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            connection = self.server.nextPendingConnection()
+            connection.readyRead.connect(lambda connection=connection: self.on_ready_read(connection))
+            connection.disconnected.connect(connection.deleteLater)
+
+    def on_ready_read(self, connection):
+        if not connection.canReadLine():
+            return
+        try:
+            paths = json.loads(bytes(connection.readLine()).decode())["paths"] or [None]
+        except (ValueError, KeyError, TypeError):
+            connection.disconnectFromServer()
+            return
+        with perf.span("instance.open", str(len(paths))):
+            for path in paths:
+                self.services.open_window(path)
+        connection.write(b"ok\n")
+        connection.flush()
+        connection.disconnectFromServer()
 
 
 class FileManager(QMainWindow):
-    def __init__(self):
+    saved_history = 50
+    saved_folder_sorts = 2000
+
+    def __init__(self, services=None, path=None):
         super().__init__()
         self.setWindowTitle("Aldernys File Manager")
         self.setGeometry(100, 100, 1024, 768)
         
         self.setWindowIcon(QIcon.fromTheme("system-file-manager"))
         self.set_kde_style()
+        startup_profile.mark("style")
         
         self.create_menu()
-        self.config_file = os.path.join(QDir.homePath(), ".aldernys_config.json")
-        self.pinned_folders = self.load_pinned_folders()
-
-        self.model = QFileSystemModel()
-        self.model.setRootPath(QDir.homePath())
-        self.model.setFilter(QDir.AllEntries | QDir.NoDotAndDotDot | QDir.Hidden)
-
-        self.list_view = QListView()
-        self.list_view.setModel(self.model)
-        self.list_view.setRootIndex(self.model.index(QDir.homePath()))
-        self.list_view.setViewMode(QListView.IconMode)
-        self.list_view.setUniformItemSizes(True)
-        self.list_view.setIconSize(QSize(64, 64))
-        self.list_view.setGridSize(QSize(100, 80))
-        self.list_view.setSelectionMode(QListView.ExtendedSelection)
-        self.list_view.doubleClicked.connect(self.on_item_double_clicked)
-        self.list_view.setDragEnabled(True)
-        self.list_view.setAcceptDrops(True)
-        self.list_view.setDropIndicatorShown(True)
-        self.list_view.dragEnterEvent = self.dragEnterEvent
-        self.list_view.dragMoveEvent = self.dragMoveEvent
-        self.list_view.dropEvent = self.dropEvent
+        startup_profile.mark("menus")
+        self.services = services or SharedServices()
+        self.services.windows.append(self)
+        self.state = self.services.state
+        self.thumbnails = self.services.thumbnails
+        self.watcher = self.services.watcher
+        self.listing_cache = self.services.listing_cache
+        self.remote = self.services.remote
+        self.remote.operation_finished.connect(self.on_remote_operation_finished)
+        self.remote_pending = set()
+        self.remote_cache_dir = self.services.remote_cache_dir
+        self.prefetcher = self.services.prefetcher
+        cache_home = self.services.cache_home
 
         self.sidebar = QDockWidget("Places", self)
         self.sidebar.setFeatures(QDockWidget.NoDockWidgetFeatures)
@@ -52,7 +5637,12 @@ class FileManager(QMainWindow):
         self.sidebar_widget.customContextMenuRequested.connect(self.show_sidebar_context_menu)
         self.sidebar.setWidget(self.sidebar_widget)
         self.addDockWidget(Qt.LeftDockWidgetArea, self.sidebar)
+        self.unresponsive_paths = set()
+        self.path_validator = PathValidator(self)
+        self.path_validator.validated.connect(self.on_sidebar_validated)
         self.update_sidebar()
+        QTimer.singleShot(0, self.validate_sidebar)
+        startup_profile.mark("sidebar")
 
         self.toolbar = QToolBar("Tools")
         self.addToolBar(self.toolbar)
@@ -90,17 +5680,95 @@ class FileManager(QMainWindow):
         self.path_edit.returnPressed.connect(self.navigate_to_path)
         self.toolbar.addWidget(self.path_edit)
 
+        self.search_edit = QLineEdit()
+        self.search_edit.setMaximumWidth(250)
+        self.search_edit.setPlaceholderText("Search: name, *.glob, re:regex, size>10M, age<7d")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.returnPressed.connect(self.start_search)
+        self.search_edit.textChanged.connect(self.on_search_text_changed)
+        self.toolbar.addWidget(self.search_edit)
+
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setMaximumWidth(200)
+        self.filter_edit.setPlaceholderText("Filter: text, *.glob, ~fuzzy")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self.apply_filter)
+        self.toolbar.addWidget(self.filter_edit)
+        self.name_filter = NameFilter(self)
+        self.name_filter.filtered.connect(self.on_filter_results)
+
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
-        self.setCentralWidget(self.list_view)
+        self.job_progress_bar = QProgressBar()
+        self.job_progress_bar.setMaximumWidth(200)
+        self.job_progress_bar.setRange(0, 1000)
+        self.job_progress_bar.hide()
+        self.status_bar.addPermanentWidget(self.job_progress_bar)
 
-        self.history = []
-        self.history_index = -1
-        self.current_path = QDir.homePath()
-        self.update_path(self.model.index(self.current_path))
+        self.search = FileSearch(os.path.join(cache_home, "aldernys", "search-index.sqlite"), self)
+        self.search.results_found.connect(self.on_search_results)
+        self.search.search_finished.connect(self.on_search_finished)
+        self.search_pane = None
+
+        self.content_search = ContentSearch(self)
+        self.content_search.hits_found.connect(self.on_content_hits)
+        self.content_search.search_finished.connect(self.on_content_search_finished)
+        self.content_search_generation = 0
+        self.find_dock = None
+
+        self.disk_usage = DiskUsageScanner(self)
+        self.disk_usage.child_sized.connect(self.on_folder_sized)
+        self.disk_usage.scan_progress.connect(self.on_folder_sizes_progress)
+        self.disk_usage.scan_finished.connect(self.on_folder_sizes_finished)
+        self.disk_usage_generation = 0
+        self.sizes_dock = None
+        self.perf_dock = None
+
+        self.duplicates = DuplicateFinder(os.path.join(cache_home, "aldernys", "hashes.sqlite"), self)
+        self.duplicates.duplicates_found.connect(self.on_duplicates_found)
+        self.duplicates.scan_progress.connect(self.on_duplicates_progress)
+        self.duplicates.scan_finished.connect(self.on_duplicates_finished)
+        self.duplicates_generation = 0
+        self.duplicates_dock = None
+
+        self.previewer = PreviewRenderer(self)
+        self.previewer.preview_ready.connect(self.on_preview_ready)
+        self.preview_dock = None
+
+        self.trash = self.services.trash
+        self.trash.items_ready.connect(self.on_trash_items)
+        self.trash_generation = 0
+        self.trash_dock = None
+
+        self.file_ops = self.services.file_ops
+        self.owned_jobs = set()
+        self.held_paths = {}
+        self.remote_opens = {}
+        self.file_ops.job_started.connect(self.on_job_progress)
+        self.file_ops.job_progress.connect(self.on_job_progress)
+        self.file_ops.job_conflicts.connect(self.on_job_conflicts)
+        self.file_ops.job_finished.connect(self.on_job_finished)
 
-        self.list_view.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.list_view.customContextMenuRequested.connect(self.show_context_menu)
+        self.pane = None
+        self.left_tabs = self.create_tabs()
+        self.right_tabs = self.create_tabs()
+        self.right_tabs.hide()
+        self.splitter = QSplitter(Qt.Horizontal)
+        self.splitter.setChildrenCollapsible(False)
+        self.splitter.addWidget(self.left_tabs)
+        self.splitter.addWidget(self.right_tabs)
+        self.setCentralWidget(self.splitter)
+        self.activate_pane(self.add_tab(self.left_tabs))
+        startup_profile.watch_first_paint(self.list_view.viewport())
+        self.set_directory(path or self.current_path)
+        self.history = [normalize_remote_path(path) if is_remote_path(path) else path
+                        for path in self.state.get("history", []) if path != self.current_path]
+        self.history_index = len(self.history) - 1
+        self.add_to_history(self.current_path)
+        if self.state.get("dual_pane", False):
+            self.dual_pane_action.setChecked(True)
+            self.activate_pane(self.left_tabs.currentWidget())
+        startup_profile.mark("window constructed")
 
     def set_kde_style(self):
         palette = QPalette()
@@ -283,34 +5951,26 @@ class FileManager(QMainWindow):
             }
         """)
 
-    def load_pinned_folders(self):
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, "r") as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                return [
-                    QDir.homePath(),
-                    os.path.join(QDir.homePath(), "Documents"),
-                    os.path.join(QDir.homePath(), "Downloads"),
-                ]
-        return [
-            QDir.homePath(),
-            os.path.join(QDir.homePath(), "Documents"),
-            os.path.join(QDir.homePath(), "Downloads"),
-        ]
-
     def save_pinned_folders(self):
-        with open(self.config_file, "w") as f:
-            json.dump(self.pinned_folders, f, indent=4)
+        self.state.set("pinned_folders", self.pinned_folders)
+        for window in self.services.windows:
+            if window is not self:
+                window.update_sidebar()
 
     def update_sidebar(self):
         self.sidebar_widget.clear()
-        self.pinned_folders = [folder for folder in self.pinned_folders if os.path.exists(folder)]
-        self.save_pinned_folders()
 
         for folder in self.pinned_folders:
-            item = QListWidgetItem(QIcon.fromTheme("folder-bookmark"), os.path.basename(folder))
+            if is_remote_path(folder):
+                icon = "package-x-generic" if folder.startswith("archive:") else "folder-remote"
+                item = QListWidgetItem(QIcon.fromTheme(icon), posixpath.basename(folder.rstrip("/")))
+                item.setToolTip(folder)
+            elif folder in self.unresponsive_paths:
+                item = QListWidgetItem(QIcon.fromTheme("network-offline"), os.path.basename(folder))
+                item.setToolTip(f"{folder} is not responding")
+            else:
+                item = QListWidgetItem(QIcon.fromTheme("folder-bookmark"), os.path.basename(folder))
+                item.setToolTip(folder)
             item.setData(Qt.UserRole, folder)
             self.sidebar_widget.addItem(item)
 
@@ -324,6 +5984,20 @@ class FileManager(QMainWindow):
             item.setData(Qt.UserRole, drive_path)
             self.sidebar_widget.addItem(item)
 
+    def validate_sidebar(self):
+        self.path_validator.check(folder for folder in self.pinned_folders if not is_remote_path(folder))
+
+    def on_sidebar_validated(self, results):
+        missing = [path for path, exists in results.items() if exists is False]
+        unresponsive = {path for path, exists in results.items() if exists is None}
+        if missing:
+            self.pinned_folders = [folder for folder in self.pinned_folders if folder not in missing]
+            self.save_pinned_folders()
+        if missing or unresponsive != self.unresponsive_paths:
+            self.unresponsive_paths = unresponsive
+            self.update_sidebar()
+        startup_profile.mark("sidebar validated")
+
     def pin_current_folder(self):
         if self.current_path not in self.pinned_folders:
             self.pinned_folders.append(self.current_path)
@@ -331,15 +6005,23 @@ class FileManager(QMainWindow):
             self.save_pinned_folders()
 
     def on_item_double_clicked(self, index):
-        path = self.model.filePath(index)
-        if os.path.isdir(path):
-            self.list_view.setRootIndex(index)
+        index = self.source_index(index)
+        path = self.model.file_path(index)
+        if self.model.is_dir(index) if self.model.remote_root else os.path.isdir(path):
+            self.set_directory(path)
+            self.add_to_history(path)
+        elif not self.model.remote_root and is_archive_name(path):
+            path = normalize_remote_path("archive://" + path)
+            self.set_directory(path)
             self.add_to_history(path)
-            self.update_path(index)
         else:
             self.open_file(path)
 
     def open_file(self, path):
+        import subprocess
+        if is_remote_path(path):
+            self.open_remote_file(path)
+            return
         try:
             if sys.platform == "win32":
                 os.startfile(path)
@@ -350,27 +6032,867 @@ class FileManager(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to open file: {e}")
 
+    def open_remote_file(self, path):
+        directory = os.path.join(self.remote_cache_dir, hashlib.sha1(posixpath.dirname(path).encode()).hexdigest()[:16])
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Failed to open file: {e}")
+            return
+        job = self.submit_job(FileJob("copy", [path], directory, "overwrite"))
+        self.remote_opens[job] = os.path.join(directory, posixpath.basename(path))
+        self.status_bar.showMessage(f"Downloading {posixpath.basename(path)}...")
+
+    def submit_remote(self, operation, *uris):
+        self.remote_pending.add(uris[0])
+        self.remote.submit(operation, *uris)
+
+    def on_remote_operation_finished(self, path, error):
+        if path not in self.remote_pending:
+            if not error and normalize_remote_path(posixpath.dirname(path)) == self.current_path:
+                self.refresh()
+            return
+        self.remote_pending.discard(path)
+        if error:
+            QMessageBox.critical(self, "Error", f"Failed to change {path}: {error}")
+        elif normalize_remote_path(posixpath.dirname(path)) == self.current_path:
+            self.refresh()
+
+    def connect_to_server(self):
+        uri, ok = QInputDialog.getText(self, "Connect to Server", "Address (sftp://user@host/path or webdav://host/path):",
+                                       text="sftp://")
+        if not ok or not uri:
+            return
+        if not is_remote_path(uri):
+            QMessageBox.warning(self, "Error", "Enter an sftp://, webdav:// or webdavs:// address.")
+            return
+        try:
+            self.remote.remember_password(uri)
+        except OSError as e:
+            QMessageBox.warning(self, "Error", e.strerror)
+            return
+        path = normalize_remote_path(uri)
+        self.set_directory(path)
+        self.add_to_history(path)
+        self.pin_current_folder()
+
+    def refuse_remote(self, action):
+        if not is_remote_path(self.current_path):
+            return False
+        self.status_bar.showMessage(f"{action} is only available for local folders")
+        return True
+
     def on_sidebar_item_clicked(self, item):
         path = item.data(Qt.UserRole)
-        index = self.model.index(path)
-        self.list_view.setRootIndex(index)
+        self.set_directory(path)
         self.add_to_history(path)
-        self.update_path(index)
 
     def navigate_to_path(self):
         path = self.path_edit.text()
-        if os.path.exists(path):
-            index = self.model.index(path)
-            self.list_view.setRootIndex(index)
+        if is_remote_path(path):
+            try:
+                self.remote.remember_password(path)
+            except OSError:
+                pass
+            path = normalize_remote_path(path)
+            self.set_directory(path)
+            self.add_to_history(path)
+        elif os.path.isdir(path):
+            self.set_directory(path)
             self.add_to_history(path)
-            self.update_path(index)
+        elif os.path.exists(path):
+            self.open_file(path)
         else:
             QMessageBox.warning(self, "Error", "The specified path does not exist.")
 
-    def update_path(self, index):
-        self.current_path = self.model.filePath(index)
+    def start_search(self):
+        text = self.search_edit.text().strip()
+        if not text or self.refuse_remote("Search"):
+            return
+        try:
+            query = SearchQuery(text)
+        except (re.error, ValueError) as e:
+            QMessageBox.warning(self, "Search", f"Invalid search: {e}")
+            return
+        indexed_root = None
+        for folder in self.pinned_folders:
+            if self.current_path == folder or self.current_path.startswith(folder.rstrip(os.sep) + os.sep):
+                if indexed_root is None or len(folder) < len(indexed_root):
+                    indexed_root = folder
+        if self.search_pane is not None and self.search_pane is not self.pane and self.search_pane.search_generation:
+            self.search_pane.model.finish_results()
+        self.search_pane = self.pane
+        self.model.begin_results(self.current_path)
+        self.search_generation = self.search.start(self.current_path, query, indexed_root)
+        self.update_tab_title()
+        self.status_bar.showMessage(f"Searching for {text}...")
+
+    def on_search_text_changed(self, text):
+        if not text and self.search_generation:
+            self.search.cancel()
+            self.search_generation = 0
+            self.set_directory(self.current_path)
+
+    def on_search_results(self, generation, paths):
+        pane = self.search_pane
+        if pane is not None and generation == pane.search_generation:
+            pane.model.add_results(paths)
+            if pane is self.pane:
+                self.status_bar.showMessage(f"Searching... {self.model.entry_count()} results")
+
+    def on_search_finished(self, generation, found):
+        pane = self.search_pane
+        if pane is not None and generation == pane.search_generation:
+            pane.model.finish_results()
+            if pane is self.pane:
+                self.status_bar.showMessage(f"Found {self.model.entry_count()} results")
+
+    def focus_filter(self):
+        self.filter_edit.setFocus()
+        self.filter_edit.selectAll()
+
+    def apply_filter(self, text):
+        if self.model.results_mode:
+            return
+        if not text:
+            self.name_filter.cancel()
+            self.filter_generation = 0
+            self.model.clear_name_filter()
+            self.update_status()
+            return
+        self.filter_generation = self.name_filter.filter(text, self.model.filter_entries())
+
+    def on_filter_results(self, generation, entries, rows):
+        if generation != self.filter_generation:
+            return
+        if entries is not self.model.filter_base:
+            if not self.model.loading:
+                self.apply_filter(self.filter_edit.text())
+            return
+        self.model.show_filtered(FilterQuery(self.filter_edit.text()), [entries[row] for row in rows])
+        self.view.scrollToTop()
+        self.update_status()
+
+    def create_find_in_files_dock(self):
+        self.find_dock = QDockWidget("Find in Files", self)
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(2, 2, 2, 2)
+        controls = QHBoxLayout()
+        self.find_edit = QLineEdit()
+        self.find_edit.setPlaceholderText("Text or re:regex")
+        self.find_edit.returnPressed.connect(self.start_content_search)
+        controls.addWidget(self.find_edit)
+        self.find_ignore_case = QCheckBox("Ignore case")
+        controls.addWidget(self.find_ignore_case)
+        self.find_button = QPushButton(QIcon.fromTheme("edit-find"), "Find")
+        self.find_button.clicked.connect(self.start_content_search)
+        controls.addWidget(self.find_button)
+        self.find_stop_button = QPushButton(QIcon.fromTheme("process-stop"), "Stop")
+        self.find_stop_button.clicked.connect(self.stop_content_search)
+        self.find_stop_button.setEnabled(False)
+        controls.addWidget(self.find_stop_button)
+        layout.addLayout(controls)
+        self.find_results = QListWidget()
+        self.find_results.setUniformItemSizes(True)
+        self.find_results.itemDoubleClicked.connect(self.on_content_hit_activated)
+        layout.addWidget(self.find_results)
+        self.find_dock.setWidget(widget)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.find_dock)
+        self.find_dock.hide()
+
+    def show_find_in_files(self):
+        if self.find_dock is None:
+            self.create_find_in_files_dock()
+        self.find_dock.show()
+        self.find_edit.setFocus()
+        self.find_edit.selectAll()
+
+    def start_content_search(self):
+        text = self.find_edit.text()
+        if not text or self.refuse_remote("Find in files"):
+            return
+        is_regex = text.startswith("re:")
+        pattern = text[3:] if is_regex else text
+        if is_regex:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                QMessageBox.warning(self, "Find in Files", f"Invalid regular expression: {e}")
+                return
+        self.find_results.clear()
+        self.content_search_root = self.current_path
+        self.content_search_generation = self.content_search.start(
+            self.current_path, pattern, is_regex, self.find_ignore_case.isChecked()
+        )
+        self.find_stop_button.setEnabled(True)
+        self.status_bar.showMessage(f"Searching file contents in {self.current_path}...")
+
+    def stop_content_search(self):
+        self.content_search.cancel()
+        self.content_search_generation = 0
+        self.find_stop_button.setEnabled(False)
+        self.status_bar.showMessage(f"Find in files stopped, {self.find_results.count()} matches")
+
+    def on_content_hits(self, generation, hits):
+        if generation != self.content_search_generation:
+            return
+        prefix = len(self.content_search_root.rstrip(os.sep)) + 1
+        self.find_results.setUpdatesEnabled(False)
+        for path, line, offset, text in hits:
+            item = QListWidgetItem(f"{path[prefix:]}:{line}: {text.strip()}")
+            item.setData(Qt.UserRole, (path, line, offset))
+            self.find_results.addItem(item)
+        self.find_results.setUpdatesEnabled(True)
+        self.status_bar.showMessage(f"Find in files: {self.find_results.count()} matches so far...")
+
+    def on_content_search_finished(self, generation, scanned, hits):
+        if generation != self.content_search_generation:
+            return
+        self.find_stop_button.setEnabled(False)
+        self.status_bar.showMessage(f"Find in files: {hits} matches in {scanned} files")
+
+    def on_content_hit_activated(self, item):
+        path, line, offset = item.data(Qt.UserRole)
+        self.open_file(path)
+
+    def create_folder_sizes_dock(self):
+        self.sizes_dock = QDockWidget("Folder Sizes", self)
+        self.sizes_tree = QTreeWidget()
+        self.sizes_tree.setColumnCount(4)
+        self.sizes_tree.setHeaderLabels(["Name", "Size", "Share", "Files"])
+        self.sizes_tree.setSortingEnabled(True)
+        self.sizes_tree.sortByColumn(1, Qt.DescendingOrder)
+        self.sizes_tree.setUniformRowHeights(True)
+        self.sizes_tree.itemExpanded.connect(self.on_size_item_expanded)
+        self.sizes_tree.itemDoubleClicked.connect(self.on_size_item_activated)
+        self.sizes_dock.setWidget(self.sizes_tree)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.sizes_dock)
+        self.sizes_dock.hide()
+
+    def show_folder_sizes(self):
+        if self.refuse_remote("Folder sizes"):
+            return
+        if self.sizes_dock is None:
+            self.create_folder_sizes_dock()
+        self.sizes_dock.show()
+        self.sizes_tree.clear()
+        self.sizes_total = 0
+        self.sizes_root = self.current_path
+        self.disk_usage_generation = self.disk_usage.start(self.current_path)
+        self.status_bar.showMessage(f"Calculating folder sizes in {self.current_path}...")
+
+    def add_size_item(self, parent, node, total):
+        item = SizeItem(parent)
+        item.setText(0, os.path.basename(node.path) if node.path else "(files)")
+        item.setIcon(0, QIcon.fromTheme("folder" if node.path else "text-x-generic"))
+        item.setText(1, format_size(node.size))
+        item.setData(1, Qt.UserRole, node.size)
+        item.setText(2, f"{node.size * 100 / total:.1f}%" if total else "")
+        item.setData(2, Qt.UserRole, node.size)
+        item.setText(3, str(node.files))
+        item.setData(3, Qt.UserRole, node.files)
+        item.setData(0, Qt.UserRole, node)
+        if node.children:
+            item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+        return item
+
+    def on_folder_sized(self, generation, node):
+        if generation != self.disk_usage_generation:
+            return
+        self.sizes_total += node.size
+        self.add_size_item(self.sizes_tree, node, 0)
+
+    def on_folder_sizes_progress(self, generation, size, files):
+        if generation == self.disk_usage_generation:
+            self.status_bar.showMessage(f"Calculating folder sizes... {format_size(size)} in {files} files")
+
+    def on_folder_sizes_finished(self, generation, root):
+        if generation != self.disk_usage_generation:
+            return
+        self.sizes_tree.clear()
+        files = DirectorySize("", None, None)
+        files.size = root.size - sum(child.size for child in root.children.values())
+        files.files = root.own_files
+        if files.files:
+            self.add_size_item(self.sizes_tree, files, root.size)
+        for child in root.children.values():
+            self.add_size_item(self.sizes_tree, child, root.size)
+        self.status_bar.showMessage(
+            f"{self.sizes_root}: {format_size(root.size)} in {root.files} files")
+
+    def on_size_item_expanded(self, item):
+        node = item.data(0, Qt.UserRole)
+        if item.childCount() or node is None:
+            return
+        self.sizes_tree.setSortingEnabled(False)
+        for child in node.children.values():
+            self.add_size_item(item, child, node.size)
+        self.sizes_tree.setSortingEnabled(True)
+
+    def on_size_item_activated(self, item):
+        node = item.data(0, Qt.UserRole)
+        if node is not None and node.path:
+            self.set_directory(node.path)
+            self.add_to_history(node.path)
+
+    def create_duplicates_dock(self):
+        self.duplicates_dock = QDockWidget("Duplicates", self)
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(2, 2, 2, 2)
+        controls = QHBoxLayout()
+        self.duplicates_label = QLabel()
+        controls.addWidget(self.duplicates_label, 1)
+        select_button = QPushButton(QIcon.fromTheme("edit-select-all"), "Check All But First")
+        select_button.clicked.connect(self.check_duplicate_copies)
+        controls.addWidget(select_button)
+        delete_button = QPushButton(QIcon.fromTheme("edit-delete"), "Delete Checked")
+        delete_button.clicked.connect(self.delete_checked_duplicates)
+        controls.addWidget(delete_button)
+        link_button = QPushButton(QIcon.fromTheme("insert-link"), "Hardlink Checked")
+        link_button.clicked.connect(self.hardlink_checked_duplicates)
+        controls.addWidget(link_button)
+        self.duplicates_stop_button = QPushButton(QIcon.fromTheme("process-stop"), "Stop")
+        self.duplicates_stop_button.clicked.connect(self.stop_duplicate_search)
+        controls.addWidget(self.duplicates_stop_button)
+        layout.addLayout(controls)
+        self.duplicates_tree = QTreeWidget()
+        self.duplicates_tree.setColumnCount(2)
+        self.duplicates_tree.setHeaderLabels(["Name", "Size"])
+        self.duplicates_tree.setUniformRowHeights(True)
+        self.duplicates_tree.itemDoubleClicked.connect(self.on_duplicate_activated)
+        layout.addWidget(self.duplicates_tree)
+        self.duplicates_dock.setWidget(widget)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.duplicates_dock)
+        self.duplicates_dock.hide()
+
+    def find_duplicates(self, pinned=False):
+        roots = [folder for folder in self.pinned_folders if not is_remote_path(folder)] if pinned \
+            else [self.current_path]
+        if not pinned and self.refuse_remote("Find duplicates"):
+            return
+        if not roots:
+            QMessageBox.information(self, "Find Duplicates", "There are no local pinned folders.")
+            return
+        if self.duplicates_dock is None:
+            self.create_duplicates_dock()
+        self.duplicates_dock.show()
+        self.duplicates_tree.clear()
+        self.duplicates_wasted = 0
+        self.duplicates_label.setText(f"Searching {', '.join(roots)}")
+        self.duplicates_stop_button.setEnabled(True)
+        self.duplicates_generation = self.duplicates.start(roots)
+
+    def stop_duplicate_search(self):
+        self.duplicates.cancel()
+        self.duplicates_generation = 0
+        self.duplicates_stop_button.setEnabled(False)
+        self.status_bar.showMessage("Duplicate search stopped")
+
+    def on_duplicates_found(self, generation, groups):
+        if generation != self.duplicates_generation:
+            return
+        self.duplicates_tree.setUpdatesEnabled(False)
+        for size, digest, inodes in groups:
+            paths = [path for key, links in inodes for path in links]
+            group = QTreeWidgetItem(self.duplicates_tree)
+            group.setText(0, f"{len(inodes)} copies of {os.path.basename(paths[0])}")
+            group.setText(1, format_size(size))
+            group.setData(0, Qt.UserRole, None)
+            for key, links in inodes:
+                for path in links:
+                    item = QTreeWidgetItem(group)
+                    item.setText(0, path)
+                    item.setText(1, format_size(size))
+                    item.setData(0, Qt.UserRole, path)
+                    item.setData(0, Qt.UserRole + 1, key)
+                    item.setCheckState(0, Qt.Unchecked)
+            group.setExpanded(True)
+            self.duplicates_wasted += size * (len(inodes) - 1)
+        self.duplicates_tree.setUpdatesEnabled(True)
+        self.duplicates_label.setText(
+            f"{self.duplicates_tree.topLevelItemCount()} groups, {format_size(self.duplicates_wasted)} reclaimable")
+
+    def on_duplicates_progress(self, generation, stage, done, total):
+        if generation == self.duplicates_generation:
+            self.status_bar.showMessage(
+                f"Find duplicates: {stage.lower()} {done}/{total} files..." if total
+                else f"Find duplicates: {stage.lower()} {done} files...")
+
+    def on_duplicates_finished(self, generation, groups, wasted):
+        if generation != self.duplicates_generation:
+            return
+        self.duplicates_stop_button.setEnabled(False)
+        self.status_bar.showMessage(f"Find duplicates: {groups} groups, {format_size(wasted)} reclaimable")
+
+    def on_duplicate_activated(self, item):
+        path = item.data(0, Qt.UserRole)
+        if path is not None:
+            self.open_file(path)
+
+    def check_duplicate_copies(self):
+        for i in range(self.duplicates_tree.topLevelItemCount()):
+            group = self.duplicates_tree.topLevelItem(i)
+            for j in range(group.childCount()):
+                group.child(j).setCheckState(0, Qt.Checked if j else Qt.Unchecked)
+
+    def checked_duplicates(self):
+        checked = []
+        for i in range(self.duplicates_tree.topLevelItemCount()):
+            group = self.duplicates_tree.topLevelItem(i)
+            items = [group.child(j) for j in range(group.childCount())]
+            marked = [item for item in items if item.checkState(0) == Qt.Checked]
+            kept = [item for item in items if item.checkState(0) != Qt.Checked]
+            if marked:
+                checked.append((group, kept, marked))
+        return checked
+
+    def remove_duplicate_items(self, group, items):
+        for item in items:
+            group.removeChild(item)
+        if group.childCount() < 2:
+            self.duplicates_tree.takeTopLevelItem(self.duplicates_tree.indexOfTopLevelItem(group))
+
+    def delete_checked_duplicates(self):
+        checked = self.checked_duplicates()
+        if any(not kept for group, kept, marked in checked):
+            QMessageBox.warning(self, "Delete Duplicates", "Leave at least one copy unchecked in every group.")
+            return
+        pairs = [(item, kept[0]) for group, kept, marked in checked for item in marked]
+        if not pairs:
+            return
+        self.submit_job(FileJob("trash", [item.data(0, Qt.UserRole) for item, kept in pairs],
+                                targets=[kept.data(0, Qt.UserRole) for item, kept in pairs],
+                                keys=[(item.data(0, Qt.UserRole + 1), kept.data(0, Qt.UserRole + 1))
+                                      for item, kept in pairs]))
+        for group, kept, marked in checked:
+            self.remove_duplicate_items(group, marked)
+
+    def hardlink_checked_duplicates(self):
+        checked = self.checked_duplicates()
+        if any(not kept for group, kept, marked in checked):
+            QMessageBox.warning(self, "Hardlink Duplicates", "Leave at least one copy unchecked in every group.")
+            return
+        pairs = [(item, kept[0]) for group, kept, marked in checked for item in marked]
+        if not pairs:
+            return
+        job = FileJob("link", [item.data(0, Qt.UserRole) for item, source in pairs],
+                      targets=[source.data(0, Qt.UserRole) for item, source in pairs],
+                      keys=[(item.data(0, Qt.UserRole + 1), source.data(0, Qt.UserRole + 1)) for item, source in pairs])
+        self.held_paths[job] = {os.path.dirname(path) for path in job.sources}
+        for path in self.held_paths[job]:
+            self.watcher.hold(path)
+        self.submit_job(job)
+        for group, kept, marked in checked:
+            self.remove_duplicate_items(group, marked)
+
+    def create_preview_dock(self):
+        self.preview_dock = QDockWidget("Preview", self)
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(2, 2, 2, 2)
+        self.preview_title = QLabel()
+        self.preview_title.setWordWrap(True)
+        self.preview_title.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        layout.addWidget(self.preview_title)
+        self.preview_stack = QStackedWidget()
+        self.preview_text = QPlainTextEdit()
+        self.preview_text.setReadOnly(True)
+        self.preview_text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.preview_text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.preview_highlighter = PreviewHighlighter(self.preview_text.document())
+        self.preview_stack.addWidget(self.preview_text)
+        self.preview_image = QLabel()
+        self.preview_image.setAlignment(Qt.AlignCenter)
+        self.preview_image.setMinimumSize(64, 64)
+        self.preview_stack.addWidget(self.preview_image)
+        layout.addWidget(self.preview_stack, 1)
+        self.preview_dock.setWidget(widget)
+        self.preview_dock.visibilityChanged.connect(lambda visible: visible and self.update_preview())
+        self.addDockWidget(Qt.RightDockWidgetArea, self.preview_dock)
+        self.preview_dock.hide()
+
+    def toggle_preview(self):
+        if self.preview_dock is None:
+            self.create_preview_dock()
+        self.preview_dock.setVisible(not self.preview_dock.isVisible())
+        if not self.preview_dock.isVisible():
+            self.previewer.cancel()
+
+    def on_current_changed(self, pane):
+        if pane is self.pane:
+            self.update_preview()
+
+    def update_preview(self):
+        if self.preview_dock is None or not self.preview_dock.isVisible():
+            return
+        index = self.source_index(self.view.currentIndex())
+        if not index.isValid():
+            self.previewer.cancel()
+            self.show_preview_message("", "")
+            return
+        row = index.row()
+        path = self.model.file_path(index)
+        self.model.ensure_stat(row)
+        mode, size, mtime = self.model.modes[row], self.model.sizes[row], self.model.mtimes[row]
+        mime = self.model.mime_db.mimeTypeForFile(path, QMimeDatabase.MatchExtension)
+        name = posixpath.basename(path) if self.model.remote_root else os.path.basename(path)
+        if stat.S_ISDIR(mode):
+            self.previewer.cancel()
+            self.show_preview_message(f"<b>{name}</b><br>Folder", "")
+            return
+        self.preview_title.setText(f"<b>{name}</b><br>{format_size(size)} · {mime.comment()}")
+        if self.model.remote_root:
+            self.previewer.cancel()
+            self.show_preview_message(None, "Preview is only available for local files.")
+            return
+        preview = self.previewer.preview((path, size, mtime), mime.name(), self.preview_stack.size())
+        if preview is not None:
+            self.show_preview(preview)
+
+    def show_preview_message(self, title, text):
+        if title is not None:
+            self.preview_title.setText(title)
+        self.preview_highlighter.comment = None
+        self.preview_text.setPlainText(text)
+        self.preview_stack.setCurrentWidget(self.preview_text)
+
+    def on_preview_ready(self, generation, preview):
+        if generation == self.previewer.generation and self.preview_dock is not None:
+            self.show_preview(preview)
+
+    def show_preview(self, preview):
+        if preview.kind == "image":
+            pixmap = QPixmap.fromImage(preview.image)
+            target = self.preview_stack.size()
+            if pixmap.width() > target.width() or pixmap.height() > target.height():
+                pixmap = pixmap.scaled(target, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            self.preview_image.setPixmap(pixmap)
+            self.preview_image.setToolTip(preview.text)
+            self.preview_stack.setCurrentWidget(self.preview_image)
+            return
+        self.preview_highlighter.comment = preview.comment
+        self.preview_text.setPlainText(preview.text)
+        self.preview_stack.setCurrentWidget(self.preview_text)
+
+    def create_performance_dock(self):
+        self.perf_dock = QDockWidget("Performance", self)
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(2, 2, 2, 2)
+        self.perf_tree = QTreeWidget()
+        self.perf_tree.setHeaderLabels(["Operation", "Count", "p50", "p95", "p99", "Max"])
+        self.perf_tree.setRootIsDecorated(False)
+        self.perf_tree.setUniformRowHeights(True)
+        layout.addWidget(self.perf_tree)
+        self.perf_slowest = QListWidget()
+        layout.addWidget(self.perf_slowest)
+        self.perf_stall_summary = QLabel()
+        layout.addWidget(self.perf_stall_summary)
+        self.perf_stalls = QListWidget()
+        layout.addWidget(self.perf_stalls)
+        self.perf_dock.setWidget(widget)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.perf_dock)
+        self.perf_timer = QTimer(self)
+        self.perf_timer.timeout.connect(self.update_performance_monitor)
+        self.perf_dock.visibilityChanged.connect(
+            lambda visible: self.perf_timer.start(1000) if visible else self.perf_timer.stop())
+
+    def show_performance_monitor(self):
+        if self.perf_dock is None:
+            self.create_performance_dock()
+        self.perf_dock.show()
+        self.update_performance_monitor()
+
+    def update_performance_monitor(self):
+        rows, counters, slowest = perf.snapshot()
+        self.perf_tree.clear()
+        for name, count, p50, p95, p99, maximum in rows:
+            QTreeWidgetItem(self.perf_tree, [name, str(count)] + [
+                f"{value * 1000:.2f} ms" for value in (p50, p95, p99, maximum)])
+        for name, value in sorted(counters.items()):
+            QTreeWidgetItem(self.perf_tree, [name, str(value), "", "", "", ""])
+        self.perf_slowest.clear()
+        for seconds, name, path, when in slowest:
+            moment = time.strftime("%H:%M:%S", time.localtime(when))
+            self.perf_slowest.addItem(f"{seconds * 1000:8.1f} ms  {name}  {path}  ({moment})")
+        summary = watchdog.summary()
+        if not watchdog.running:
+            self.perf_stall_summary.setText("Event loop watchdog is off")
+        else:
+            self.perf_stall_summary.setText(
+                f"Stalls over {watchdog.threshold * 1000:.0f} ms: {summary['recent_count']} in the last "
+                f"{summary['window'] // 60} min ({summary['recent_blocked']:.2f} s blocked, longest "
+                f"{summary['longest'] * 1000:.0f} ms); {summary['count']} total ({summary['blocked']:.2f} s)")
+        self.perf_stalls.clear()
+        for duration, when, location, stack in reversed(watchdog.stalls):
+            moment = time.strftime("%H:%M:%S", time.localtime(when))
+            item = QListWidgetItem(f"{duration * 1000:8.0f} ms  {location or 'unknown location'}  ({moment})")
+            item.setToolTip(stack or "No stack captured")
+            self.perf_stalls.addItem(item)
+
+    def toggle_trace(self, checked):
+        if checked:
+            if perf.trace_file is None:
+                path = os.path.join(QDir.homePath(), time.strftime("aldernys-trace-%Y%m%d-%H%M%S.json"))
+                try:
+                    perf.start_trace(path)
+                except OSError as e:
+                    QMessageBox.critical(self, "Error", f"Failed to start trace: {e}")
+                    self.trace_action.setChecked(False)
+                    return
+            self.status_bar.showMessage(f"Recording trace to {perf.trace_path}")
+        else:
+            path = perf.stop_trace()
+            if path:
+                self.status_bar.showMessage(f"Trace saved to {path}")
+
+    def closeEvent(self, event):
+        self.content_search.shutdown()
+        self.duplicates.shutdown()
+        self.search.cancel()
+        for tabs in (self.left_tabs, self.right_tabs):
+            for index in range(tabs.count()):
+                pane = tabs.widget(index)
+                pane.model.watch(None)
+                pane.model.scanner.cancel()
+        self.services.window_closed(self)
+        super().closeEvent(event)
+
+    def set_directory(self, path):
+        if self.search_generation:
+            self.search.cancel()
+            self.search_generation = 0
+        if self.filter_edit.text():
+            self.name_filter.cancel()
+            self.filter_generation = 0
+            self.filter_edit.blockSignals(True)
+            self.filter_edit.clear()
+            self.filter_edit.blockSignals(False)
+        self.current_path = normalize_remote_path(path) if is_remote_path(path) else os.path.abspath(path)
+        with perf.span("directory.open", self.current_path):
+            self.model.set_root_path(self.current_path)
+            self.restore_folder_sort(self.pane)
+            self.view.scrollToTop()
+            self.update_path()
+        self.update_preview()
+        self.update_tab_title()
+
+    model = property(lambda self: self.pane.model)
+    view = property(lambda self: self.pane.view)
+    list_view = property(lambda self: self.pane.list_view)
+    details_view = property(lambda self: self.pane.details_view)
+    details_model = property(lambda self: self.pane.details_model)
+
+    pinned_folders = property(lambda self: self.services.pinned_folders,
+                              lambda self, value: setattr(self.services, "pinned_folders", value))
+
+    def pane_attribute(name):
+        return property(lambda self: getattr(self.pane, name), lambda self, value: setattr(self.pane, name, value))
+
+    current_path = pane_attribute("current_path")
+    history = pane_attribute("history")
+    history_index = pane_attribute("history_index")
+    search_generation = pane_attribute("search_generation")
+    filter_generation = pane_attribute("filter_generation")
+    del pane_attribute
+
+    def create_tabs(self):
+        tabs = QTabWidget()
+        tabs.setDocumentMode(True)
+        tabs.setMovable(True)
+        tabs.setTabsClosable(True)
+        tabs.setTabBarAutoHide(True)
+        tabs.tabCloseRequested.connect(lambda index: self.close_tab(tabs, index))
+        tabs.currentChanged.connect(lambda index: self.on_tab_changed(tabs, index))
+        return tabs
+
+    def on_tab_changed(self, tabs, index):
+        if index >= 0 and not tabs.isHidden():
+            self.activate_pane(tabs.widget(index))
+
+    def create_pane(self):
+        pane = BrowserPane(self.thumbnails, self.watcher, self.listing_cache, self.remote)
+        model = pane.model
+        model.rows_pending.connect(lambda: self.fetch_visible_rows(pane))
+        model.loading_finished.connect(lambda error: self.on_directory_loaded(error, pane))
+        model.rowsInserted.connect(lambda: self.on_model_rows_changed(pane))
+        model.rowsRemoved.connect(lambda: self.on_model_rows_changed(pane))
+        model.layoutChanged.connect(lambda: self.on_model_rows_changed(pane))
+        for view in pane.views():
+            view.doubleClicked.connect(self.on_item_double_clicked)
+            view.entered.connect(self.on_item_hovered)
+            view.dragEnterEvent = self.dragEnterEvent
+            view.dragMoveEvent = self.dragMoveEvent
+            view.dropEvent = lambda event: self.dropEvent(event, pane)
+            view.setContextMenuPolicy(Qt.CustomContextMenu)
+            view.customContextMenuRequested.connect(lambda position: self.show_pane_context_menu(pane, position))
+            view.installEventFilter(self)
+            view.selectionModel().currentChanged.connect(lambda current, previous: self.on_current_changed(pane))
+        pane.details_view.horizontalHeader().sortIndicatorChanged.connect(
+            lambda column, order: self.on_sort_changed(pane, column, order))
+        return pane
+
+    def add_tab(self, tabs, path=None):
+        pane = self.create_pane()
+        pane.current_path = path or QDir.homePath()
+        if self.pane is not None:
+            pane.model.show_hidden = self.model.show_hidden
+            pane.set_details(self.view is self.details_view)
+        else:
+            pane.model.show_hidden = self.state.get("show_hidden", True)
+            pane.set_details(self.state.get("details_view", False))
+        tabs.addTab(pane, pane.title())
+        tabs.setTabToolTip(tabs.indexOf(pane), pane.current_path)
+        tabs.setCurrentWidget(pane)
+        if path is not None:
+            self.activate_pane(pane)
+            self.set_directory(path)
+            self.add_to_history(path)
+        return pane
+
+    def new_tab(self):
+        self.add_tab(self.tabs_of(self.pane), self.current_path)
+
+    def tabs_of(self, pane):
+        return self.right_tabs if self.right_tabs.indexOf(pane) >= 0 else self.left_tabs
+
+    def update_tab_title(self):
+        tabs = self.tabs_of(self.pane)
+        index = tabs.indexOf(self.pane)
+        tabs.setTabText(index, self.pane.title())
+        tabs.setTabToolTip(index, self.current_path)
+
+    def close_tab(self, tabs=None, index=None):
+        if tabs is None:
+            tabs = self.tabs_of(self.pane)
+            index = tabs.indexOf(self.pane)
+        if tabs.count() == 1:
+            if tabs is self.right_tabs:
+                self.dual_pane_action.setChecked(False)
+            return
+        pane = tabs.widget(index)
+        tabs.removeTab(index)
+        if pane is self.pane:
+            self.activate_pane(tabs.currentWidget())
+        if pane is self.search_pane:
+            self.search.cancel()
+            self.search_pane = None
+        pane.close_pane()
+
+    def toggle_dual_pane(self, checked):
+        self.state.set("dual_pane", checked)
+        if checked:
+            self.right_tabs.show()
+            if self.right_tabs.count() == 0:
+                self.add_tab(self.right_tabs, self.current_path)
+            else:
+                self.activate_pane(self.right_tabs.currentWidget())
+        else:
+            self.right_tabs.hide()
+            self.activate_pane(self.left_tabs.currentWidget())
+
+    def other_pane(self):
+        if not self.right_tabs.isVisible():
+            return None
+        if self.tabs_of(self.pane) is self.right_tabs:
+            return self.left_tabs.currentWidget()
+        return self.right_tabs.currentWidget()
+
+    def transfer_to_other_pane(self, kind):
+        other = self.other_pane()
+        paths = self.selected_paths()
+        if other is None or not paths:
+            return
+        if other.model.results_mode or not (is_remote_path(other.current_path) or os.path.isdir(other.current_path)):
+            QMessageBox.warning(self, "Error", "The other pane is not showing a folder.")
+            return
+        self.submit_job(FileJob(kind, paths, other.current_path))
+
+    def activate_pane(self, pane):
+        if pane is None or pane is self.pane:
+            return
+        if self.pane is not None:
+            self.pane.filter_text = self.filter_edit.text()
+            self.name_filter.cancel()
+            self.filter_generation = 0
+        self.pane = pane
+        self.filter_edit.blockSignals(True)
+        self.filter_edit.setText(pane.filter_text)
+        self.filter_edit.blockSignals(False)
+        self.toggle_hidden_action.blockSignals(True)
+        self.toggle_hidden_action.setChecked(pane.model.show_hidden)
+        self.toggle_hidden_action.blockSignals(False)
+        details = pane.view is pane.details_view
+        self.details_action.setChecked(details)
+        self.icons_action.setChecked(not details)
+        if pane.current_path:
+            self.update_path()
+        self.update_preview()
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.FocusIn and isinstance(watched.parentWidget(), BrowserPane):
+            self.activate_pane(watched.parentWidget())
+        return False
+
+    def show_pane_context_menu(self, pane, position):
+        self.activate_pane(pane)
+        self.show_context_menu(position)
+
+    def set_view_mode(self, details):
+        self.pane.set_details(details)
+        self.state.set("details_view", details)
+        self.details_action.setChecked(details)
+        self.icons_action.setChecked(not details)
+
+    def restore_folder_sort(self, pane):
+        column, order = self.state.get_item("folder_sorts", pane.current_path, (0, Qt.AscendingOrder))
+        header = pane.details_view.horizontalHeader()
+        if (column, order) != (header.sortIndicatorSection(), header.sortIndicatorOrder()):
+            pane.details_view.sortByColumn(column, Qt.SortOrder(order))
+
+    def on_sort_changed(self, pane, column, order):
+        if pane.model.results_mode or not pane.current_path:
+            return
+        value = None if (column, order) == (0, Qt.AscendingOrder) else [column, int(order)]
+        self.state.set_item("folder_sorts", pane.current_path, value, self.saved_folder_sorts)
+
+    def source_index(self, index):
+        return self.pane.source_index(index)
+
+    def update_path(self):
         self.path_edit.setText(self.current_path)
-        self.status_bar.showMessage(f"Files: {self.model.rowCount(index)}")
+        self.update_status()
+
+    def update_status(self):
+        if self.model.name_filter is not None:
+            self.status_bar.showMessage(
+                f"Showing {self.model.entry_count()} of {len(self.model.filter_base)} matching "
+                f"\"{self.model.name_filter.text}\"{' (loading...)' if self.model.loading else ''}")
+        elif self.model.loading:
+            self.status_bar.showMessage(f"Files: {self.model.entry_count()} (loading...)")
+        else:
+            self.status_bar.showMessage(f"Files: {self.model.entry_count()}")
+
+    def on_directory_loaded(self, error, pane):
+        startup_profile.mark("initial listing complete")
+        if pane is not self.pane or self.search_generation:
+            return
+        if error:
+            self.status_bar.showMessage(f"Failed to read {self.current_path}: {error}")
+        else:
+            self.update_path()
+            if self.filter_edit.text():
+                self.apply_filter(self.filter_edit.text())
+
+    def fetch_visible_rows(self, pane):
+        startup_profile.mark("first rows")
+        scroll_bar = pane.view.verticalScrollBar()
+        if scroll_bar.value() >= scroll_bar.maximum() and pane.model.canFetchMore(QModelIndex()):
+            pane.model.fetchMore(QModelIndex())
+        if pane is self.pane and pane.model.loading and not pane.search_generation:
+            self.update_path()
 
     def create_menu(self):
         menubar = self.menuBar()
@@ -384,28 +6906,147 @@ class FileManager(QMainWindow):
         new_folder_action.triggered.connect(self.create_directory)
         file_menu.addAction(new_folder_action)
 
+        file_menu.addSeparator()
+        new_tab_action = QAction(QIcon.fromTheme("tab-new"), "New Tab", self)
+        new_tab_action.setShortcut(QKeySequence.AddTab)
+        new_tab_action.triggered.connect(self.new_tab)
+        file_menu.addAction(new_tab_action)
+
+        close_tab_action = QAction(QIcon.fromTheme("tab-close"), "Close Tab", self)
+        close_tab_action.setShortcut(QKeySequence.Close)
+        close_tab_action.triggered.connect(lambda: self.close_tab())
+        file_menu.addAction(close_tab_action)
+
         file_menu.addSeparator()
         exit_action = QAction(QIcon.fromTheme("application-exit"), "Exit", self)
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
 
         edit_menu = menubar.addMenu("&Edit")
+        cut_action = QAction(QIcon.fromTheme("edit-cut"), "Cut", self)
+        cut_action.setShortcut(QKeySequence.Cut)
+        cut_action.triggered.connect(self.cut_selection)
+        edit_menu.addAction(cut_action)
+
         copy_action = QAction(QIcon.fromTheme("edit-copy"), "Copy", self)
+        copy_action.setShortcut(QKeySequence.Copy)
+        copy_action.triggered.connect(lambda: self.copy_selection())
         edit_menu.addAction(copy_action)
 
         paste_action = QAction(QIcon.fromTheme("edit-paste"), "Paste", self)
+        paste_action.setShortcut(QKeySequence.Paste)
+        paste_action.triggered.connect(self.paste_clipboard)
         edit_menu.addAction(paste_action)
 
         delete_action = QAction(QIcon.fromTheme("edit-delete"), "Delete", self)
-        delete_action.triggered.connect(self.delete_item)
+        delete_action.setShortcut(QKeySequence.Delete)
+        delete_action.triggered.connect(lambda: self.delete_item())
         edit_menu.addAction(delete_action)
 
+        delete_permanently_action = QAction(QIcon.fromTheme("edit-delete"), "Delete Permanently", self)
+        delete_permanently_action.setShortcut(QKeySequence("Shift+Delete"))
+        delete_permanently_action.triggered.connect(lambda: self.delete_item(permanent=True))
+        edit_menu.addAction(delete_permanently_action)
+
+        edit_menu.addSeparator()
+        copy_to_pane_action = QAction(QIcon.fromTheme("edit-copy"), "Copy to Other Pane", self)
+        copy_to_pane_action.setShortcut(QKeySequence("Shift+F5"))
+        copy_to_pane_action.triggered.connect(lambda: self.transfer_to_other_pane("copy"))
+        edit_menu.addAction(copy_to_pane_action)
+
+        move_to_pane_action = QAction(QIcon.fromTheme("go-next"), "Move to Other Pane", self)
+        move_to_pane_action.setShortcut(QKeySequence("Shift+F6"))
+        move_to_pane_action.triggered.connect(lambda: self.transfer_to_other_pane("move"))
+        edit_menu.addAction(move_to_pane_action)
+
+        bulk_rename_action = QAction(QIcon.fromTheme("edit-rename"), "Bulk Rename...", self)
+        bulk_rename_action.setShortcut(QKeySequence("Shift+F2"))
+        bulk_rename_action.triggered.connect(lambda: self.bulk_rename())
+        edit_menu.addAction(bulk_rename_action)
+
+        edit_menu.addSeparator()
+        find_in_files_action = QAction(QIcon.fromTheme("edit-find"), "Find in Files", self)
+        find_in_files_action.setShortcut(QKeySequence("Ctrl+Shift+F"))
+        find_in_files_action.triggered.connect(self.show_find_in_files)
+        edit_menu.addAction(find_in_files_action)
+
+        duplicates_action = QAction(QIcon.fromTheme("edit-copy"), "Find Duplicates", self)
+        duplicates_action.setShortcut(QKeySequence("Ctrl+Shift+D"))
+        duplicates_action.triggered.connect(lambda: self.find_duplicates())
+        edit_menu.addAction(duplicates_action)
+
+        pinned_duplicates_action = QAction(QIcon.fromTheme("edit-copy"), "Find Duplicates in Pinned Folders", self)
+        pinned_duplicates_action.triggered.connect(lambda: self.find_duplicates(pinned=True))
+        edit_menu.addAction(pinned_duplicates_action)
+
+        filter_action = QAction(QIcon.fromTheme("view-filter"), "Filter Folder", self)
+        filter_action.setShortcut(QKeySequence("Ctrl+I"))
+        filter_action.triggered.connect(self.focus_filter)
+        edit_menu.addAction(filter_action)
+
+        edit_menu.addSeparator()
+        pause_jobs_action = QAction(QIcon.fromTheme("media-playback-pause"), "Pause Operations", self)
+        pause_jobs_action.triggered.connect(self.pause_operations)
+        edit_menu.addAction(pause_jobs_action)
+
+        resume_jobs_action = QAction(QIcon.fromTheme("media-playback-start"), "Resume Operations", self)
+        resume_jobs_action.triggered.connect(self.resume_operations)
+        edit_menu.addAction(resume_jobs_action)
+
+        cancel_jobs_action = QAction(QIcon.fromTheme("process-stop"), "Cancel Operations", self)
+        cancel_jobs_action.triggered.connect(self.cancel_operations)
+        edit_menu.addAction(cancel_jobs_action)
+
         view_menu = menubar.addMenu("&View")
         self.toggle_hidden_action = QAction(QIcon.fromTheme("view-hidden"), "Show Hidden", self)
         self.toggle_hidden_action.setCheckable(True)
         self.toggle_hidden_action.toggled.connect(self.toggle_hidden_files)
         view_menu.addAction(self.toggle_hidden_action)
 
+        view_menu.addSeparator()
+        view_mode_group = QActionGroup(self)
+        self.icons_action = QAction(QIcon.fromTheme("view-list-icons"), "Icons", self)
+        self.icons_action.setShortcut(QKeySequence("Ctrl+1"))
+        self.icons_action.setCheckable(True)
+        self.icons_action.setChecked(True)
+        self.icons_action.triggered.connect(lambda: self.set_view_mode(False))
+        view_mode_group.addAction(self.icons_action)
+        view_menu.addAction(self.icons_action)
+        self.details_action = QAction(QIcon.fromTheme("view-list-details"), "Details", self)
+        self.details_action.setShortcut(QKeySequence("Ctrl+2"))
+        self.details_action.setCheckable(True)
+        self.details_action.triggered.connect(lambda: self.set_view_mode(True))
+        view_mode_group.addAction(self.details_action)
+        view_menu.addAction(self.details_action)
+
+        self.dual_pane_action = QAction(QIcon.fromTheme("view-split-left-right"), "Dual Pane", self)
+        self.dual_pane_action.setShortcut(QKeySequence("F3"))
+        self.dual_pane_action.setCheckable(True)
+        self.dual_pane_action.toggled.connect(self.toggle_dual_pane)
+        view_menu.addAction(self.dual_pane_action)
+
+        preview_action = QAction(QIcon.fromTheme("document-preview"), "Preview", self)
+        preview_action.setShortcut(QKeySequence("F11"))
+        preview_action.triggered.connect(self.toggle_preview)
+        view_menu.addAction(preview_action)
+
+        folder_sizes_action = QAction(QIcon.fromTheme("drive-harddisk"), "Folder Sizes", self)
+        folder_sizes_action.setShortcut(QKeySequence("Ctrl+Shift+S"))
+        folder_sizes_action.triggered.connect(self.show_folder_sizes)
+        view_menu.addAction(folder_sizes_action)
+
+        view_menu.addSeparator()
+        perf_action = QAction(QIcon.fromTheme("utilities-system-monitor"), "Performance Monitor", self)
+        perf_action.setShortcut(QKeySequence("Ctrl+Shift+P"))
+        perf_action.triggered.connect(self.show_performance_monitor)
+        view_menu.addAction(perf_action)
+
+        self.trace_action = QAction(QIcon.fromTheme("media-record"), "Record Trace", self)
+        self.trace_action.setCheckable(True)
+        self.trace_action.setChecked(perf.trace_file is not None)
+        self.trace_action.toggled.connect(self.toggle_trace)
+        view_menu.addAction(self.trace_action)
+
         go_menu = menubar.addMenu("&Go")
         back_action = QAction(QIcon.fromTheme("go-previous"), "Back", self)
         back_action.triggered.connect(self.go_back)
@@ -419,6 +7060,15 @@ class FileManager(QMainWindow):
         home_action.triggered.connect(self.go_home)
         go_menu.addAction(home_action)
 
+        trash_action = QAction(QIcon.fromTheme("user-trash"), "Trash", self)
+        trash_action.triggered.connect(self.show_trash)
+        go_menu.addAction(trash_action)
+
+        go_menu.addSeparator()
+        connect_action = QAction(QIcon.fromTheme("network-server"), "Connect to Server...", self)
+        connect_action.triggered.connect(self.connect_to_server)
+        go_menu.addAction(connect_action)
+
         bookmarks_menu = menubar.addMenu("&Bookmarks")
         add_bookmark_action = QAction(QIcon.fromTheme("bookmark-new"), "Add Bookmark", self)
         add_bookmark_action.triggered.connect(self.pin_current_folder)
@@ -433,10 +7083,13 @@ class FileManager(QMainWindow):
         file_name, ok = QInputDialog.getText(self, "Create File", "Enter file name:")
         if ok and file_name:
             file_path = os.path.join(self.current_path, file_name)
+            if is_remote_path(file_path):
+                self.submit_remote("create", file_path)
+                return
             try:
                 with open(file_path, "w") as f:
                     pass
-                self.refresh()
+                self.refresh_if_unwatched()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to create file: {e}")
 
@@ -444,31 +7097,180 @@ class FileManager(QMainWindow):
         dir_name, ok = QInputDialog.getText(self, "Create Directory", "Enter directory name:")
         if ok and dir_name:
             dir_path = os.path.join(self.current_path, dir_name)
+            if is_remote_path(dir_path):
+                self.submit_remote("mkdir", dir_path)
+                return
             try:
                 os.mkdir(dir_path)
-                self.refresh()
+                self.refresh_if_unwatched()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to create directory: {e}")
 
-    def delete_item(self, index=None):
-        if index is None:
-            index = self.list_view.currentIndex()
-        if index.isValid():
-            path = self.model.filePath(index)
-            reply = QMessageBox.question(
-                self, "Delete", f"Are you sure you want to delete {path}?",
-                QMessageBox.Yes | QMessageBox.No
-            )
-            if reply == QMessageBox.Yes:
-                try:
-                    if os.path.isdir(path):
-                        import shutil
-                        shutil.rmtree(path)
-                    else:
-                        os.remove(path)
-                    self.refresh()
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to delete: {e}")
+    def selected_paths(self, index=None):
+        indexes = self.view.selectionModel().selectedRows()
+        if index is not None and index.isValid():
+            index = index.sibling(index.row(), 0)
+            if index not in indexes:
+                indexes = [index]
+        elif not indexes and self.view.currentIndex().isValid():
+            indexes = [self.view.currentIndex()]
+        return [self.model.file_path(self.source_index(selected))
+                for selected in sorted(indexes, key=lambda i: i.row())]
+
+    def delete_item(self, index=None, permanent=False):
+        paths = self.selected_paths(index)
+        if not paths:
+            return
+        if not permanent and not any(is_remote_path(path) for path in paths):
+            with perf.span("ui.trash", paths[0]):
+                self.submit_job(FileJob("trash", paths))
+            return
+        self.delete_permanently(paths)
+
+    def delete_permanently(self, paths, message=None):
+        if message is None and len(paths) == 1:
+            message = f"Are you sure you want to permanently delete {paths[0]}?"
+        elif message is None:
+            message = f"Are you sure you want to permanently delete {len(paths)} items?"
+        reply = QMessageBox.question(self, "Delete", message, QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            with perf.span("ui.delete", paths[0]):
+                self.submit_job(FileJob("delete", paths))
+
+    def create_trash_dock(self):
+        self.trash_dock = QDockWidget("Trash", self)
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(2, 2, 2, 2)
+        controls = QHBoxLayout()
+        self.trash_label = QLabel()
+        controls.addWidget(self.trash_label, 1)
+        restore_button = QPushButton(QIcon.fromTheme("edit-undo"), "Restore")
+        restore_button.clicked.connect(self.restore_trash_items)
+        controls.addWidget(restore_button)
+        purge_button = QPushButton(QIcon.fromTheme("edit-delete"), "Delete Permanently")
+        purge_button.clicked.connect(self.purge_trash_items)
+        controls.addWidget(purge_button)
+        empty_button = QPushButton(QIcon.fromTheme("trash-empty"), "Empty Trash")
+        empty_button.clicked.connect(self.empty_trash)
+        controls.addWidget(empty_button)
+        refresh_button = QPushButton(QIcon.fromTheme("view-refresh"), "Refresh")
+        refresh_button.clicked.connect(self.load_trash)
+        controls.addWidget(refresh_button)
+        layout.addLayout(controls)
+        self.trash_model = TrashModel(self)
+        self.trash_view = QTableView()
+        self.trash_view.setModel(self.trash_model)
+        self.trash_view.setShowGrid(False)
+        self.trash_view.setWordWrap(False)
+        self.trash_view.setSelectionBehavior(QTableView.SelectRows)
+        self.trash_view.verticalHeader().hide()
+        self.trash_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.trash_view.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
+        self.trash_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.trash_view.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.trash_view)
+        self.trash_dock.setWidget(widget)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.trash_dock)
+        self.trash_dock.hide()
+
+    def show_trash(self):
+        if self.trash_dock is None:
+            self.create_trash_dock()
+        self.trash_dock.show()
+        self.load_trash()
+
+    def load_trash(self):
+        self.trash_label.setText("Loading trash...")
+        self.trash_generation = self.trash.load()
+
+    def on_trash_items(self, generation, items):
+        if generation != self.trash_generation or self.trash_dock is None:
+            return
+        self.trash_model.set_items(items)
+        self.trash_label.setText(f"{len(items)} items in trash")
+
+    def selected_trash_items(self):
+        rows = sorted(index.row() for index in self.trash_view.selectionModel().selectedRows())
+        return [self.trash_model.items[row] for row in rows]
+
+    def restore_trash_items(self):
+        items = self.selected_trash_items()
+        if items:
+            self.submit_job(FileJob("restore", [os.path.join(trash, "files", name) for trash, name, path, deleted in items],
+                                    targets=[path for trash, name, path, deleted in items]))
+
+    def purge_trash_items(self, items=None):
+        items = self.selected_trash_items() if items is None else items
+        if not items:
+            return
+        if len(items) == 1:
+            message = f"Are you sure you want to permanently delete {items[0][2]}?"
+        else:
+            message = f"Are you sure you want to permanently delete {len(items)} items?"
+        reply = QMessageBox.question(self, "Delete Permanently", message, QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.submit_job(FileJob("purge", [os.path.join(trash, "files", name) for trash, name, path, deleted in items]))
+
+    def empty_trash(self):
+        self.purge_trash_items(self.trash_model.items)
+
+    def copy_selection(self, cut=False):
+        paths = self.selected_paths()
+        if not paths:
+            return
+        urls = [path_to_url(path) for path in paths]
+        mime_data = QMimeData()
+        mime_data.setUrls(urls)
+        operation = "cut" if cut else "copy"
+        mime_data.setData("x-special/gnome-copied-files",
+                          "\n".join([operation] + [url.toString() for url in urls]).encode())
+        mime_data.setData("application/x-kde-cutselection", b"1" if cut else b"0")
+        QApplication.clipboard().setMimeData(mime_data)
+        verb = "Cut" if cut else "Copied"
+        self.status_bar.showMessage(f"{verb} {len(paths)} item{'s' if len(paths) != 1 else ''}")
+
+    def cut_selection(self):
+        self.copy_selection(cut=True)
+
+    def paste_clipboard(self):
+        mime_data = QApplication.clipboard().mimeData()
+        if mime_data is None or not mime_data.hasUrls():
+            return
+        sources = [path for path in map(url_to_path, mime_data.urls()) if path]
+        if not sources:
+            return
+        cut = bytes(mime_data.data("application/x-kde-cutselection")) == b"1" or \
+            bytes(mime_data.data("x-special/gnome-copied-files")).startswith(b"cut")
+        self.submit_job(FileJob("move" if cut else "copy", sources, self.current_path))
+        if cut:
+            QApplication.clipboard().clear()
+
+    def on_job_conflicts(self, job):
+        if job not in self.owned_jobs:
+            return
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Question)
+        box.setWindowTitle("File Conflict")
+        count = len(job.conflicts)
+        box.setText(f"{count} item{'s' if count != 1 else ''} already exist{'s' if count == 1 else ''} "
+                    f"in {job.destination}.")
+        box.setDetailedText("\n".join(job.conflicts[:1000]))
+        skip_button = box.addButton("Skip", QMessageBox.AcceptRole)
+        keep_button = box.addButton("Keep Both", QMessageBox.AcceptRole)
+        overwrite_button = box.addButton("Overwrite", QMessageBox.DestructiveRole)
+        box.addButton(QMessageBox.Cancel)
+        box.setDefaultButton(skip_button)
+        box.exec_()
+        clicked = box.clickedButton()
+        if clicked is skip_button:
+            job.resolve_conflicts("skip")
+        elif clicked is keep_button:
+            job.resolve_conflicts("rename")
+        elif clicked is overwrite_button:
+            job.resolve_conflicts("overwrite")
+        else:
+            job.cancel()
 
     def go_back(self):
         if self.history_index > 0:
@@ -481,77 +7283,126 @@ class FileManager(QMainWindow):
             self.navigate_to_history()
 
     def go_home(self):
-        index = self.model.index(QDir.homePath())
-        self.list_view.setRootIndex(index)
+        self.set_directory(QDir.homePath())
         self.add_to_history(QDir.homePath())
-        self.update_path(index)
 
     def refresh(self):
-        index = self.model.index(self.current_path)
-        self.list_view.setRootIndex(index)
-        self.update_path(index)
+        if self.search_generation:
+            self.start_search()
+            return
+        with perf.span("directory.refresh", self.current_path):
+            self.model.set_root_path(self.current_path, use_cache=False)
+        self.update_path()
+
+    def refresh_if_unwatched(self):
+        if not self.model.is_watched():
+            self.refresh()
+
+    def on_model_rows_changed(self, pane):
+        if pane is self.pane and not pane.model.loading and not pane.search_generation:
+            self.update_status()
 
     def add_to_history(self, path):
         if self.history_index < len(self.history) - 1:
             self.history = self.history[:self.history_index + 1]
         self.history.append(path)
         self.history_index = len(self.history) - 1
+        self.state.set("history", self.history[-self.saved_history:])
+        self.prefetch_neighbours()
+
+    def prefetch_neighbours(self):
+        paths = list(self.pinned_folders)
+        paths.append(os.path.dirname(self.current_path))
+        for offset in (1, -1):
+            position = self.history_index + offset
+            if 0 <= position < len(self.history):
+                paths.append(self.history[position])
+        self.prefetcher.prefetch(path for path in paths
+                                 if path != self.current_path and path not in self.unresponsive_paths)
+
+    def on_item_hovered(self, index):
+        index = self.source_index(index)
+        if not self.model.results_mode and self.model.is_dir(index):
+            self.prefetcher.prefetch([self.model.file_path(index)])
 
     def navigate_to_history(self):
         if 0 <= self.history_index < len(self.history):
             path = self.history[self.history_index]
-            index = self.model.index(path)
-            self.list_view.setRootIndex(index)
-            self.path_edit.setText(path)
-            self.current_path = path
+            self.set_directory(path)
+            self.prefetch_neighbours()
 
     def toggle_hidden_files(self, checked):
-        if checked:
-            self.model.setFilter(QDir.AllEntries | QDir.NoDotAndDotDot | QDir.Hidden)
-        else:
-            self.model.setFilter(QDir.AllEntries | QDir.NoDotAndDotDot)
-        self.refresh()
+        self.model.set_show_hidden(checked)
+        self.state.set("show_hidden", checked)
+        self.update_path()
+        if self.filter_edit.text():
+            self.apply_filter(self.filter_edit.text())
 
     def show_context_menu(self, position):
-        index = self.list_view.indexAt(position)
+        index = self.view.indexAt(position)
         menu = QMenu()
 
         if index.isValid():
-            path = self.model.filePath(index)
-            if os.path.isdir(path):
+            path = self.model.file_path(self.source_index(index))
+            if self.model.is_dir(self.source_index(index)):
                 open_action = menu.addAction(QIcon.fromTheme("folder-open"), "Open")
                 open_with_action = menu.addAction(QIcon.fromTheme("system-run"), "Open With...")
+                cut_action = menu.addAction(QIcon.fromTheme("edit-cut"), "Cut")
+                copy_action = menu.addAction(QIcon.fromTheme("edit-copy"), "Copy")
                 rename_action = menu.addAction(QIcon.fromTheme("edit-rename"), "Rename")
                 delete_action = menu.addAction(QIcon.fromTheme("edit-delete"), "Delete")
                 pin_action = menu.addAction(QIcon.fromTheme("bookmark-new"), "Pin")
 
                 open_action.triggered.connect(lambda: self.on_item_double_clicked(index))
                 open_with_action.triggered.connect(lambda: self.open_with(path))
+                cut_action.triggered.connect(self.cut_selection)
+                copy_action.triggered.connect(lambda: self.copy_selection())
                 rename_action.triggered.connect(lambda: self.rename_item(index))
                 delete_action.triggered.connect(lambda: self.delete_item(index))
                 pin_action.triggered.connect(lambda: self.pin_folder(path))
             else:
                 open_action = menu.addAction(QIcon.fromTheme("document-open"), "Open")
                 open_with_action = menu.addAction(QIcon.fromTheme("system-run"), "Open With...")
+                cut_action = menu.addAction(QIcon.fromTheme("edit-cut"), "Cut")
+                copy_action = menu.addAction(QIcon.fromTheme("edit-copy"), "Copy")
                 rename_action = menu.addAction(QIcon.fromTheme("edit-rename"), "Rename")
                 delete_action = menu.addAction(QIcon.fromTheme("edit-delete"), "Delete")
 
                 open_action.triggered.connect(lambda: self.open_file(path))
                 open_with_action.triggered.connect(lambda: self.open_with(path))
+                cut_action.triggered.connect(self.cut_selection)
+                copy_action.triggered.connect(lambda: self.copy_selection())
                 rename_action.triggered.connect(lambda: self.rename_item(index))
                 delete_action.triggered.connect(lambda: self.delete_item(index))
         else:
             create_file_action = menu.addAction(QIcon.fromTheme("document-new"), "Create File")
             create_dir_action = menu.addAction(QIcon.fromTheme("folder-new"), "Create Directory")
+            paste_action = menu.addAction(QIcon.fromTheme("edit-paste"), "Paste")
             open_terminal_action = menu.addAction(QIcon.fromTheme("utilities-terminal"), "Open Terminal Here")
 
+            paste_action.setEnabled(QApplication.clipboard().mimeData().hasUrls())
+            paste_action.triggered.connect(self.paste_clipboard)
             create_file_action.triggered.connect(self.create_file)
             create_dir_action.triggered.connect(self.create_directory)
             open_terminal_action.triggered.connect(self.open_terminal)
 
-        menu.exec_(self.list_view.mapToGlobal(position))
+        if index.isValid():
+            bulk_rename_action = menu.addAction(QIcon.fromTheme("edit-rename"), "Bulk Rename...")
+            bulk_rename_action.triggered.connect(lambda: self.bulk_rename(index))
+
+        if index.isValid() and self.other_pane() is not None:
+            menu.addSeparator()
+            copy_to_pane_action = menu.addAction(QIcon.fromTheme("edit-copy"), "Copy to Other Pane")
+            move_to_pane_action = menu.addAction(QIcon.fromTheme("go-next"), "Move to Other Pane")
+            copy_to_pane_action.triggered.connect(lambda: self.transfer_to_other_pane("copy"))
+            move_to_pane_action.triggered.connect(lambda: self.transfer_to_other_pane("move"))
+
+        menu.exec_(self.view.mapToGlobal(position))
 
     def open_terminal(self):
+        import subprocess
+        if self.refuse_remote("Open Terminal Here"):
+            return
         try:
             if sys.platform == "win32":
                 subprocess.Popen(["start", "cmd"], shell=True, cwd=self.current_path)
@@ -583,24 +7434,46 @@ class FileManager(QMainWindow):
     def open_with(self, path):
         program, ok = QInputDialog.getText(self, "Open With", "Enter the program to open the file:")
         if ok and program:
+            import subprocess
             try:
                 subprocess.Popen([program, path])
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to open file: {e}")
 
     def rename_item(self, index):
-        old_path = self.model.filePath(index)
+        old_path = self.model.file_path(self.source_index(index))
         new_name, ok = QInputDialog.getText(
             self, "Rename", "Enter new name:", text=os.path.basename(old_path)
         )
         if ok and new_name:
             new_path = os.path.join(os.path.dirname(old_path), new_name)
+            if is_remote_path(old_path):
+                self.submit_remote("rename", old_path, new_path)
+                return
             try:
-                os.rename(old_path, new_path)
-                self.refresh()
+                with perf.span("ui.rename", old_path):
+                    os.rename(old_path, new_path)
+                    self.refresh_if_unwatched()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"Failed to rename: {e}")
 
+    def bulk_rename(self, index=None):
+        paths = self.selected_paths(index)
+        if not paths or self.refuse_remote("Bulk rename"):
+            return
+        dialog = BulkRenameDialog(paths, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        renames = dialog.renames()
+        if not renames:
+            return
+        job = FileJob("rename", [source for source, target in renames], targets=[target for source, target in renames])
+        self.held_paths[job] = {os.path.dirname(source) for source, target in renames}
+        for path in self.held_paths[job]:
+            self.watcher.hold(path)
+        with perf.span("ui.bulk_rename", str(len(renames))):
+            self.submit_job(job)
+
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
@@ -609,21 +7482,81 @@ class FileManager(QMainWindow):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
 
-    def dropEvent(self, event):
+    def dropEvent(self, event, pane=None):
         if event.mimeData().hasUrls():
-            for url in event.mimeData().urls():
-                file_path = url.toLocalFile()
-                destination = os.path.join(self.current_path, os.path.basename(file_path))
-                try:
-                    if os.path.exists(file_path):
-                        if os.path.isdir(file_path):
-                            import shutil
-                            shutil.move(file_path, destination)
-                        else:
-                            os.rename(file_path, destination)
-                    self.refresh()
-                except Exception as e:
-                    QMessageBox.critical(self, "Error", f"Failed to move file: {e}")
+            target = (pane or self.pane).current_path
+            with perf.span("ui.drop", target):
+                sources = [url_to_path(url) for url in event.mimeData().urls()]
+                sources = [path for path in sources if path and (is_remote_path(path) or os.path.exists(path))]
+                if sources:
+                    self.submit_job(FileJob("move", sources, target))
+            event.acceptProposedAction()
+
+    def pause_operations(self):
+        self.file_ops.pause_all()
+        if self.file_ops.active_job is not None:
+            self.on_job_progress(self.file_ops.active_job)
+
+    def resume_operations(self):
+        self.file_ops.resume_all()
+        if self.file_ops.active_job is not None:
+            self.on_job_progress(self.file_ops.active_job)
+
+    def cancel_operations(self):
+        self.file_ops.cancel_all()
+
+    def submit_job(self, job):
+        self.owned_jobs.add(job)
+        return self.file_ops.submit(job)
+
+    def on_job_progress(self, job):
+        if job.bytes_total:
+            self.job_progress_bar.setValue(int(job.bytes_done * 1000 / job.bytes_total))
+        elif job.files_total:
+            self.job_progress_bar.setValue(int(job.files_done * 1000 / job.files_total))
+        else:
+            self.job_progress_bar.setValue(0)
+        self.job_progress_bar.show()
+        message = job.describe()
+        if job.paused:
+            message += " (paused)"
+        self.status_bar.showMessage(message)
+
+    def on_job_finished(self, job):
+        if not self.file_ops.is_busy():
+            self.job_progress_bar.hide()
+        if job.kind in self.trash.kinds and self.trash_dock is not None and self.trash_dock.isVisible():
+            self.load_trash()
+        if job not in self.owned_jobs:
+            self.refresh_if_unwatched()
+            return
+        self.owned_jobs.discard(job)
+        for path in self.held_paths.pop(job, ()):
+            self.watcher.release(path)
+        opened = self.remote_opens.pop(job, None)
+        if opened is not None and not job.error and not job.cancelled:
+            self.open_file(opened)
+        self.refresh_if_unwatched()
+        if not self.search_generation:
+            self.update_status()
+        if job.error:
+            QMessageBox.critical(self, "Error", f"{FileJob.verbs[job.kind]} failed: {job.error}")
+        elif job.cancelled:
+            self.status_bar.showMessage(f"{FileJob.verbs[job.kind]} cancelled")
+        elif job.skipped:
+            self.status_bar.showMessage(f"{FileJob.verbs[job.kind]} finished, {job.skipped} items skipped")
+        if job.kind == "link" and job.failed:
+            QMessageBox.warning(self, "Hardlink Duplicates",
+                                f"{len(job.failed)} files could not be linked:\n" + "\n".join(job.failed[:20]))
+        elif job.kind == "link" and not job.error and not job.cancelled:
+            self.status_bar.showMessage(f"Replaced {job.files_done} duplicates with hardlinks, "
+                                        f"{format_size(job.bytes_done)} reclaimed")
+        if job.kind == "trash" and job.keys is not None and job.skipped:
+            QMessageBox.warning(self, "Delete Duplicates", f"{job.skipped} duplicates were kept because they or "
+                                                           "their remaining copy changed since the scan.")
+        if job.kind == "trash" and job.failed and not job.error and not job.cancelled:
+            self.delete_permanently(job.failed, f"{len(job.failed)} items cannot be moved to the trash. "
+                                                "Delete them permanently?")
 
     def show_about_dialog(self):
         about_text = """
@@ -637,8 +7570,39 @@ class FileManager(QMainWindow):
 
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    if "--profile-startup" in sys.argv:
+        sys.argv.remove("--profile-startup")
+        startup_profile.enable()
+    stall_threshold = 200
+    if "--stall-threshold" in sys.argv[:-1]:
+        position = sys.argv.index("--stall-threshold")
+        stall_threshold = int(sys.argv[position + 1])
+        del sys.argv[position:position + 2]
+    if "--trace" in sys.argv[:-1]:
+        position = sys.argv.index("--trace")
+        perf.start_trace(sys.argv[position + 1])
+        del sys.argv[position:position + 2]
+    daemon = "--daemon" in sys.argv
+    single_instance = "--new-instance" not in sys.argv
+    paths = [arg if is_remote_path(arg) else os.path.abspath(arg) for arg in sys.argv[1:] if not arg.startswith("-")]
+    socket_path = InstanceServer.socket_path()
+    if single_instance and InstanceServer.send(socket_path, paths):
+        sys.exit(0)
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
-    file_manager = FileManager()
-    file_manager.show()
+    app.setQuitOnLastWindowClosed(not daemon)
+    startup_profile.mark("QApplication")
+    if stall_threshold > 0:
+        watchdog.start(stall_threshold / 1000)
+    services = SharedServices(daemon)
+    app.aboutToQuit.connect(services.shutdown)
+    if single_instance:
+        instance_server = InstanceServer(services, socket_path)
+        instance_server.listen()
+    if paths or not daemon:
+        for path in paths or [None]:
+            services.open_window(path)
+    startup_profile.mark("window shown")
     sys.exit(app.exec_())
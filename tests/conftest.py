@@ -0,0 +1,28 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import Qt
+
+
+@pytest.fixture
+def run_job():
+    def run(queue, job, timeout=60):
+        finished = threading.Event()
+
+        def on_finished(done):
+            if done is job:
+                finished.set()
+
+        queue.job_finished.connect(on_finished, Qt.DirectConnection)
+        try:
+            queue.submit(job)
+            assert finished.wait(timeout), f"{job.kind} job did not finish"
+        finally:
+            queue.job_finished.disconnect(on_finished)
+        return job
+    return run
@@ -0,0 +1,88 @@
+import errno
+import os
+
+import pytest
+from PyQt5.QtCore import Qt
+
+from main import FileJob, FileOperationQueue
+
+
+@pytest.fixture
+def queue():
+    return FileOperationQueue()
+
+
+def make_sources(root, count):
+    os.makedirs(root / "src")
+    os.makedirs(root / "out")
+    paths = []
+    for i in range(count):
+        path = root / "src" / f"file{i}.txt"
+        path.write_bytes(b"x" * (i + 1))
+        paths.append(str(path))
+    return paths
+
+
+def test_batch_is_planned_once_with_totals(tmp_path, queue, run_job):
+    paths = make_sources(tmp_path, 20)
+    job = run_job(queue, FileJob("copy", paths + [str(tmp_path / "src" / "gone")], str(tmp_path / "out")))
+    assert job.error is None
+    assert job.skipped == 1
+    assert job.files_total == job.files_done == 20
+    assert job.bytes_total == job.bytes_done == sum(range(1, 21))
+    assert sorted(os.listdir(tmp_path / "out")) == sorted(os.path.basename(path) for path in paths)
+
+
+def test_conflicts_are_resolved_with_one_prompt(tmp_path, queue, run_job):
+    paths = make_sources(tmp_path, 5)
+    for path in paths[:3]:
+        (tmp_path / "out" / os.path.basename(path)).write_bytes(b"old")
+    prompts = []
+
+    def on_conflicts(job):
+        prompts.append(list(job.conflicts))
+        job.resolve_conflicts("skip")
+
+    queue.job_conflicts.connect(on_conflicts, Qt.DirectConnection)
+    job = run_job(queue, FileJob("copy", paths, str(tmp_path / "out")))
+    assert len(prompts) == 1 and len(prompts[0]) == 3
+    assert job.skipped == 3 and job.files_done == 2
+    assert (tmp_path / "out" / "file0.txt").read_bytes() == b"old"
+    assert (tmp_path / "out" / "file4.txt").read_bytes() == b"x" * 5
+
+
+def test_copy_into_the_same_folder_keeps_both(tmp_path, queue, run_job):
+    paths = make_sources(tmp_path, 1)
+    job = run_job(queue, FileJob("copy", paths, str(tmp_path / "src")))
+    assert job.error is None and not job.conflicts
+    assert sorted(os.listdir(tmp_path / "src")) == ["file0 (2).txt", "file0.txt"]
+
+
+def test_folder_cannot_go_into_itself(tmp_path, queue, run_job):
+    paths = make_sources(tmp_path, 1)
+    job = run_job(queue, FileJob("move", paths, str(tmp_path / "src")))
+    assert job.skipped == 1 and job.error is None
+    os.mkdir(tmp_path / "src" / "inner")
+    job = run_job(queue, FileJob("move", [str(tmp_path / "src")], str(tmp_path / "src" / "inner")))
+    assert "into itself" in job.error
+    assert (tmp_path / "src" / "file0.txt").exists()
+
+
+def test_move_renames_first_and_copies_across_devices(tmp_path, queue, run_job, monkeypatch):
+    paths = make_sources(tmp_path, 4)
+    renames = []
+    rename = os.rename
+
+    def cross_device(source, target):
+        renames.append(os.path.basename(source))
+        if source == paths[1]:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        rename(source, target)
+
+    monkeypatch.setattr(os, "rename", cross_device)
+    job = run_job(queue, FileJob("move", paths, str(tmp_path / "out")))
+    assert job.error is None
+    assert renames == ["file0.txt", "file1.txt", "file2.txt", "file3.txt"]
+    assert os.listdir(tmp_path / "src") == []
+    assert (tmp_path / "out" / "file1.txt").read_bytes() == b"xx"
+    assert job.files_done == 4
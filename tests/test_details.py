@@ -0,0 +1,126 @@
+import os
+import sys
+import random
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication, QAbstractListModel, QModelIndex, Qt, pyqtSignal
+
+from main import DetailsProxyModel, RowSlots, natural_key
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+class ListingModel(QAbstractListModel):
+    rows_pending = pyqtSignal()
+    loading_finished = pyqtSignal(str)
+    stats_loaded = pyqtSignal(bool)
+
+    def __init__(self, entries):
+        super().__init__()
+        self.root_path = "/listing"
+        self.loading = False
+        self.names = [name for name, is_dir, size in entries]
+        self.modes = array("L", [0o040755 if is_dir else 0o100644 for name, is_dir, size in entries])
+        self.sizes = array("q", [size for name, is_dir, size in entries])
+        self.mtimes = array("d", [float(size % 7) for name, is_dir, size in entries])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        return self.names[index.row()] if role == Qt.DisplayRole else None
+
+    def fetch_all(self):
+        pass
+
+    def request_stats(self):
+        pass
+
+    def ensure_stat(self, row):
+        pass
+
+    def append(self, entries):
+        first = len(self.names)
+        self.beginInsertRows(QModelIndex(), first, first + len(entries) - 1)
+        for name, is_dir, size in entries:
+            self.names.append(name)
+            self.modes.append(0o040755 if is_dir else 0o100644)
+            self.sizes.append(size)
+            self.mtimes.append(float(size % 7))
+        self.endInsertRows()
+
+    def remove(self, first, last):
+        self.beginRemoveRows(QModelIndex(), first, last)
+        for values in (self.names, self.modes, self.sizes, self.mtimes):
+            del values[first:last + 1]
+        self.endRemoveRows()
+
+    def resize(self, row, size):
+        self.sizes[row] = size
+        self.dataChanged.emit(self.index(row), self.index(row))
+
+
+def entries(count, start=0):
+    return [(f"entry{i}", i % 5 == 0, (i * 7919) % 1000) for i in range(start, start + count)]
+
+
+def expected(source, column, descending):
+    names = [natural_key(name) for name in source.names]
+    if column == 0:
+        rows = sorted(range(len(names)), key=names.__getitem__, reverse=descending)
+    else:
+        sign = -1 if descending else 1
+        rows = sorted(range(len(names)), key=lambda row: (sign * source.sizes[row], names[row]))
+    return [source.names[row] for row in sorted(rows, key=lambda row: source.modes[row] & 0o170000 != 0o040000)]
+
+
+def check(proxy, source, column, descending):
+    shown = [source.names[proxy.source_row(position)] for position in range(proxy.rowCount())]
+    assert shown == expected(source, column, descending)
+    for position in range(proxy.rowCount()):
+        assert proxy.mapFromSource(proxy.mapToSource(proxy.index(position))).row() == position
+
+
+def test_row_slots_track_removed_rows():
+    slots = RowSlots()
+    slots.reset(10)
+    slots.remove([2, 3, 7])
+    assert [slots.row(slot) for slot in slots.live()] == list(range(7))
+    assert [slots.slot(row) for row in range(7)] == [0, 1, 4, 5, 6, 8, 9]
+    assert list(slots.append(3)) == [10, 11, 12]
+    assert [slots.slot(row) for row in range(7, 10)] == [10, 11, 12]
+
+
+def test_incremental_updates_keep_the_order():
+    random.seed(15)
+    for column, descending in ((0, False), (1, False), (1, True)):
+        source = ListingModel(entries(500))
+        proxy = DetailsProxyModel()
+        proxy.sort(column, Qt.DescendingOrder if descending else Qt.AscendingOrder)
+        proxy.setSourceModel(source)
+        check(proxy, source, column, descending)
+        added = 500
+        for step in range(300):
+            action = random.random()
+            if action < 0.35:
+                count = random.choice((1, 2, 3, 80))
+                source.append(entries(count, added))
+                added += count
+            elif action < 0.7 and len(source.names) > 100:
+                first = random.randrange(len(source.names) - 5)
+                source.remove(first, first + random.choice((0, 0, 2, 4)))
+            elif column == 1:
+                source.resize(random.randrange(len(source.names)), random.randrange(1000))
+            if step % 25 == 0:
+                check(proxy, source, column, descending)
+        check(proxy, source, column, descending)
+        source.remove(0, 99)
+        check(proxy, source, column, descending)
+        while len(source.names) > 60:
+            source.remove(len(source.names) // 2, len(source.names) // 2)
+        assert proxy.slots.dead <= len(source.names)
+        check(proxy, source, column, descending)
+        proxy.sort(0, Qt.AscendingOrder)
+        check(proxy, source, 0, False)
@@ -0,0 +1,152 @@
+import errno
+import os
+import stat
+
+import pytest
+
+import main
+from main import FileJob, FileOperationQueue, fast_copy
+
+
+@pytest.fixture
+def queue():
+    return FileOperationQueue()
+
+
+@pytest.fixture
+def copy_methods(monkeypatch):
+    calls = []
+    functions = dict(main._copy_functions)
+
+    def failing(method, error, written=b""):
+        def copy(src, dst, size, buffer_size, on_progress):
+            calls.append(method)
+            if written:
+                os.write(dst, written)
+            raise OSError(error, f"{method} failed")
+        return copy
+
+    def recording(method):
+        def copy(*args):
+            calls.append(method)
+            return functions[method](*args)
+        return copy
+
+    monkeypatch.setattr(main, "_unsupported_copy_methods", set())
+    monkeypatch.setattr(main, "_copy_method_available", lambda method: True)
+    monkeypatch.setattr(main, "_copy_functions", {method: recording(method) for method in functions})
+    return calls, failing
+
+
+def make_tree(root):
+    os.makedirs(root / "tree" / "sub")
+    (root / "tree" / "a.txt").write_bytes(b"alpha")
+    (root / "tree" / "sub" / "b.bin").write_bytes(os.urandom(300000))
+    os.chmod(root / "tree" / "a.txt", 0o640)
+    os.utime(root / "tree" / "a.txt", ns=(1_000_000_000, 1_500_000_000))
+    os.symlink("a.txt", root / "tree" / "link")
+    return root / "tree"
+
+
+def test_fast_copy_falls_back_in_order_and_remembers(tmp_path, copy_methods):
+    calls, failing = copy_methods
+    main._copy_functions["reflink"] = failing("reflink", errno.EOPNOTSUPP)
+    main._copy_functions["copy_file_range"] = failing("copy_file_range", errno.EXDEV)
+    source = tmp_path / "source"
+    source.write_bytes(b"x" * 100000)
+    assert fast_copy(str(source), str(tmp_path / "one")) == "sendfile"
+    assert calls == ["reflink", "copy_file_range", "sendfile"]
+    assert (tmp_path / "one").read_bytes() == source.read_bytes()
+    calls.clear()
+    assert fast_copy(str(source), str(tmp_path / "two")) == "sendfile"
+    assert calls == ["sendfile"]
+
+
+def test_fast_copy_does_not_fall_back_after_writing(tmp_path, copy_methods):
+    calls, failing = copy_methods
+    main._copy_functions["reflink"] = failing("reflink", errno.EINVAL, written=b"partial")
+    source = tmp_path / "source"
+    source.write_bytes(b"x" * 1000)
+    with pytest.raises(OSError):
+        fast_copy(str(source), str(tmp_path / "target"))
+    assert calls == ["reflink"]
+
+
+def test_fast_copy_reports_hard_errors(tmp_path, copy_methods):
+    calls, failing = copy_methods
+    main._copy_functions["reflink"] = failing("reflink", errno.ENOSPC)
+    source = tmp_path / "source"
+    source.write_bytes(b"x" * 1000)
+    with pytest.raises(OSError) as error:
+        fast_copy(str(source), str(tmp_path / "target"))
+    assert error.value.errno == errno.ENOSPC
+
+
+def test_copy_job_copies_tree_with_metadata(tmp_path, queue, run_job):
+    tree = make_tree(tmp_path)
+    os.mkdir(tmp_path / "out")
+    job = run_job(queue, FileJob("copy", [str(tree)], str(tmp_path / "out")))
+    assert job.error is None
+    copied = tmp_path / "out" / "tree"
+    assert (copied / "sub" / "b.bin").read_bytes() == (tree / "sub" / "b.bin").read_bytes()
+    assert os.readlink(copied / "link") == "a.txt"
+    assert stat.S_IMODE(os.stat(copied / "a.txt").st_mode) == 0o640
+    assert os.stat(copied / "a.txt").st_mtime_ns == 1_500_000_000
+    assert job.files_done == job.files_total == 5
+
+
+def test_failed_copy_removes_the_partial_file(tmp_path, queue, run_job, monkeypatch):
+    tree = make_tree(tmp_path)
+    os.mkdir(tmp_path / "out")
+
+    def full_disk(source, target, on_progress=None, buffer_size=0):
+        with open(target, "wb") as f:
+            f.write(b"partial")
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(main, "fast_copy", full_disk)
+    job = run_job(queue, FileJob("copy", [str(tree / "a.txt")], str(tmp_path / "out")))
+    assert "No space left" in job.error
+    assert os.listdir(tmp_path / "out") == []
+
+
+def test_cancelled_copy_removes_the_partial_file(tmp_path, queue, run_job, monkeypatch):
+    tree = make_tree(tmp_path)
+    os.mkdir(tmp_path / "out")
+    job = FileJob("copy", [str(tree / "sub" / "b.bin")], str(tmp_path / "out"))
+    monkeypatch.setattr(queue, "buffer_size", 4096)
+    real_copy = main.fast_copy
+
+    def cancel_midway(source, target, on_progress=None, buffer_size=0):
+        def progress(count):
+            job.cancel()
+            on_progress(count)
+        return real_copy(source, target, progress, buffer_size, methods=("readinto",))
+
+    monkeypatch.setattr(main, "fast_copy", cancel_midway)
+    run_job(queue, job)
+    assert job.cancelled and job.error is None
+    assert os.listdir(tmp_path / "out") == []
+
+
+def test_move_and_delete_jobs(tmp_path, queue, run_job):
+    tree = make_tree(tmp_path)
+    os.mkdir(tmp_path / "out")
+    job = run_job(queue, FileJob("move", [str(tree)], str(tmp_path / "out")))
+    assert job.error is None and not tree.exists()
+    assert (tmp_path / "out" / "tree" / "a.txt").read_bytes() == b"alpha"
+    job = run_job(queue, FileJob("delete", [str(tmp_path / "out" / "tree"), str(tmp_path / "missing")]))
+    assert job.error is None and job.skipped == 1
+    assert os.listdir(tmp_path / "out") == []
+
+
+def test_conflicts_follow_the_policy(tmp_path, queue, run_job):
+    tree = make_tree(tmp_path)
+    os.mkdir(tmp_path / "out")
+    (tmp_path / "out" / "a.txt").write_bytes(b"existing")
+    job = run_job(queue, FileJob("copy", [str(tree / "a.txt")], str(tmp_path / "out"), conflict_policy="skip"))
+    assert job.skipped == 1 and (tmp_path / "out" / "a.txt").read_bytes() == b"existing"
+    job = run_job(queue, FileJob("copy", [str(tree / "a.txt")], str(tmp_path / "out"), conflict_policy="rename"))
+    assert (tmp_path / "out" / "a (2).txt").read_bytes() == b"alpha"
+    job = run_job(queue, FileJob("copy", [str(tree / "a.txt")], str(tmp_path / "out"), conflict_policy="overwrite"))
+    assert (tmp_path / "out" / "a.txt").read_bytes() == b"alpha"
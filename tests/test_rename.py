@@ -0,0 +1,94 @@
+import os
+import threading
+
+import pytest
+
+from main import FileJob, FileOperationQueue, RenamePattern, plan_renames
+
+
+@pytest.fixture
+def queue():
+    return FileOperationQueue()
+
+
+def make_files(root, contents):
+    paths = []
+    for name, data in contents.items():
+        path = root / name
+        path.write_text(data)
+        paths.append(str(path))
+    return paths
+
+
+def read_all(root):
+    return {name: (root / name).read_text() for name in os.listdir(root)}
+
+
+def rename(queue, run_job, root, pairs):
+    sources = [str(root / source) for source, target in pairs]
+    targets = [str(root / target) for source, target in pairs]
+    return run_job(queue, FileJob("rename", sources, targets=targets))
+
+
+def test_chain_is_renamed_in_order(tmp_path, queue, run_job):
+    make_files(tmp_path, {"a": "A", "b": "B", "c": "C"})
+    job = rename(queue, run_job, tmp_path, [("a", "b"), ("b", "c"), ("c", "d")])
+    assert job.error is None
+    assert job.files_done == 3
+    assert read_all(tmp_path) == {"b": "A", "c": "B", "d": "C"}
+
+
+def test_cycles_are_broken_through_a_temporary_name(tmp_path, queue, run_job):
+    make_files(tmp_path, {"a": "A", "b": "B", "x": "X", "y": "Y", "z": "Z"})
+    job = rename(queue, run_job, tmp_path, [("a", "b"), ("b", "a"), ("x", "y"), ("y", "z"), ("z", "x")])
+    assert job.error is None
+    assert job.files_done == 5
+    assert read_all(tmp_path) == {"a": "B", "b": "A", "x": "Z", "y": "X", "z": "Y"}
+
+
+def test_existing_target_aborts_before_renaming(tmp_path, queue, run_job):
+    make_files(tmp_path, {"a": "A", "b": "B", "taken": "T"})
+    job = rename(queue, run_job, tmp_path, [("a", "b"), ("b", "taken")])
+    assert "already exists" in job.error
+    assert read_all(tmp_path) == {"a": "A", "b": "B", "taken": "T"}
+
+
+def statuses(paths, pattern):
+    return [(os.path.basename(path), name, status) for path, name, status in plan_renames(paths, pattern, threading.Event(), {})]
+
+
+def test_plan_reports_each_status(tmp_path):
+    paths = make_files(tmp_path, {"one.txt": "", "two.txt": "", "keep.md": "", "three.txt": ""})
+    (tmp_path / "three.log").write_text("")
+    assert statuses(paths, RenamePattern(".txt", ".log")) == [
+        ("one.txt", "one.log", ""),
+        ("two.txt", "two.log", ""),
+        ("keep.md", "keep.md", "unchanged"),
+        ("three.txt", "three.log", "exists"),
+    ]
+
+
+def test_plan_flags_collisions_and_invalid_names(tmp_path):
+    paths = make_files(tmp_path, {"a1.txt": "", "a2.txt": "", "b.txt": ""})
+    assert statuses(paths, RenamePattern(r"\d", "", is_regex=True)) == [
+        ("a1.txt", "a.txt", "duplicate"),
+        ("a2.txt", "a.txt", "duplicate"),
+        ("b.txt", "b.txt", "unchanged"),
+    ]
+    assert [status for name, new_name, status in statuses(paths, RenamePattern("", "x/{name}"))] == ["invalid"] * 3
+    assert [status for name, new_name, status in statuses(paths, RenamePattern("(", ""))] == ["unchanged"] * 3
+
+
+def test_plan_allows_swapping_names_being_moved(tmp_path):
+    paths = make_files(tmp_path, {"1.jpg": "", "2.jpg": ""})
+    assert statuses(paths[::-1], RenamePattern("", "{n}{ext}")) == [
+        ("2.jpg", "1.jpg", ""),
+        ("1.jpg", "2.jpg", ""),
+    ]
+
+
+def test_plan_stops_when_cancelled(tmp_path):
+    paths = make_files(tmp_path, {"a": ""})
+    cancelled = threading.Event()
+    cancelled.set()
+    assert plan_renames(paths, RenamePattern("a", "b"), cancelled, {}) is None
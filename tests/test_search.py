@@ -0,0 +1,35 @@
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import required_literal
+
+
+def assert_safe(pattern, *samples):
+    literal = required_literal(pattern)
+    for sample in samples:
+        assert re.search(pattern.encode(), sample), (pattern, sample)
+        assert literal in sample, (pattern, literal, sample)
+
+
+def test_quantifier_braces_are_not_literal():
+    assert_safe("foo{2,3}", b"fooo", b"foooo")
+    assert_safe(r"\d{3}", b"124")
+    assert_safe("x{1,}yz", b"xxxyz")
+    assert_safe("ab{0}cd", b"acd")
+    assert required_literal("foo{2,3}") == b"fo"
+    assert required_literal("x{1,}yz") == b"yz"
+
+
+def test_character_classes_are_skipped():
+    assert_safe(r"[\]abcd]x", b"ax")
+    assert_safe("[]abcd]x", b"]x")
+    assert_safe("[^]abcd]x", b"zx")
+
+
+def test_optional_atoms_are_dropped():
+    assert_safe("colou?r", b"color", b"colour")
+    assert_safe(r"ab*c\.txt", b"ac.txt")
+    assert required_literal("hello world") == b"hello world"
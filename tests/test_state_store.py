@@ -0,0 +1,103 @@
+import json
+import os
+
+import pytest
+
+from main import StateStore
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "state.json")
+
+
+def test_values_survive_a_restart(path):
+    store = StateStore(path, {"show_hidden": True})
+    store.set("history", ["/a", "/b"])
+    store.set_item("folder_sorts", "/a", [1, 0])
+    store.close()
+    store = StateStore(path, {"show_hidden": True})
+    assert store.get("history") == ["/a", "/b"]
+    assert store.get("show_hidden") is True
+    assert store.get_item("folder_sorts", "/a") == [1, 0]
+    store.close()
+
+
+def test_values_are_copied_on_set(path):
+    store = StateStore(path, {})
+    pins = ["/a"]
+    store.set("pinned_folders", pins)
+    pins.append("/b")
+    assert store.get("pinned_folders") == ["/a"]
+    store.close()
+
+
+def test_writers_merge_per_key_and_item(path):
+    first = StateStore(path, {})
+    second = StateStore(path, {})
+    first.set("history", ["/first"])
+    first.set_item("folder_sorts", "/first", [0, 0])
+    first.close()
+    second.set("pinned_folders", ["/second"])
+    second.set_item("folder_sorts", "/second", [3, 1])
+    second.close()
+    data = load(path)
+    assert data["history"] == ["/first"]
+    assert data["pinned_folders"] == ["/second"]
+    assert data["folder_sorts"] == {"/first": [0, 0], "/second": [3, 1]}
+
+
+def test_deleted_and_evicted_items_are_removed(path):
+    store = StateStore(path, {})
+    for name in "abc":
+        store.set_item("folder_sorts", name, 1)
+    store.close()
+    store = StateStore(path, {})
+    store.set_item("folder_sorts", "a", None)
+    store.set_item("folder_sorts", "d", 1, limit=2)
+    assert list(store.get("folder_sorts")) == ["c", "d"]
+    store.close()
+    assert load(path)["folder_sorts"] == {"c": 1, "d": 1}
+
+
+def test_changes_are_debounced_into_one_write(path, monkeypatch):
+    store = StateStore(path, {})
+    writes = []
+    write = store.write
+    monkeypatch.setattr(store, "write", lambda changes: (writes.append(dict(changes)), write(changes)))
+    for i in range(50):
+        store.set("counter", i)
+    store.close()
+    assert len(writes) == 1 and writes[0] == {("counter", None): 49}
+    assert load(path)["counter"] == 49
+
+
+def test_failed_write_keeps_the_old_file(path, monkeypatch):
+    store = StateStore(path, {})
+    store.set("history", ["/kept"])
+    store.close()
+
+    def interrupted(source, target):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(os, "replace", interrupted)
+    store = StateStore(path, {})
+    with pytest.raises(OSError):
+        store.write({("history", None): ["/lost"]})
+    store.close()
+    monkeypatch.undo()
+    assert load(path)["history"] == ["/kept"]
+    assert sorted(os.listdir(os.path.dirname(path))) == ["state.json", "state.json.lock"]
+
+
+def test_legacy_pin_list_is_read(path):
+    with open(path, "w") as f:
+        json.dump(["/old/pin"], f)
+    store = StateStore(path, {"pinned_folders": []})
+    assert store.get("pinned_folders") == ["/old/pin"]
+    store.close()
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+from main import FileJob, FileOperationQueue, TrashStore, stat_key
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    return TrashStore(str(tmp_path / "cache" / "trash.db"))
+
+
+@pytest.fixture
+def queue(store):
+    return FileOperationQueue(None, store)
+
+
+@pytest.fixture
+def work(tmp_path):
+    (tmp_path / "work" / "sub").mkdir(parents=True)
+    (tmp_path / "work" / "a.txt").write_text("top")
+    (tmp_path / "work" / "sub" / "a.txt").write_text("nested")
+    return tmp_path / "work"
+
+
+def indexed(store):
+    return sorted((name, path) for trash, name, path, deleted in store.refresh() if trash == store.home)
+
+
+def test_trash_writes_info_and_resolves_name_clashes(store, queue, work, run_job):
+    sources = [str(work / "a.txt"), str(work / "sub" / "a.txt"), str(work / "gone")]
+    job = run_job(queue, FileJob("trash", sources))
+    assert job.error is None
+    assert job.files_done == 2 and job.skipped == 1
+    assert sorted(os.listdir(work)) == ["sub"] and os.listdir(work / "sub") == []
+    assert sorted(os.listdir(os.path.join(store.home, "files"))) == ["a.2.txt", "a.txt"]
+    with open(os.path.join(store.home, "info", "a.2.txt.trashinfo")) as f:
+        lines = f.read().splitlines()
+    assert lines[:2] == ["[Trash Info]", f"Path={work}/sub/a.txt"]
+    assert lines[2].startswith("DeletionDate=")
+    assert indexed(store) == [("a.2.txt", sources[1]), ("a.txt", sources[0])]
+    assert os.path.exists(store.cache_path)
+
+
+def test_restore_round_trip_keeps_existing_files(store, queue, work, run_job):
+    source = str(work / "a.txt")
+    run_job(queue, FileJob("trash", [source]))
+    (work / "a.txt").write_text("new")
+    items = [item for item in store.refresh() if item[0] == store.home]
+    job = run_job(queue, FileJob("restore", [os.path.join(trash, "files", name) for trash, name, path, deleted in items],
+                                 targets=[path for trash, name, path, deleted in items]))
+    assert job.error is None and job.files_done == 1
+    assert (work / "a.txt").read_text() == "new"
+    assert (work / "a (2).txt").read_text() == "top"
+    assert os.listdir(os.path.join(store.home, "files")) == []
+    assert os.listdir(os.path.join(store.home, "info")) == []
+    assert indexed(store) == []
+
+
+def test_restore_recreates_missing_folders(store, queue, work, run_job):
+    source = str(work / "sub" / "a.txt")
+    run_job(queue, FileJob("trash", [str(work / "sub")]))
+    job = run_job(queue, FileJob("restore", [os.path.join(store.home, "files", "sub")], targets=[str(work / "sub")]))
+    assert job.error is None
+    with open(source) as f:
+        assert f.read() == "nested"
+
+
+def test_purge_empties_the_trash(store, queue, work, run_job):
+    run_job(queue, FileJob("trash", [str(work / "a.txt"), str(work / "sub")]))
+    names = [name for name, path in indexed(store)]
+    job = run_job(queue, FileJob("purge", [os.path.join(store.home, "files", name) for name in names]))
+    assert job.error is None and job.files_done == 2
+    assert os.listdir(os.path.join(store.home, "files")) == []
+    assert os.listdir(os.path.join(store.home, "info")) == []
+    assert indexed(store) == []
+
+
+def test_trash_skips_files_changed_since_they_were_compared(store, queue, work, run_job):
+    kept = work / "kept.txt"
+    kept.write_text("top")
+    first, second = work / "a.txt", work / "sub" / "a.txt"
+    second.write_text("top")
+    keys = [(stat_key(os.lstat(path)), stat_key(os.lstat(kept))) for path in (first, second)]
+    second.write_text("changed")
+    job = run_job(queue, FileJob("trash", [str(first), str(second)], targets=[str(kept)] * 2, keys=keys))
+    assert job.files_done == 1 and job.skipped == 1
+    assert not first.exists() and second.read_text() == "changed"